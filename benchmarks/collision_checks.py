@@ -0,0 +1,48 @@
+#!/usr/bin/env python3.6
+
+""" Benchmark for the cost of the collision checks depending on the snake length. """
+
+import time
+
+from snakeai.gameplay.entities import SnakeAction
+from snakeai.gameplay.environment import Environment
+
+
+def create_env(snake_length):
+    """ Create an environment with two parallel snakes of the given length, heading north. """
+    size = snake_length + 4
+    empty_row = '#' + '.' * (size - 2) + '#'
+    level_map = ['#' * size, empty_row, '#.A.B' + empty_row[5:]]
+    level_map += [empty_row] * (size - 4)
+    level_map += ['#' * size]
+
+    env = Environment(config={
+        'field': level_map,
+        'initial_snake_length': snake_length,
+        'rewards': {'timestep': 0, 'ate_fruit': 1, 'died': -1},
+    }, verbose=0)
+    env.seed(42)
+    env.new_episode()
+    return env
+
+
+def measure_checks_per_second(env, num_checks):
+    """ Make a single move and run the collision checks of both snakes `num_checks` times. """
+    env.choose_action([SnakeAction.MAINTAIN_DIRECTION, SnakeAction.MAINTAIN_DIRECTION])
+    env.timestep()
+
+    start_time = time.perf_counter()
+    for _ in range(num_checks):
+        env.is_alive(0)
+        env.is_alive(1)
+    return num_checks / (time.perf_counter() - start_time)
+
+
+def main():
+    for snake_length in [4, 64, 512]:
+        checks_per_second = measure_checks_per_second(create_env(snake_length), 20000)
+        print(f'{"snake length " + str(snake_length):>24s}: {checks_per_second:10.0f} checks/sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3.6
+
+""" Benchmark for the number of environment timesteps per second with random actions. """
+
+import json
+import logging
+import os
+import random
+import time
+
+from snakeai.gameplay.entities import ALL_SNAKE_ACTIONS, ALL_SNAKE_HEADS, LEVEL_MAP_TO_CELL_TYPE
+from snakeai.gameplay.environment import Environment
+from snakeai.utils.tracing import add_trace_sink
+
+
+def measure_steps_per_second(env, num_steps):
+    """
+    Play random episodes until `num_steps` timesteps have been executed.
+
+    Only the timesteps are timed: the resets are measured separately by `measure_resets_per_second`,
+    and the episodes end more often as the number of snakes grows.
+    """
+    rng = random.Random(42)
+    env.seed(42)
+    env.new_episode()
+
+    elapsed = 0.0
+    for _ in range(num_steps):
+        actions = [rng.choice(ALL_SNAKE_ACTIONS) for _ in range(env.num_snakes)]
+        start_time = time.perf_counter()
+        env.choose_action(actions)
+        is_episode_end = env.timestep().is_episode_end
+        elapsed += time.perf_counter() - start_time
+        if is_episode_end:
+            env.new_episode()
+    return num_steps / elapsed
+
+
+def measure_resets_per_second(env, num_resets):
+    """ Start `num_resets` new episodes in a row. """
+    env.seed(42)
+    start_time = time.perf_counter()
+    for _ in range(num_resets):
+        env.new_episode()
+    return num_resets / (time.perf_counter() - start_time)
+
+
+def create_arena_config(num_snakes, size=22):
+    """ Create a blank square level with `num_snakes` snakes spread over two rows. """
+    head_symbols = {cell_type: symbol for symbol, cell_type in LEVEL_MAP_TO_CELL_TYPE.items()}
+    level_map = [['#'] + ['.'] * (size - 2) + ['#'] for _ in range(size)]
+    level_map[0] = level_map[-1] = ['#'] * size
+    columns_per_row = (num_snakes + 1) // 2
+    for i in range(num_snakes):
+        row = size // 3 if i < columns_per_row else 2 * size // 3
+        column = 2 + (i % columns_per_row) * (size - 4) // columns_per_row
+        level_map[row][column] = head_symbols[ALL_SNAKE_HEADS[i]]
+    return {
+        'field': [''.join(row) for row in level_map],
+        'num_snakes': num_snakes,
+        'initial_snake_length': 3,
+        'max_step_limit': 1000,
+        'rewards': {'timestep': 0, 'ate_fruit': 1, 'died': -1},
+    }
+
+
+def main():
+    with open('snakeai/levels/10x10-blank.json') as cfg:
+        env_config = json.load(cfg)
+    num_steps = 20000
+
+    # Tracing every step is what the environment used to do by printing the field.
+    modes = [
+        ('default (no tracing)', None),
+        ('trace every timestep', {'max_records_per_second': None}),
+        ('trace at most 10/sec', {'max_records_per_second': 10}),
+    ]
+    for name, trace_args in modes:
+        handler = None
+        if trace_args is not None:
+            handler = add_trace_sink('snakeai.gameplay.environment', os.devnull, **trace_args)
+
+        steps_per_second = measure_steps_per_second(Environment(config=env_config, verbose=0), num_steps)
+        print(f'{name:>24s}: {steps_per_second:10.0f} steps/sec')
+
+        if handler is not None:
+            logger = logging.getLogger('snakeai.gameplay.environment')
+            logger.removeHandler(handler)
+            logger.setLevel(logging.NOTSET)
+
+    for level_name in ['10x10-blank', '22x22-obstacles']:
+        with open(f'snakeai/levels/{level_name}.json') as cfg:
+            level_env = Environment(config=json.load(cfg), verbose=0)
+        resets_per_second = measure_resets_per_second(level_env, 5000)
+        print(f'{level_name + " resets":>24s}: {resets_per_second:10.0f} episodes/sec')
+
+    # The cost of a timestep should grow linearly with the number of snakes.
+    for num_snakes in [2, 4, 8]:
+        arena_env = Environment(config=create_arena_config(num_snakes), verbose=0)
+        steps_per_second = measure_steps_per_second(arena_env, num_steps)
+        microseconds_per_step = 1e6 / steps_per_second
+        print(f'{str(num_snakes) + " snakes on 22x22":>24s}: {steps_per_second:10.0f} steps/sec '
+              f'({microseconds_per_step:.1f} us/step, {microseconds_per_step / num_snakes:.1f} us/snake move)')
+
+if __name__ == '__main__':
+    main()
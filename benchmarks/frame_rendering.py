@@ -0,0 +1,25 @@
+#!/usr/bin/env python3.6
+
+""" Benchmark for composing the GUI frames out of the field cells. """
+
+import timeit
+
+import numpy as np
+
+from snakeai.utils.rendering import TileAtlas
+
+
+def main():
+    num_frames = 1000
+    atlas = TileAtlas(cell_size=20)
+    random = np.random.RandomState(42)
+
+    for size in [10, 22, 64]:
+        cells = random.choice(list(range(len(atlas.tiles))), size=(size, size)).astype(np.uint8)
+        seconds = timeit.timeit(lambda: atlas.render(cells), number=num_frames)
+        name = f'{size}x{size}'
+        print(f'{name:>24s}: {num_frames / seconds:10.0f} frames/sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3.6
+
+""" Benchmark for building the agent state out of the last observed frames. """
+
+import collections
+import timeit
+
+import numpy as np
+
+from snakeai.utils.frames import FrameStack
+
+
+def main():
+    num_steps = 100000
+    num_frames = 4
+    frame = np.zeros((10, 10), dtype=np.uint8)
+
+    # The way the agent used to do it: a deque of frames converted to an array at every step.
+    frames = collections.deque([frame] * num_frames)
+
+    def push_to_deque():
+        frames.append(frame)
+        frames.popleft()
+        return np.expand_dims(frames, 0)
+
+    stack = FrameStack(num_frames, frame.shape)
+    stack.reset(frame)
+
+    def push_to_stack():
+        stack.push(frame)
+        return stack.state
+
+    for name, push in [('deque', push_to_deque), ('FrameStack', push_to_stack)]:
+        seconds = timeit.timeit(push, number=num_steps)
+        print(f'{name:>24s}: {num_steps / seconds:10.0f} frames/sec')
+
+
+if __name__ == '__main__':
+    main()
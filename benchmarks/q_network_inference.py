@@ -0,0 +1,47 @@
+#!/usr/bin/env python3.6
+
+""" Benchmark for the latency of choosing an action with the DQN model built by train.py. """
+
+import timeit
+
+import numpy as np
+
+from snakeai.agent import NumPyQNetwork
+
+
+def create_random_network(num_frames, size, num_actions):
+    """ Create a NumPy copy of the `create_dqn_model` architecture with random weights. """
+    rng = np.random.RandomState(42)
+    conv = {'type': 'Conv2D', 'strides': (1, 1), 'data_format': 'channels_first', 'use_bias': True, 'activation': 'linear'}
+    layers = [
+        dict(conv, input_shape=(None, num_frames, size, size)),
+        {'type': 'Activation', 'activation': 'relu'},
+        dict(conv),
+        {'type': 'Activation', 'activation': 'relu'},
+        {'type': 'Flatten', 'data_format': None},
+        {'type': 'Dense', 'use_bias': True, 'activation': 'linear'},
+        {'type': 'Activation', 'activation': 'relu'},
+        {'type': 'Dense', 'use_bias': True, 'activation': 'linear', 'output_shape': (None, num_actions)},
+    ]
+    weights = [
+        rng.randn(3, 3, num_frames, 16), rng.randn(16),
+        rng.randn(3, 3, 16, 32), rng.randn(32),
+        rng.randn(32 * (size - 4) ** 2, 256), rng.randn(256),
+        rng.randn(256, num_actions), rng.randn(num_actions),
+    ]
+    return NumPyQNetwork(layers, weights)
+
+
+def main():
+    num_calls = 2000
+    for size in [10, 22]:
+        network = create_random_network(4, size, 3)
+        for batch_size in [1, 2, 32]:
+            states = np.random.randint(0, 4, size=(batch_size, 4, size, size)).astype(np.uint8)
+            seconds = timeit.timeit(lambda: np.argmax(network.predict(states), axis=1), number=num_calls)
+            name = f'{size}x{size}, batch of {batch_size}'
+            print(f'{name:>24s}: {seconds / num_calls * 1e6:10.1f} usec/call')
+
+
+if __name__ == '__main__':
+    main()
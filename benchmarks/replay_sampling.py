@@ -0,0 +1,36 @@
+#!/usr/bin/env python3.6
+
+""" Benchmark for sampling batches from the experience replay memory of different capacities. """
+
+import timeit
+
+import numpy as np
+
+from snakeai.utils.memory import ExperienceReplay, PrioritizedExperienceReplay
+
+
+def fill_memory(memory):
+    """ Make the memory look full without storing every transition one by one. """
+    memory.size = memory.memory_size
+    if isinstance(memory, PrioritizedExperienceReplay):
+        memory.priorities.update(np.arange(memory.memory_size), np.random.random(memory.memory_size))
+
+
+def main():
+    batch_size = 64
+    num_batches = 1000
+
+    print(f'{"Capacity":>10s} | {"Uniform, us/batch":>18s} | {"Prioritized, us/batch":>22s}')
+    for capacity in [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]:
+        timings = []
+        for memory_class in [ExperienceReplay, PrioritizedExperienceReplay]:
+            # Tiny states keep the benchmark focused on index sampling rather than copying frames.
+            memory = memory_class((4, 2, 2), 3, memory_size=capacity)
+            fill_memory(memory)
+            seconds = timeit.timeit(lambda: memory.sample(batch_size), number=num_batches)
+            timings.append(seconds / num_batches * 1e6)
+        print(f'{capacity:10d} | {timings[0]:18.1f} | {timings[1]:22.1f}')
+
+
+if __name__ == '__main__':
+    main()
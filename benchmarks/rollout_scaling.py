@@ -0,0 +1,51 @@
+#!/usr/bin/env python3.6
+
+""" Benchmark for the experience throughput of the rollout worker pool as the number of workers grows. """
+
+import json
+import os
+import time
+
+from snakeai.utils.memory import ExperienceReplay
+from snakeai.utils.rollout import RolloutWorkerPool
+
+
+def measure_transitions_per_second(config, num_workers, duration):
+    """
+    Collect the experience of `num_workers` random-acting workers into a replay memory for `duration` seconds.
+
+    The learner side does nothing but store the transitions, so this is the upper bound of the experience
+    the learner can get. The time it takes to launch the processes is not counted.
+    """
+    pool = RolloutWorkerPool(config, num_workers=num_workers, seed=42)
+    memory = ExperienceReplay(pool.buffers.state_shape, 3, memory_size=100000)
+    pool.start()
+    try:
+        pool.collect(block=True, timeout=30)
+        num_transitions = 0
+        start_time = time.perf_counter()
+        while time.perf_counter() - start_time < duration:
+            transitions, _ = pool.collect(block=True, timeout=1)
+            memory.remember_batch(*transitions)
+            num_transitions += len(transitions[1])
+        return num_transitions / (time.perf_counter() - start_time)
+    finally:
+        pool.stop()
+
+
+def main():
+    level_file = os.path.join(os.path.dirname(__file__), os.pardir, 'snakeai', 'levels', '10x10-blank.json')
+    with open(level_file) as cfg:
+        config = json.load(cfg)
+
+    print(f'CPU cores: {os.cpu_count()}')
+    print(f'{"Workers":>8s} | {"Transitions/s":>14s} | {"Speedup":>8s}')
+    baseline = None
+    for num_workers in [1, 2, 4, 8]:
+        transitions_per_second = measure_transitions_per_second(config, num_workers, duration=5.0)
+        baseline = baseline or transitions_per_second
+        print(f'{num_workers:8d} | {transitions_per_second:14.0f} | {transitions_per_second / baseline:7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3.6
+
+""" Benchmark for moving and turning the deque-based snake and the snakes of a `SnakeGroup`. """
+
+import timeit
+
+from snakeai.gameplay.entities import Point, Snake, SnakeAction, SnakeGroup
+
+
+def make_moves(snake):
+    """ Run around a 4x4 square, like a snake that never eats anything. """
+    for _ in range(3):
+        snake.move()
+    snake.turn_right()
+
+
+def make_group_moves(group):
+    """ The same moves, made through the group API the environment uses. """
+    for _ in range(3):
+        group.move(0)
+    group.turn(0, SnakeAction.TURN_RIGHT)
+
+
+def main():
+    num_rounds = 50000
+    field_size = 10
+    group = SnakeGroup([Point(4, 4)], field_size, length=3)
+    runs = [
+        ('Snake', make_moves, Snake(Point(4, 4), length=3)),
+        ('SnakeView', make_moves, group[0]),
+        ('SnakeGroup', make_group_moves, group),
+    ]
+    baseline = None
+    for name, run, snake in runs:
+        # The best of several runs, since the timings of such short calls are noisy.
+        seconds = min(timeit.repeat(lambda: run(snake), number=num_rounds, repeat=5))
+        moves_per_second = 3 * num_rounds / seconds
+        baseline = baseline or moves_per_second
+        print(f'{name:>24s}: {moves_per_second:10.0f} moves/sec ({moves_per_second / baseline:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
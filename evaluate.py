@@ -0,0 +1,119 @@
+#!/usr/bin/env python3.6
+
+""" Front-end script for evaluating the agent checkpoints on all levels with a pool of worker processes. """
+
+import glob
+import os
+import sys
+import time
+
+from snakeai.utils.cli import HelpOnFailArgumentParser
+from snakeai.utils.evaluation import EvaluationTask, evaluate, summarize_results
+from snakeai.utils.stats import create_stats_sink
+
+
+DEFAULT_LEVELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snakeai', 'levels', '*.json')
+
+
+def parse_command_line_args(args):
+    """ Parse command-line arguments and organize them into a single structured object. """
+
+    parser = HelpOnFailArgumentParser(
+        description='Snake AI evaluation client.',
+        epilog='Example: evaluate.py --checkpoints "dqn-*.model" --levels "snakeai/levels/10x10-*.json" --num-seeds 5'
+    )
+
+    parser.add_argument(
+        '--checkpoints',
+        nargs='+',
+        default=['dqn-*.model'],
+        help='Model files (or glob patterns) to evaluate.',
+    )
+    parser.add_argument(
+        '--levels',
+        nargs='+',
+        default=[DEFAULT_LEVELS],
+        help='Level files (or glob patterns) to evaluate on. The checkpoints are only played on the levels they fit.',
+    )
+    parser.add_argument(
+        '--num-seeds',
+        type=int,
+        default=5,
+        help='The number of random seeds to play every checkpoint on every level with.',
+    )
+    parser.add_argument(
+        '--num-episodes',
+        type=int,
+        default=20,
+        help='The number of episodes to play with every seed.',
+    )
+    parser.add_argument(
+        '--num-workers',
+        type=int,
+        help='The number of worker processes (one per CPU core by default).',
+    )
+    parser.add_argument(
+        '--stats-format',
+        type=str,
+        choices=['csv', 'jsonl', 'binary'],
+        default='csv',
+        help='The format of the file with the statistics of every episode.',
+    )
+
+    return parser.parse_args(args)
+
+
+def expand_patterns(patterns):
+    """ Get the sorted list of the files matching any of the glob patterns. """
+    return sorted({filename for pattern in patterns for filename in glob.glob(pattern)})
+
+
+def main():
+    parsed_args = parse_command_line_args(sys.argv[1:])
+    checkpoints = expand_patterns(parsed_args.checkpoints)
+    levels = expand_patterns(parsed_args.levels)
+    if not checkpoints or not levels:
+        print('No checkpoints or levels to evaluate.')
+        return
+
+    tasks = [
+        EvaluationTask(checkpoint, level, seed, parsed_args.num_episodes)
+        for checkpoint in checkpoints
+        for level in levels
+        for seed in range(parsed_args.num_seeds)
+    ]
+    print(f'Evaluating {len(checkpoints)} checkpoints on {len(levels)} levels ({len(tasks)} tasks)...')
+
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    stats_sink = create_stats_sink(parsed_args.stats_format, f'snake-eval-{timestamp}')
+    rows = []
+    start_time = time.time()
+    for row in evaluate(tasks, num_workers=parsed_args.num_workers):
+        stats_sink.write(row)
+        rows.append(row)
+    stats_sink.close()
+    elapsed = time.time() - start_time
+
+    print()
+    header = '{:<32s} {:<24s} {:>8s} {:>16s} {:>10s} {:>12s}'
+    line = '{:<32s} {:<24s} {:8d} {:8.2f} +/- {:4.2f} {:10.1f} {:12.0f}'
+    print(header.format('Checkpoint', 'Level', 'Episodes', 'Fruits (95% CI)', 'Timesteps', 'Steps/sec'))
+    for summary in summarize_results(rows):
+        print(line.format(
+            os.path.basename(summary['checkpoint']),
+            summary['level'],
+            summary['episodes'],
+            summary['fruits_mean'],
+            summary['fruits_ci'],
+            summary['timesteps_mean'],
+            summary['steps_per_second'],
+        ))
+
+    num_timesteps = sum(row['timesteps_survived'] for row in rows if row['snake'] == 0)
+    print()
+    print(f'Played {num_timesteps} timesteps in {elapsed:.1f} s ({num_timesteps / elapsed:.0f} steps/sec overall).')
+    print(f'Per-episode statistics: {stats_sink.filename}')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,9 +6,11 @@ import json
 import sys
 import numpy as np
 
-from snakeai.gameplay.environment import Environment
+from snakeai.gameplay.environment import Environment, get_snake_observation
+from snakeai.gameplay.replay import EpisodeRecorder, save_recordings
 from snakeai.gui import PyGameGUI
 from snakeai.utils.cli import HelpOnFailArgumentParser
+from snakeai.utils.tracing import add_trace_sink
 
 
 def parse_command_line_args(args):
@@ -31,14 +33,14 @@ def parse_command_line_args(args):
         required=True,
         type=str,
         choices=['human', 'dqn', 'random'],
-        help='Player agent to use.',
+        help='Player agent to use for the first snake.',
     )
     parser.add_argument(
         '--agent1',
         required=True,
         type=str,
         choices=['human', 'dqn', 'random'],
-        help='Player agent to use.',
+        help='Player agent to use for the other snakes.',
     )
     parser.add_argument(
         '--model',
@@ -58,6 +60,22 @@ def parse_command_line_args(args):
         help='The number of episodes to run consecutively.',
     )
 
+    parser.add_argument(
+        '--trace-file',
+        type=str,
+        help='File to write the state of the field at every timestep to (slows down the environment).',
+    )
+    parser.add_argument(
+        '--max-trace-rate',
+        type=int,
+        help='The maximum number of field states per second to write to the trace file.',
+    )
+    parser.add_argument(
+        '--record-file',
+        type=str,
+        help='File to save the actions and fruit positions of every episode to, for render_replays.py (CLI only).',
+    )
+
     return parser.parse_args(args)
 
 
@@ -77,13 +95,14 @@ def load_model(filename):
     return load_model(filename)
 
 
-def create_agent(name, model):
+def create_agent(name, model, inference_model=None):
     """
     Create a specific type of Snake AI agent.
     
     Args:
         name (str): key identifying the agent type.
         model: (optional) a pre-trained model required by certain agents.
+        inference_model: (optional) a faster copy of the model to choose the actions with.
 
     Returns:
         An instance of Snake agent.
@@ -96,76 +115,112 @@ def create_agent(name, model):
     elif name == 'dqn':
         if model is None:
             raise ValueError('A model file is required for a DQN agent.')
-        return DeepQNetworkAgent(model=model, memory_size=-1, num_last_frames=4)
+        return DeepQNetworkAgent(model=model, memory_size=1, num_last_frames=4, inference_model=inference_model)
     elif name == 'random':
         return RandomActionAgent()
 
     raise KeyError(f'Unknown agent type: "{name}"')
 
 
-def play_cli(env, agent, num_episodes=10):
+def play_cli(env, agents, num_episodes=10, recorder=None):
     """
-    Play a set of episodes using the specified Snake agent.
+    Play a set of episodes using the specified Snake agents.
     Use the non-interactive command-line interface and print the summary statistics afterwards.
     
     Args:
         env: an instance of Snake environment.
-        agent: an instance of Snake agent.
+        agents: a list of Snake agents, one per snake.
         num_episodes (int): the number of episodes to run.
+        recorder (EpisodeRecorder): (optional) a recorder to keep the trace of every episode in.
     """
 
+    from snakeai.agent import InferenceBroker
+
     fruit_stats = []
+    inference = InferenceBroker()
 
     print()
     print('Playing:')
 
     for episode in range(num_episodes):
         timestep = env.new_episode()
-        agent.begin_episode()
+        for agent in agents:
+            agent.begin_episode()
+        if recorder is not None:
+            recorder.begin_episode()
         game_over = False
 
         while not game_over:
-            action = agent.act(timestep.observation, timestep.reward)
-            env.choose_action(action)
+            observations = [get_snake_observation(timestep.observation, i) for i in range(env.num_snakes)]
+            actions = inference.act(agents, observations, timestep.reward)
+            env.choose_action(actions)
             timestep = env.timestep()
             game_over = timestep.is_episode_end
+            if recorder is not None:
+                recorder.record_timestep(actions)
 
-        fruit_stats.append(env.stats.fruits_eaten)
+        if recorder is not None:
+            recorder.end_episode()
+        fruits_eaten = [stats.fruits_eaten for stats in env.stats]
+        fruit_stats.append(fruits_eaten)
 
-        summary = 'Episode {:3d} / {:3d} | Timesteps {:4d} | Fruits {:2d}'
-        print(summary.format(episode + 1, num_episodes, env.stats.timesteps_survived, env.stats.fruits_eaten))
+        summary = 'Episode {:3d} / {:3d} | Timesteps {:4d} | Fruits {}'
+        print(summary.format(episode + 1, num_episodes, env.timestep_index, fruits_eaten))
 
     print()
-    print('Fruits eaten {:.1f} +/- stddev {:.1f}'.format(np.mean(fruit_stats), np.std(fruit_stats)))
+    for i, (mean, std) in enumerate(zip(np.mean(fruit_stats, axis=0), np.std(fruit_stats, axis=0))):
+        print('Snake {:d}: fruits eaten {:.1f} +/- stddev {:.1f}'.format(i, mean, std))
+    print(env.stats_summary)
 
 
-def play_gui(env, agent, num_episodes):
+def play_gui(env, agents, num_episodes):
     """
-    Play a set of episodes using the specified Snake agent.
+    Play a set of episodes using the specified Snake agents.
     Use the interactive graphical interface.
     
     Args:
         env: an instance of Snake environment.
-        agent: an instance of Snake agent.
+        agents: a list of Snake agents, one per snake.
         num_episodes (int): the number of episodes to run.
     """
 
     gui = PyGameGUI()
     gui.load_environment(env)
-    gui.load_agent(agent)
+    gui.load_agent(agents)
     gui.run(num_episodes=num_episodes)
 
 
 def main():
     parsed_args = parse_command_line_args(sys.argv[1:])
+    if parsed_args.trace_file:
+        add_trace_sink('snakeai.gameplay.environment', parsed_args.trace_file, parsed_args.max_trace_rate)
 
     env = create_snake_environment(parsed_args.level)
     model = load_model(parsed_args.model) if parsed_args.model is not None else None
-    agents = [create_agent(parsed_args.agent0, model), create_agent(parsed_args.agent1, model)]
-    #agent = create_agent(parsed_args.agent, model)
 
-    run_player = play_cli if parsed_args.interface == 'cli' else play_gui
-    run_player(env, agents, num_episodes=parsed_args.num_episodes)
+    # All agents share the same NumPy copy of the model, so their states are evaluated in one batch.
+    inference_model = None
+    if model is not None:
+        from snakeai.agent import NumPyQNetwork
+        inference_model = NumPyQNetwork.from_keras(model)
+    # The first snake gets its own agent type, all the others play with the second one.
+    agents = [create_agent(parsed_args.agent0, model, inference_model)] + [
+        create_agent(parsed_args.agent1, model, inference_model)
+        for _ in range(env.num_snakes - 1)
+    ]
+
+    # Flush the episode log and the statistics even if the game is interrupted.
+    try:
+        if parsed_args.interface == 'cli':
+            recorder = EpisodeRecorder(env) if parsed_args.record_file else None
+            play_cli(env, agents, num_episodes=parsed_args.num_episodes, recorder=recorder)
+            if recorder is not None:
+                with open(parsed_args.level) as cfg:
+                    save_recordings(parsed_args.record_file, json.load(cfg), recorder.recordings)
+        else:
+            play_gui(env, agents, num_episodes=parsed_args.num_episodes)
+    finally:
+        env.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3.6
+
+""" Front-end script for rendering the recorded episodes to GIFs or image sequences, without a display. """
+
+import os
+import sys
+import time
+
+from snakeai.gameplay.replay import load_recordings
+from snakeai.utils.cli import HelpOnFailArgumentParser
+from snakeai.utils.rendering import export_episodes
+
+
+def parse_command_line_args(args):
+    """ Parse command-line arguments and organize them into a single structured object. """
+
+    parser = HelpOnFailArgumentParser(
+        description='Snake AI replay renderer.',
+        epilog='Example: render_replays.py --record-file episodes.npz --output-dir replays'
+    )
+
+    parser.add_argument(
+        '--record-file',
+        required=True,
+        type=str,
+        help='File with the recorded episodes (see the --record-file option of play.py).',
+    )
+    parser.add_argument(
+        '--output-dir',
+        required=True,
+        type=str,
+        help='Directory to write the rendered episodes to.',
+    )
+    parser.add_argument(
+        '--format',
+        type=str,
+        choices=['gif', 'png'],
+        default='gif',
+        help='Render every episode to an animated GIF or to a PNG image per timestep.',
+    )
+    parser.add_argument(
+        '--cell-size',
+        type=int,
+        default=20,
+        help='The size of a field cell in pixels.',
+    )
+    parser.add_argument(
+        '--frame-duration',
+        type=int,
+        default=100,
+        help='The duration of a GIF frame in milliseconds.',
+    )
+    parser.add_argument(
+        '--num-workers',
+        type=int,
+        help='The number of processes to render the episodes in (one per CPU core by default).',
+    )
+
+    return parser.parse_args(args)
+
+
+def main():
+    parsed_args = parse_command_line_args(sys.argv[1:])
+    config, recordings = load_recordings(parsed_args.record_file)
+
+    if parsed_args.format == 'gif':
+        filename_pattern = os.path.join(parsed_args.output_dir, 'episode-{episode:04d}.gif')
+    else:
+        filename_pattern = os.path.join(parsed_args.output_dir, 'episode-{episode:04d}-{frame:04d}.png')
+    os.makedirs(parsed_args.output_dir, exist_ok=True)
+
+    start_time = time.time()
+    export_episodes(
+        config,
+        recordings,
+        filename_pattern,
+        cell_size=parsed_args.cell_size,
+        frame_duration=parsed_args.frame_duration,
+        num_workers=parsed_args.num_workers,
+    )
+    num_frames = sum(recording.num_timesteps + 1 for recording in recordings)
+    print(f'Rendered {len(recordings)} episodes ({num_frames} frames) in {time.time() - start_time:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3.6
+
+""" Front-end script for inspecting the binary episode logs written by the environment (verbose=2). """
+
+import sys
+
+from snakeai.gameplay.replay import replay_logged_episode
+from snakeai.utils.cli import HelpOnFailArgumentParser
+from snakeai.utils.episode_log import EpisodeLogReader
+
+
+def parse_command_line_args(args):
+    """ Parse command-line arguments and organize them into a single structured object. """
+
+    parser = HelpOnFailArgumentParser(
+        description='Snake AI episode log viewer.',
+        epilog='Example: show_episode_log.py --log-file snake-env-20170101-120000.replay --episode 3 --timestep 42'
+    )
+
+    parser.add_argument(
+        '--log-file',
+        required=True,
+        type=str,
+        help='Binary episode log written by the environment.',
+    )
+    parser.add_argument(
+        '--episode',
+        type=int,
+        help='The episode to re-simulate (if not specified, list all episodes).',
+    )
+    parser.add_argument(
+        '--timestep',
+        type=int,
+        help='The timestep to show the field at (if not specified, show every timestep).',
+    )
+
+    return parser.parse_args(args)
+
+
+def main():
+    parsed_args = parse_command_line_args(sys.argv[1:])
+
+    with EpisodeLogReader(parsed_args.log_file) as log:
+        if parsed_args.episode is None:
+            print(f'Level {log.level_id}, {len(log)} episodes')
+            for episode in range(len(log)):
+                seed, actions = log.read_episode(episode)
+                print(f'Episode {episode:5d} | Seed {seed:10d} | Timesteps {len(actions):4d}')
+            return
+
+        for env in replay_logged_episode(log, parsed_args.episode):
+            if parsed_args.timestep is None or env.timestep_index == parsed_args.timestep:
+                print(f'Timestep {env.timestep_index}:')
+                print(env.field)
+                print()
+
+
+if __name__ == '__main__':
+    main()
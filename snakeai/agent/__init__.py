@@ -26,3 +26,5 @@ class AgentBase(object):
 from .dqn import DeepQNetworkAgent
 from .human import HumanAgent
 from .random_action import RandomActionAgent
+from .inference import InferenceBroker, predict_greedy_actions
+from .numpy_model import NumPyQNetwork, describe_keras_layers
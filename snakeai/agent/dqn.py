@@ -1,33 +1,61 @@
-import collections
+import logging
+
 import numpy as np
 
 from snakeai.agent import AgentBase
-from snakeai.utils.memory import ExperienceReplay
+from snakeai.agent.numpy_model import NumPyQNetwork
+from snakeai.gameplay.environment import get_snake_observation
+from snakeai.utils.frames import FrameStack
+from snakeai.utils.memory import (
+    BatchPrefetcher, ExperienceReplay, FrameDeduplicatedExperienceReplay, PrioritizedExperienceReplay,
+)
+
+
+logger = logging.getLogger(__name__)
 
 
 class DeepQNetworkAgent(AgentBase):
     """ Represents a Snake agent powered by DQN with experience replay. """
 
-    def __init__(self, model, num_last_frames=4, memory_size=1000):
+    def __init__(self, model, num_last_frames=4, memory_size=1000, deduplicate_frames=False, prioritized_replay=False,
+                 inference_model=None):
         """
         Create a new DQN-based agent.
         
         Args:
             model: a compiled DQN model.
             num_last_frames (int): the number of last frames the agent will consider.
-            memory_size (int): memory size limit for experience replay (-1 for unlimited). 
+            memory_size (int): the number of transitions kept in experience replay. 
+            deduplicate_frames (bool): store every observed frame only once in experience replay
+                instead of storing the whole frame stacks.
+            prioritized_replay (bool): sample the experience proportionally to the TD errors
+                instead of uniformly (cannot be combined with `deduplicate_frames`).
+            inference_model: (optional) a faster copy of the model used to choose the actions,
+                such as `NumPyQNetwork`. Its weights are refreshed from `model` during training.
         """
         assert model.input_shape[1] == num_last_frames, 'Model input shape should be (num_frames, grid_size, grid_size)'
         assert len(model.output_shape) == 2, 'Model output shape should be (num_samples, num_actions)'
 
         self.model = model
+        self.inference_model = inference_model if inference_model is not None else model
+        self.target_model = None
+        self.prefetcher = None
         self.num_last_frames = num_last_frames
-        self.memory = ExperienceReplay((num_last_frames,) + model.input_shape[-2:], model.output_shape[-1], memory_size)
-        self.frames = None
+        if deduplicate_frames and prioritized_replay:
+            raise ValueError('Prioritized experience replay does not support frame deduplication')
+
+        memory_class = ExperienceReplay
+        if deduplicate_frames:
+            memory_class = FrameDeduplicatedExperienceReplay
+        elif prioritized_replay:
+            memory_class = PrioritizedExperienceReplay
+        self.memory = memory_class((num_last_frames,) + model.input_shape[-2:], model.output_shape[-1], memory_size)
+        self.frames = FrameStack(num_last_frames, model.input_shape[-2:])
+        self.is_first_frame = True
 
     def begin_episode(self):
         """ Reset the agent for a new episode. """
-        self.frames = None
+        self.is_first_frame = True
 
     def get_last_frames(self, observation):
         """
@@ -37,18 +65,20 @@ class DeepQNetworkAgent(AgentBase):
             observation: observation at the current timestep. 
 
         Returns:
-            Observations for the last `num_last_frames` frames.
+            A float32 (1, num_last_frames, size, size) view of the last frames.
+            It is overwritten at the next call, so it has to be copied to be kept around.
         """
-        frame = observation
-        if self.frames is None:
-            self.frames = collections.deque([frame] * self.num_last_frames)
+        if self.is_first_frame:
+            self.frames.reset(observation)
+            self.is_first_frame = False
         else:
-            self.frames.append(frame)
-            self.frames.popleft()
-        return np.expand_dims(self.frames, 0)
+            self.frames.push(observation)
+        return self.frames.state
 
     def train(self, env, num_episodes=1000, batch_size=50, discount_factor=0.9, checkpoint_freq=None,
-              exploration_range=(1.0, 0.1), exploration_phase_size=0.5):
+              exploration_range=(1.0, 0.1), exploration_phase_size=0.5, rollout=None, sync_freq=100,
+              target_sync_freq=None, train_every=1, gradient_steps=1, warmup_size=0, replay_ratio=None,
+              prefetch_batches=0):
         """
         Train the agent to perform well in the given Snake environment.
         
@@ -68,54 +98,70 @@ class DeepQNetworkAgent(AgentBase):
             exploration_phase_size (float):
                 the percentage of the training process at which
                 the exploration rate should reach its minimum.
+            rollout (RolloutWorkerPool):
+                if specified, collect the experience from the worker pool instead of `env`.
+            sync_freq (int):
+                the number of training steps after which the model weights are sent to the rollout workers
+                (or copied to the inference model).
+            target_sync_freq (int):
+                if specified, learn with Double DQN targets evaluated by a target network,
+                which gets the model weights every `target_sync_freq` training steps.
+            train_every (int):
+                the number of new transitions between the learning phases.
+            gradient_steps (int):
+                the number of batches to learn on in every learning phase.
+            warmup_size (int):
+                the number of transitions to collect before the learning starts.
+            replay_ratio (float):
+                if specified, learn on this many sampled transitions per new transition on average
+                instead of using `train_every` and `gradient_steps`.
+            prefetch_batches (int):
+                if positive, sample up to this many batches ahead of time on a background thread.
         """
 
         # Calculate the constant exploration decay speed for each episode.
         max_exploration_rate, min_exploration_rate = exploration_range
         exploration_decay = ((max_exploration_rate - min_exploration_rate) / (num_episodes * exploration_phase_size))
         exploration_rate = max_exploration_rate
+        logger.info('Experience replay memory: %d bytes', self.memory.nbytes)
+
+        self.train_steps = 0
+
+        # The target network is only used for inference, so a NumPy copy of the model is enough.
+        self.target_model = NumPyQNetwork.from_keras(self.model) if target_sync_freq else None
+        schedule = LearnerSchedule(batch_size, train_every, gradient_steps, warmup_size, replay_ratio)
+        if prefetch_batches > 0:
+            self.prefetcher = BatchPrefetcher(self.memory, batch_size, prefetch_batches, min_memory_size=max(warmup_size, 1))
+        replay = self.prefetcher if self.prefetcher is not None else self.memory
+
+        if rollout is not None:
+            self._train_on_rollouts(
+                rollout, num_episodes, batch_size, discount_factor, checkpoint_freq,
+                exploration_rate, min_exploration_rate, exploration_decay, sync_freq, target_sync_freq, schedule
+            )
+            self._stop_prefetching()
+            return
+
+        # Every snake is controlled by the agent, each with its own frame stack and experience stream.
+        num_snakes = env.num_snakes
+        frames = FrameStack(self.num_last_frames, env.observation_shape, batch_size=num_snakes)
+        sync_actors = self.inference_model.set_weights if self.inference_model is not self.model else None
 
         for episode in range(num_episodes):
-            # Reset the environment for the new episode.
-            timestep = env.new_episode()
-            self.begin_episode()
-            game_over = False
             loss = 0.0
+            episode_steps = play_epsilon_greedy_episode(env, frames, self.inference_model, exploration_rate)
+            for states, actions, timestep, states_next in episode_steps:
+                # Remember a new piece of experience for every snake.
+                for i in range(num_snakes):
+                    replay.remember(
+                        states[i], actions[i], timestep.reward[i], states_next[i], timestep.is_episode_end, stream=i
+                    )
 
-            # Observe the initial state.
-            state = self.get_last_frames(timestep.observation)
-
-            while not game_over:
-                if np.random.random() < exploration_rate:
-                    # Explore: take a random action.
-                    action = np.random.randint(env.num_actions)
-                else:
-                    # Exploit: take the best known action for this state.
-                    q = self.model.predict(state)
-                    action = np.argmax(q[0])
-
-                # Act on the environment.
-                env.choose_action(action)
-                timestep = env.timestep()
-
-                # Remember a new piece of experience.
-                reward = timestep.reward
-                state_next = self.get_last_frames(timestep.observation)
-                game_over = timestep.is_episode_end
-                experience_item = [state, action, reward, state_next, game_over]
-                self.memory.remember(*experience_item)
-                state = state_next
-
-                # Sample a random batch from experience.
-                batch = self.memory.get_batch(
-                    model=self.model,
-                    batch_size=batch_size,
-                    discount_factor=discount_factor
+                # Learn on random batches from experience when it's time to.
+                num_gradient_steps = schedule.on_new_transitions(num_snakes, len(self.memory))
+                loss += self._learn(
+                    num_gradient_steps, batch_size, discount_factor, sync_actors, sync_freq, target_sync_freq
                 )
-                # Learn on the batch.
-                if batch:
-                    inputs, targets = batch
-                    loss += float(self.model.train_on_batch(inputs, targets))
 
             if checkpoint_freq and (episode % checkpoint_freq) == 0:
                 self.model.save(f'dqn-{episode:08d}.model')
@@ -124,14 +170,120 @@ class DeepQNetworkAgent(AgentBase):
                 exploration_rate -= exploration_decay
 
             summary = 'Episode {:5d}/{:5d} | Loss {:8.4f} | Exploration {:.2f} | ' + \
-                      'Fruits {:2d} | Timesteps {:4d} | Total Reward {:4d}'
+                      'Fruits {} | Timesteps {:4d} | Total Reward {}'
             print(summary.format(
                 episode + 1, num_episodes, loss, exploration_rate,
-                env.stats.fruits_eaten, env.stats.timesteps_survived, env.stats.sum_episode_rewards,
+                [stats.fruits_eaten for stats in env.stats], env.timestep_index,
+                [stats.sum_episode_rewards for stats in env.stats],
             ))
 
+        self._stop_prefetching()
+        self.model.save('dqn-final.model')
+
+    def _train_on_rollouts(self, rollout, num_episodes, batch_size, discount_factor, checkpoint_freq,
+                           exploration_rate, min_exploration_rate, exploration_decay, sync_freq, target_sync_freq, schedule):
+        """ Learn from the experience streamed by the rollout workers until enough episodes have been played. """
+        rollout.set_exploration_rate(exploration_rate)
+        rollout.sync_weights(self.model.get_weights())
+        rollout.start()
+
+        episode = 0
+        loss = 0.0
+        replay = self.prefetcher if self.prefetcher is not None else self.memory
+
+        try:
+            while episode < num_episodes:
+                # Only wait for the workers if there is nothing to learn from yet.
+                transitions, episodes = rollout.collect(block=len(self.memory) == 0, timeout=1.0)
+                num_transitions = len(transitions[1])
+                if num_transitions > 0:
+                    replay.remember_batch(*transitions)
+
+                num_gradient_steps = schedule.on_new_transitions(num_transitions, len(self.memory))
+                loss += self._learn(
+                    num_gradient_steps, batch_size, discount_factor, rollout.sync_weights, sync_freq, target_sync_freq
+                )
+
+                for stats in episodes[:num_episodes - episode]:
+                    if checkpoint_freq and (episode % checkpoint_freq) == 0:
+                        self.model.save(f'dqn-{episode:08d}.model')
+
+                    if exploration_rate > min_exploration_rate:
+                        exploration_rate -= exploration_decay
+                        rollout.set_exploration_rate(exploration_rate)
+
+                    summary = 'Episode {:5d}/{:5d} | Loss {:8.4f} | Exploration {:.2f} | ' + \
+                              'Fruits {} | Timesteps {:4d} | Train Steps {:7d}'
+                    print(summary.format(
+                        episode + 1, num_episodes, loss, exploration_rate,
+                        stats['fruits_eaten'], stats['timesteps_survived'], self.train_steps,
+                    ))
+                    episode += 1
+                    loss = 0.0
+        finally:
+            rollout.stop()
+
         self.model.save('dqn-final.model')
 
+    def _learn(self, num_gradient_steps, batch_size, discount_factor, sync_actors, sync_freq, target_sync_freq):
+        """
+        Take the gradient steps, sending the model weights to the actors and to the target network when it's time to.
+
+        Args:
+            num_gradient_steps (int): the number of batches to learn on.
+            batch_size (int): the size of the learning sample for experience replay.
+            discount_factor (float): discount factor (gamma) for computing the value function.
+            sync_actors: a function that takes the model weights every `sync_freq` training steps
+                (None if the actors use the model itself).
+            sync_freq (int): the number of training steps between the syncs of the actors.
+            target_sync_freq (int): the number of training steps between the syncs of the target network.
+
+        Returns:
+            The sum of the training losses.
+        """
+        loss = 0.0
+        for _ in range(num_gradient_steps):
+            batch_loss = self._train_on_batch(batch_size, discount_factor)
+            if batch_loss is None:
+                break
+            loss += batch_loss
+            self.train_steps += 1
+            if sync_actors is not None and self.train_steps % sync_freq == 0:
+                sync_actors(self.model.get_weights())
+            if target_sync_freq and self.train_steps % target_sync_freq == 0:
+                self.target_model.set_weights(self.model.get_weights())
+        return loss
+
+    def _train_on_batch(self, batch_size, discount_factor):
+        """
+        Learn on a batch sampled from experience replay.
+
+        Returns:
+            The training loss, or None if there is nothing to learn from yet.
+        """
+        if self.prefetcher is not None:
+            batch = self.prefetcher.get_batch(self.model, discount_factor, target_model=self.target_model)
+        else:
+            batch = self.memory.get_batch(
+                model=self.model,
+                batch_size=batch_size,
+                discount_factor=discount_factor,
+                target_model=self.target_model
+            )
+        if not batch:
+            return None
+
+        inputs, targets, sample_weights = batch
+        loss = float(self.model.train_on_batch(inputs, targets, sample_weight=sample_weights))
+        (self.prefetcher if self.prefetcher is not None else self.memory).update_priorities()
+        return loss
+
+    def _stop_prefetching(self):
+        """ Stop the background sampling thread, if there is one. """
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
+
     def act(self, observation, reward):
         """
         Choose the next action to take.
@@ -144,5 +296,87 @@ class DeepQNetworkAgent(AgentBase):
             The index of the action to take next.
         """
         state = self.get_last_frames(observation)
-        q = self.model.predict(state)[0]
+        q = self.inference_model.predict(state)[0]
         return np.argmax(q)
+
+
+def play_epsilon_greedy_episode(env, frames, model, exploration_rate):
+    """
+    Play a new episode in which every snake follows the epsilon-greedy policy of the same Q-network.
+
+    Args:
+        env: an instance of Snake environment.
+        frames (FrameStack): a frame stack with a row per snake, reset at the beginning of the episode.
+        model: the Q-network to choose the greedy actions with (None to always act randomly).
+        exploration_rate (float): the probability of taking a random action.
+
+    Returns:
+        A generator of (states, actions, timestep, states_next) tuples, one per timestep, where `states`
+        and `states_next` are the frame stacks of every snake before and after the timestep.
+        The state arrays are reused, so they have to be copied to be kept past the next step.
+    """
+    num_snakes = env.num_snakes
+    timestep = env.new_episode()
+    frames.reset([get_snake_observation(timestep.observation, i) for i in range(num_snakes)])
+    states = frames.state.copy()
+
+    while not timestep.is_episode_end:
+        # Explore: take random actions, or exploit: take the best known action for the state.
+        actions = [np.random.randint(env.num_actions) for _ in range(num_snakes)]
+        if model is not None:
+            exploit = np.random.random(num_snakes) >= exploration_rate
+            if exploit.any():
+                greedy_actions = np.argmax(model.predict(states), axis=1)
+                actions = np.where(exploit, greedy_actions, actions).tolist()
+
+        env.choose_action(actions)
+        timestep = env.timestep()
+        frames.push([get_snake_observation(timestep.observation, i) for i in range(num_snakes)])
+        yield states, actions, timestep, frames.state
+        # The frame stack view changes at the next step.
+        np.copyto(states, frames.state)
+
+
+class LearnerSchedule(object):
+    """ Decides how many gradient steps the learner takes as the new experience comes in. """
+
+    def __init__(self, batch_size, train_every=1, gradient_steps=1, warmup_size=0, replay_ratio=None):
+        """
+        Args:
+            batch_size (int): the size of the learning sample for experience replay.
+            train_every (int): the number of new transitions between the learning phases.
+            gradient_steps (int): the number of batches to learn on in every learning phase.
+            warmup_size (int): the number of transitions the memory should hold before the learning starts.
+            replay_ratio (float): if specified, learn on this many sampled transitions per new transition
+                on average, instead of using `train_every` and `gradient_steps`.
+        """
+        self.batch_size = batch_size
+        self.train_every = train_every
+        self.gradient_steps = gradient_steps
+        self.warmup_size = warmup_size
+        self.replay_ratio = replay_ratio
+        self.pending_transitions = 0
+        self.pending_gradient_steps = 0.0
+
+    def on_new_transitions(self, num_transitions, memory_size):
+        """
+        Account for the new transitions and get the number of gradient steps to take now.
+
+        Args:
+            num_transitions (int): the number of transitions added to the memory since the last call.
+            memory_size (int): the number of transitions in the memory.
+        """
+        # The transitions collected during the warm-up don't count, so that the learner doesn't
+        # take all the gradient steps it has missed at once.
+        if memory_size < self.warmup_size:
+            return 0
+
+        if self.replay_ratio is not None:
+            self.pending_gradient_steps += num_transitions * self.replay_ratio / self.batch_size
+            gradient_steps = int(self.pending_gradient_steps)
+            self.pending_gradient_steps -= gradient_steps
+            return gradient_steps
+
+        self.pending_transitions += num_transitions
+        num_phases, self.pending_transitions = divmod(self.pending_transitions, self.train_every)
+        return num_phases * self.gradient_steps
@@ -0,0 +1,57 @@
+import numpy as np
+
+from snakeai.agent.dqn import DeepQNetworkAgent
+
+
+class InferenceBroker(object):
+    """
+    Chooses the actions for several agents at once, running a single batched `predict`
+    for all DQN agents that share the same inference model instead of one `predict` per agent.
+    """
+
+    def act(self, agents, observations, rewards=None):
+        """
+        Choose the next action for every agent.
+
+        Args:
+            agents: a list of Snake agents, one per snake.
+            observations: a list of observations, one per agent.
+            rewards: (optional) a list of rewards received by each agent at the beginning of the current timestep.
+
+        Returns:
+            A list of action indices, one per agent.
+        """
+        if rewards is None:
+            rewards = [None] * len(agents)
+
+        actions = [None] * len(agents)
+        pending = {}
+        for i, (agent, observation, reward) in enumerate(zip(agents, observations, rewards)):
+            if isinstance(agent, DeepQNetworkAgent):
+                # The frame stack has to be updated even if the model is shared.
+                model = agent.inference_model
+                _, agent_indices, states = pending.setdefault(id(model), (model, [], []))
+                agent_indices.append(i)
+                states.append(agent.get_last_frames(observation))
+            else:
+                actions[i] = agent.act(observation, reward)
+
+        for model, agent_indices, states in pending.values():
+            for i, action in zip(agent_indices, predict_greedy_actions(model, np.concatenate(states))):
+                actions[i] = action
+        return actions
+
+
+def predict_greedy_actions(model, states):
+    """
+    Choose the best known action for every state in the batch with a single `predict` call.
+
+    Args:
+        model: a Q-network that maps a batch of states to a batch of Q-values.
+        states: a batch of agent states (frame stacks).
+
+    Returns:
+        An array of action indices, one per state.
+    """
+    q = model.predict(states)
+    return np.argmax(q, axis=1)
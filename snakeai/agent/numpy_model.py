@@ -0,0 +1,159 @@
+import numpy as np
+
+
+class NumPyQNetwork(object):
+    """
+    A lightweight float32 copy of a Keras Q-network that runs inference with NumPy only.
+
+    Convolutions are computed as a single matrix product over the image patches (im2col),
+    which avoids the framework overhead of `model.predict` for the small batches the actors use.
+    Only the layers used by the DQN models (valid-padded Conv2D, Dense, Activation, Flatten) are supported.
+    """
+
+    SUPPORTED_ACTIVATIONS = {
+        'linear': lambda x: x,
+        'relu': lambda x: np.maximum(x, 0),
+    }
+
+    def __init__(self, layers, weights=None):
+        """
+        Create a new network.
+
+        Args:
+            layers: a list of layer descriptions (as returned by `describe_keras_layers`).
+            weights: (optional) a list of weight arrays in the order of `keras.Model.get_weights`.
+        """
+        self.layers = layers
+        self.params = [None] * len(layers)
+        if weights is not None:
+            self.set_weights(weights)
+
+    @classmethod
+    def from_keras(cls, model):
+        """ Export the architecture and the current weights of a Keras model. """
+        return cls(describe_keras_layers(model), model.get_weights())
+
+    @property
+    def input_shape(self):
+        """ Get the shape of the network input, with None as the batch dimension. """
+        return self.layers[0]['input_shape']
+
+    @property
+    def output_shape(self):
+        """ Get the shape of the network output, with None as the batch dimension. """
+        return self.layers[-1]['output_shape']
+
+    def set_weights(self, weights):
+        """ Replace the weights of every layer (in the order of `keras.Model.get_weights`). """
+        weights = iter(weights)
+        for i, layer in enumerate(self.layers):
+            if layer['type'] == 'Conv2D':
+                kernel = np.asarray(next(weights), dtype=np.float32)
+                kernel_height, kernel_width, in_channels, out_channels = kernel.shape
+                bias = np.asarray(next(weights), dtype=np.float32) if layer['use_bias'] else None
+                # The patches are laid out as (row, column, channel), same as the kernel.
+                self.params[i] = (kernel.reshape(-1, out_channels), bias, kernel_height, kernel_width)
+            elif layer['type'] == 'Dense':
+                kernel = np.asarray(next(weights), dtype=np.float32)
+                bias = np.asarray(next(weights), dtype=np.float32) if layer['use_bias'] else None
+                self.params[i] = (kernel, bias)
+
+    def predict(self, states):
+        """
+        Compute the Q-values for a batch of states.
+
+        Args:
+            states: an array of the model input shape, with the batch as the first dimension.
+
+        Returns:
+            A float32 array of Q-values, one row per state.
+        """
+        x = np.asarray(states, dtype=np.float32)
+
+        # The images are kept as channels_last internally, `layout` is what the Keras model would see.
+        layout = self.layers[0].get('data_format', 'channels_last')
+        if x.ndim == 4 and layout == 'channels_first':
+            x = x.transpose(0, 2, 3, 1)
+
+        for layer, params in zip(self.layers, self.params):
+            layer_type = layer['type']
+            if layer_type == 'Conv2D':
+                x = _conv2d(x, params, layer['strides'])
+                layout = layer['data_format']
+            elif layer_type == 'Dense':
+                kernel, bias = params
+                x = x @ kernel
+                if bias is not None:
+                    x += bias
+            elif layer_type == 'Flatten':
+                if layout == 'channels_first':
+                    x = x.transpose(0, 3, 1, 2)
+                if layer.get('data_format') == 'channels_first':
+                    x = x.transpose(0, 2, 3, 1)
+                x = x.reshape(len(x), -1)
+            x = self.SUPPORTED_ACTIVATIONS[layer.get('activation', 'linear')](x)
+        return x
+
+
+def _conv2d(x, params, strides):
+    """ Apply a valid-padded convolution to a batch of channels_last images. """
+    kernel, bias, kernel_height, kernel_width = params
+    num_images, height, width, channels = x.shape
+    stride_y, stride_x = strides
+    out_height = (height - kernel_height) // stride_y + 1
+    out_width = (width - kernel_width) // stride_x + 1
+
+    x = np.ascontiguousarray(x)
+    s_n, s_h, s_w, s_c = x.strides
+    patches = np.lib.stride_tricks.as_strided(
+        x,
+        shape=(num_images, out_height, out_width, kernel_height, kernel_width, channels),
+        strides=(s_n, s_h * stride_y, s_w * stride_x, s_h, s_w, s_c),
+        writeable=False,
+    )
+    y = patches.reshape(num_images * out_height * out_width, -1) @ kernel
+    if bias is not None:
+        y += bias
+    return y.reshape(num_images, out_height, out_width, -1)
+
+
+def describe_keras_layers(model):
+    """
+    Describe the layers of a Keras model in plain Python objects that `NumPyQNetwork` understands.
+
+    The description can be pickled and sent to processes that don't import Keras.
+
+    Raises:
+        ValueError: if the model contains a layer or an option that is not supported.
+    """
+    layers = []
+    for layer in model.layers:
+        layer_type = type(layer).__name__
+        config = layer.get_config()
+        description = {
+            'type': layer_type,
+            'input_shape': tuple(layer.input_shape),
+            'output_shape': tuple(layer.output_shape),
+        }
+        if layer_type == 'Conv2D':
+            if config['padding'] != 'valid' or tuple(config.get('dilation_rate', (1, 1))) != (1, 1):
+                raise ValueError('Only valid-padded undilated convolutions are supported')
+            description.update(
+                strides=tuple(config['strides']),
+                data_format=config['data_format'],
+                use_bias=config['use_bias'],
+                activation=config['activation'],
+            )
+        elif layer_type == 'Dense':
+            description.update(use_bias=config['use_bias'], activation=config['activation'])
+        elif layer_type == 'Activation':
+            description.update(activation=config['activation'])
+        elif layer_type == 'Flatten':
+            description.update(data_format=config.get('data_format'))
+        else:
+            raise ValueError(f'Unsupported layer type: "{layer_type}"')
+
+        if description.get('activation', 'linear') not in NumPyQNetwork.SUPPORTED_ACTIVATIONS:
+            raise ValueError(f'Unsupported activation: "{description["activation"]}"')
+        layers.append(description)
+    return layers
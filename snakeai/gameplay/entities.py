@@ -1,3 +1,4 @@
+import functools
 import itertools
 import random
 
@@ -29,6 +30,12 @@ class CellType(object):
     WALL = 4
 
 
+# The heads and bodies of the snakes 0, 1, 2, ... are 20, 21, 22, ... and 30, 31, 32, ... respectively.
+MAX_SNAKES = 8
+ALL_SNAKE_HEADS = [CellType.SNAKE_HEAD0 + i for i in range(MAX_SNAKES)]
+ALL_SNAKE_BODIES = [CellType.SNAKE_BODY0 + i for i in range(MAX_SNAKES)]
+
+
 class SnakeDirection(object):
     """ Defines all possible directions the snake can take, as well as the corresponding offsets. """
 
@@ -146,6 +153,229 @@ class Snake(object):
         
 
 
+class SnakeGroup(object):
+    """
+    The state of several snakes on the same field, kept in arrays indexed by the snake id.
+
+    All bodies are ring buffers of flat (y * field_size + x) cell indices in one preallocated list,
+    and the directions are indices into `ALL_SNAKE_DIRECTIONS`. Indexing the group gives a view
+    of a single snake with the same `Point`-based API as `Snake`.
+
+    The head pointers are absolute positions in `bodies`, and the turns are looked up in tables,
+    so that a move or a turn is a handful of list operations without any modulo.
+    """
+
+    __slots__ = (
+        'field_size', 'num_snakes', 'directions', 'lengths', 'head_pointers', 'bodies',
+        '_capacity', '_offsets', '_turns', '_starts', '_ends',
+    )
+
+    def __init__(self, start_coords, field_size, length=3):
+        """
+        Create a new group of snakes.
+
+        Args:
+            start_coords: A list of points representing the initial positions of the snakes.
+            field_size: An integer specifying the size of the field the snakes live on.
+            length: An integer specifying the initial length of every snake.
+        """
+        self.field_size = field_size
+        self.num_snakes = len(start_coords)
+        self._capacity = field_size * field_size
+        self._offsets = tuple(direction.y * field_size + direction.x for direction in ALL_SNAKE_DIRECTIONS)
+        num_directions = len(ALL_SNAKE_DIRECTIONS)
+        self._turns = tuple(
+            tuple((direction + turn) % num_directions for direction in range(num_directions))
+            for turn in [0, -1, 1]
+        )
+        self._starts = [i * self._capacity for i in range(self.num_snakes)]
+        self._ends = [start + self._capacity for start in self._starts]
+        self.bodies = [0] * (self.num_snakes * self._capacity)
+        self.reset(start_coords, length)
+
+    def reset(self, start_coords, length=3):
+        """ Put the snakes back to their initial positions (vertically, heading north). """
+        north = ALL_SNAKE_DIRECTIONS.index(SnakeDirection.NORTH)
+        self.directions = [north] * self.num_snakes
+        self.lengths = [length] * self.num_snakes
+        self.head_pointers = list(self._starts)
+        for i, start_coord in enumerate(start_coords):
+            head = start_coord.y * self.field_size + start_coord.x
+            for k in range(length):
+                self.bodies[self._starts[i] + k] = head + k * self.field_size
+
+    def __len__(self):
+        return self.num_snakes
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.num_snakes:
+            raise IndexError('Snake index out of range')
+        return SnakeView(self, i)
+
+    def head_cell(self, i):
+        """ Get the flat cell index of the head of snake `i`. """
+        return self.bodies[self.head_pointers[i]]
+
+    def tail_cell(self, i):
+        """ Get the flat cell index of the tail of snake `i`. """
+        pointer = self.head_pointers[i] + self.lengths[i] - 1
+        if pointer >= self._ends[i]:
+            pointer -= self._capacity
+        return self.bodies[pointer]
+
+    def body_cells(self, i):
+        """ Get the flat cell indices of the body of snake `i`, from head to tail. """
+        start = self._starts[i]
+        return [
+            self.bodies[start + (self.head_pointers[i] - start + k) % self._capacity]
+            for k in range(self.lengths[i])
+        ]
+
+    def next_cell(self, i):
+        """ Get the flat cell index snake `i` will move to at its next step. """
+        return self.bodies[self.head_pointers[i]] + self._offsets[self.directions[i]]
+
+    def turn(self, i, action):
+        """ Change the direction of snake `i` according to the action. """
+        self.directions[i] = self._turns[action][self.directions[i]]
+
+    def move(self, i, grow=False):
+        """ Move snake `i` 1 step forward, keeping the tail in place if it grows. """
+        pointer = self.head_pointers[i]
+        next_cell = self.bodies[pointer] + self._offsets[self.directions[i]]
+        if pointer == self._starts[i]:
+            pointer += self._capacity
+        pointer -= 1
+        self.head_pointers[i] = pointer
+        self.bodies[pointer] = next_cell
+        if grow:
+            self.lengths[i] += 1
+
+    def to_point(self, cell):
+        """ Convert a flat cell index to a point. """
+        y, x = divmod(cell, self.field_size)
+        return Point(x, y)
+
+
+class SnakeView(object):
+    """ A single snake of a `SnakeGroup`, with the same API as `Snake`. """
+
+    __slots__ = ('group', 'index')
+
+    def __init__(self, group, index):
+        self.group = group
+        self.index = index
+
+    @property
+    def head(self):
+        """ Get the position of the snake's head. """
+        return self.group.to_point(self.group.head_cell(self.index))
+
+    @property
+    def tail(self):
+        """ Get the position of the snake's tail. """
+        return self.group.to_point(self.group.tail_cell(self.index))
+
+    @property
+    def body(self):
+        """ Get the positions of the snake's body, from head to tail. """
+        return [self.group.to_point(cell) for cell in self.group.body_cells(self.index)]
+
+    @property
+    def direction(self):
+        """ Get the current direction of the snake. """
+        return ALL_SNAKE_DIRECTIONS[self.group.directions[self.index]]
+
+    @direction.setter
+    def direction(self, direction):
+        self.group.directions[self.index] = ALL_SNAKE_DIRECTIONS.index(direction)
+
+    @property
+    def length(self):
+        """ Get the current length of the snake. """
+        return self.group.lengths[self.index]
+
+    def peek_next_move(self):
+        """ Get the point the snake will move to at its next step. """
+        return self.group.to_point(self.group.next_cell(self.index))
+
+    def turn_left(self):
+        """ At the next step, take a left turn relative to the current direction. """
+        self.group.turn(self.index, SnakeAction.TURN_LEFT)
+
+    def turn_right(self):
+        """ At the next step, take a right turn relative to the current direction. """
+        self.group.turn(self.index, SnakeAction.TURN_RIGHT)
+
+    def grow(self):
+        """ Grow the snake by 1 block from the head. """
+        self.group.move(self.index, grow=True)
+
+    def move(self):
+        """ Move the snake 1 step forward, taking the current direction into account. """
+        self.group.move(self.index)
+
+
+LEVEL_MAP_TO_CELL_TYPE = {
+    'A': CellType.SNAKE_HEAD0,
+    'B': CellType.SNAKE_HEAD1,
+    's': CellType.SNAKE_BODY0,
+    'x': CellType.SNAKE_BODY1,
+    '#': CellType.WALL,
+    'O': CellType.FRUIT,
+    '.': CellType.EMPTY,
+}
+
+# The snakes after the first two are marked with the letters from C to H.
+LEVEL_MAP_TO_CELL_TYPE.update({
+    head_symbol: cell_type
+    for head_symbol, cell_type in zip('CDEFGH', ALL_SNAKE_HEADS[2:])
+})
+LEVEL_MAP_TO_CELL_TYPE.update({
+    body_symbol: cell_type
+    for body_symbol, cell_type in zip('cdefgh', ALL_SNAKE_BODIES[2:])
+})
+
+
+class CompiledLevel(object):
+    """ Everything about a level map that stays the same from one episode to another. """
+
+    def __init__(self, level_map):
+        """
+        Parse the level map.
+
+        Args:
+            level_map: a list of strings representing the field objects (1 string per row).
+        """
+        try:
+            self.cells = np.array([
+                [LEVEL_MAP_TO_CELL_TYPE[symbol] for symbol in line]
+                for line in level_map
+            ], dtype=np.uint8)
+        except KeyError as err:
+            raise ValueError(f'Unknown level map symbol: "{err.args[0]}"')
+        self.cells.flags.writeable = False
+
+        # Flat (y * size + x) indices of the empty cells in the row-major order,
+        # and the position of each cell in that list (-1 if the cell is not empty).
+        self.empty_cells = np.flatnonzero(self.cells == CellType.EMPTY).tolist()
+        self.empty_cell_positions = [-1] * self.cells.size
+        for position, cell in enumerate(self.empty_cells):
+            self.empty_cell_positions[cell] = position
+
+        self.snake_heads = {}
+        for cell_type in ALL_SNAKE_HEADS:
+            positions = np.argwhere(self.cells == cell_type)
+            if len(positions):
+                self.snake_heads[cell_type] = Point(int(positions[0][1]), int(positions[0][0]))
+
+
+@functools.lru_cache(maxsize=32)
+def compile_level(level_map):
+    """ Get the compiled version of a level map (a tuple of strings), parsing each map only once. """
+    return CompiledLevel(level_map)
+
+
 class Field(object):
     """ Represents the playing field for the Snake game. """
 
@@ -157,23 +387,21 @@ class Field(object):
             level_map: a list of strings representing the field objects (1 string per row).
         """
         self.level_map = level_map
+        self._level = None
         self._cells = None
-        self._empty_cells = set()
-        self._level_map_to_cell_type = {
-            'A': CellType.SNAKE_HEAD0,
-            'B': CellType.SNAKE_HEAD1,
-            's': CellType.SNAKE_BODY0,
-            'x': CellType.SNAKE_BODY1,
-            '#': CellType.WALL,
-            'O': CellType.FRUIT,
-            '.': CellType.EMPTY,
-        }
+        self._flat_cells = None
+        self.random = random.Random()
+
+        # Empty cells are kept in a dense list (in arbitrary order) of flat cell indices,
+        # along with the position of every cell in that list (-1 if the cell is not empty).
+        # This allows adding, removing and sampling the empty cells in O(1).
+        self._empty_cells = []
+        self._empty_cell_positions = []
+        self._level_map_to_cell_type = LEVEL_MAP_TO_CELL_TYPE
         self._cell_type_to_level_map = {
             cell_type: symbol
             for symbol, cell_type in self._level_map_to_cell_type.items()
         }
-	#{20: 'A', 21: 'B', 3: 's', 4: '#', 1: 'O', 0: '.'}
-        print(self._cell_type_to_level_map)
 
     def __getitem__(self, point):
         """ Get the type of cell at the given point. """
@@ -183,14 +411,29 @@ class Field(object):
     def __setitem__(self, point, cell_type):
         """ Update the type of cell at the given point. """
         x, y = point
-        self._cells[y, x] = cell_type
+        self.set_cell(y * len(self.level_map) + x, cell_type)
+
+    def get_cell(self, cell):
+        """ Get the type of cell by its flat (y * size + x) index. """
+        return self._flat_cells[cell]
+
+    def set_cell(self, cell, cell_type):
+        """ Update the type of cell by its flat (y * size + x) index. """
+        self._flat_cells[cell] = cell_type
 
         # Do some internal bookkeeping to not rely on random selection of blank cells.
+        position = self._empty_cell_positions[cell]
         if cell_type == CellType.EMPTY:
-            self._empty_cells.add(point)
-        else:
-            if point in self._empty_cells:
-                self._empty_cells.remove(point)
+            if position < 0:
+                self._empty_cell_positions[cell] = len(self._empty_cells)
+                self._empty_cells.append(cell)
+        elif position >= 0:
+            # Swap with the last one and remove.
+            last_cell = self._empty_cells.pop()
+            if last_cell != cell:
+                self._empty_cells[position] = last_cell
+                self._empty_cell_positions[last_cell] = position
+            self._empty_cell_positions[cell] = -1
 
     def __str__(self):
         return '\n'.join(
@@ -203,60 +446,81 @@ class Field(object):
         """ Get the size of the field (size == width == height). """
         return len(self.level_map)
 
+    @property
+    def num_empty_cells(self):
+        """ Get the number of empty cells on the field. """
+        return len(self._empty_cells)
+
+    @property
+    def cells(self):
+        """ Get a read-only view of the field cells (it changes along with the field). """
+        cells = self._cells.view()
+        cells.flags.writeable = False
+        return cells
+
     def create_level(self):
         """ Create a new field based on the level map. """
-        try:
-            self._cells = np.array([
-                [self._level_map_to_cell_type[symbol] for symbol in line]
-                for line in self.level_map
-            ])
-            self._empty_cells = {
-                Point(x, y)
-                for y in range(self.size)
-                for x in range(self.size)
-                if self[(x, y)] == CellType.EMPTY
-            }
-        except KeyError as err:
-            raise ValueError(f'Unknown level map symbol: "{err.args[0]}"')
+        if self._level is None:
+            self._level = compile_level(tuple(self.level_map))
+
+        # Reuse the same cell array, so that the views of the previous episode stay valid.
+        if self._cells is None:
+            self._cells = self._level.cells.copy()
+            self._flat_cells = self._cells.reshape(-1)
+        else:
+            np.copyto(self._cells, self._level.cells)
+        self._empty_cells = list(self._level.empty_cells)
+        self._empty_cell_positions = list(self._level.empty_cell_positions)
 
     def find_snake_head(self, head):
-        """ Find the snake's head on the field. """
-        for y in range(self.size):
-            for x in range(self.size):
-                if self[(x, y)] == head:
-                    return Point(x, y)
-        raise ValueError('Initial snake position not specified on the level map')
+        """ Find the initial position of the snake's head on the level map. """
+        if self._level is None:
+            self._level = compile_level(tuple(self.level_map))
+        try:
+            return self._level.snake_heads[head]
+        except KeyError:
+            raise ValueError('Initial snake position not specified on the level map')
+
+    def seed(self, value):
+        """ Initialize the random state of the field (used to choose the empty cells). """
+        self.random.seed(value)
 
     def get_random_empty_cell(self):
         """ Get the coordinates of a random empty cell. """
-        return random.choice(list(self._empty_cells))
+        if not self._empty_cells:
+            raise IndexError('No empty cells left on the field')
+        y, x = divmod(self._empty_cells[self.random.randrange(len(self._empty_cells))], len(self.level_map))
+        return Point(x, y)
 
     def place_snake(self, snakes):
-        """ Put the snake on the field and fill the cells with its body. """
+        """ Put the snakes on the field and fill the cells with their bodies. """
         for i in range(len(snakes)):
-            self[snakes[i].head] = 20 if i == 0 else 21#CellType.SNAKE_HEAD
+            self[snakes[i].head] = ALL_SNAKE_HEADS[i]
             for snake_cell in itertools.islice(snakes[i].body, 1, len(snakes[i].body)):
-                self[snake_cell] = CellType.SNAKE_BODY0 if i == 0 else CellType.SNAKE_BODY1
+                self[snake_cell] = ALL_SNAKE_BODIES[i]
 
-    def update_snake_footprint(self, old_head, old_tail, new_head, i):
+    def update_snake_footprints(self, old_heads, old_tails, new_heads):
         """
-        Update field cells according to the new snake position.
-        
+        Update field cells according to the new positions of all snakes, moved at the same time.
+
         Environment must be as fast as possible to speed up agent training.
         Therefore, we'll sacrifice some duplication of information between
         the snake body and the field just to execute timesteps faster.
-        
+
         Args:
-            old_head: position of the head before the move. 
-            old_tail: position of the tail before the move.
-            new_head: position of the head after the move.
+            old_heads: flat indices of the head cells before the move, one per snake.
+            old_tails: flat indices of the tail cells before the move (None for the snakes that have grown).
+            new_heads: flat indices of the head cells after the move.
         """
-        self[old_head] = CellType.SNAKE_BODY0 if i == 0 else CellType.SNAKE_BODY1
-
-        # If we've grown at this step, the tail cell shouldn't move.
-        if old_tail:
-            self[old_tail] = CellType.EMPTY
-
-        # Support the case when we're chasing own tail.
-        if self[new_head] not in (CellType.WALL, CellType.SNAKE_BODY0, CellType.SNAKE_BODY1) or new_head == old_tail:
-            self[new_head] = 20 if i == 0 else 21#CellType.SNAKE_HEAD
+        for i, old_head in enumerate(old_heads):
+            self.set_cell(old_head, ALL_SNAKE_BODIES[i])
+
+        # The tails are cleared after the old heads, since a snake of length 1 has both in the same cell.
+        # If a snake has grown at this step, its tail cell shouldn't move.
+        for old_tail in old_tails:
+            if old_tail is not None:
+                self.set_cell(old_tail, CellType.EMPTY)
+
+        # The heads go last, so they take the place of the tails that have just moved away.
+        for i, new_head in enumerate(new_heads):
+            self.set_cell(new_head, ALL_SNAKE_HEADS[i])
@@ -1,21 +1,30 @@
+import collections
+import logging
 import pprint
 import random
 import time
 
 import numpy as np
-import pandas as pd
-import collections
 
-from .entities import Snake, Field, CellType, SnakeAction, ALL_SNAKE_ACTIONS
+from snakeai.utils.episode_log import EpisodeLogWriter
+from snakeai.utils.stats import CSVStatsSink
+from snakeai.utils.tracing import TRACE
+from .entities import compile_level, Field, CellType, SnakeGroup, ALL_SNAKE_ACTIONS, ALL_SNAKE_HEADS, ALL_SNAKE_BODIES, MAX_SNAKES
+
+
+logger = logging.getLogger(__name__)
 
 
 class Environment(object):
     """
     Represents the RL environment for the Snake game that implements the game logic,
     provides rewards for the agent and keeps track of game statistics.
+
+    The number of snakes is specified by `num_snakes` in the level config (2 by default),
+    and the level map must contain the head of every snake.
     """
 
-    def __init__(self, config, verbose=1):
+    def __init__(self, config, verbose=1, observation_mode='copy', stats_sink=None):
         """
         Create a new Snake RL environment.
         
@@ -24,12 +33,29 @@ class Environment(object):
             verbose (int): verbosity level:
                 0 = do not write any debug information;
                 1 = write a CSV file containing the statistics for every episode;
-                2 = same as 1, but also write a full log file containing the state of each timestep.
+                2 = same as 1, but also write a binary log of the seed and the actions of every episode,
+                    which can re-simulate the state of any timestep (see `snakeai.gameplay.replay`).
+            observation_mode (str): what the observations returned by the environment are:
+                'copy' = a new uint8 array at every timestep;
+                'view' = a read-only view of the field that keeps changing as the game goes on.
+                The consumer has to copy it if it needs to keep the observation around.
+            stats_sink (StatsSink): where to write the statistics for every episode.
+                By default, a CSV file is created if the verbosity level is 1 or higher.
         """
-        #self.fields = [Field(level_map=config['field0']), Field(level_map=config['field1'])]
+        if observation_mode not in ('copy', 'view'):
+            raise ValueError(f'Unknown observation mode: "{observation_mode}"')
+
+        self.num_snakes = config.get('num_snakes', 2)
+        if not 1 <= self.num_snakes <= MAX_SNAKES:
+            raise ValueError(f'The number of snakes should be between 1 and {MAX_SNAKES}')
+        if set(compile_level(tuple(config['field'])).snake_heads) != set(ALL_SNAKE_HEADS[:self.num_snakes]):
+            raise ValueError(f'The level map should contain the heads of exactly {self.num_snakes} snakes')
+
+        self.config = config
         self.field = Field(level_map=config['field'])
         self.snakes = None
         self.fruit = None
+        self.fruit_cell = None
         self.initial_snake_length = config['initial_snake_length']
         self.rewards = config['rewards']
         self.max_step_limit = config.get('max_step_limit', 1000)
@@ -37,15 +63,21 @@ class Environment(object):
 
         self.timestep_index = 0
         self.current_actions = None
-        self.stats = [EpisodeStatistics() for i in range(2)]
+        self.entered_cells = [None] * self.num_snakes
+        self.vacated_cells = [None] * self.num_snakes
+        self.head_on_cells = set()
+        self.stats = [EpisodeStatistics() for i in range(self.num_snakes)]
+        self.stats_summary = StatisticsAggregator(self.num_snakes)
         self.verbose = verbose
-        self.debug_file = None
-        self.stats_file = None
+        self.observation_mode = observation_mode
+        self.episode_log = None
+        self.stats_sink = stats_sink
 
     def seed(self, value):
         """ Initialize the random state of the environment to make results reproducible. """
         random.seed(value)
         np.random.seed(value)
+        self.field.seed(value)
 
     @property
     def observation_shape(self):
@@ -57,134 +89,187 @@ class Environment(object):
         """ Get the number of actions the agent can take. """
         return len(ALL_SNAKE_ACTIONS)
 
-    def new_episode(self):
-        """ Reset the environment and begin a new episode. """
+    def new_episode(self, seed=None):
+        """
+        Reset the environment and begin a new episode.
+
+        Args:
+            seed: (optional) the random seed to place the fruits with during the episode.
+        """
+        # Every logged episode gets a seed of its own, so that it can be re-simulated from the log alone.
+        if self.verbose >= 2:
+            if self.episode_log is None:
+                timestamp = time.strftime('%Y%m%d-%H%M%S')
+                self.episode_log = EpisodeLogWriter(f'snake-env-{timestamp}.replay', self.config)
+            if seed is None:
+                seed = self.field.random.getrandbits(32)
+            self.episode_log.begin_episode(seed, self.num_snakes)
+        if seed is not None:
+            self.field.seed(seed)
+
         self.field.create_level()
-        for i in range(2):
-            self.stats[i].reset()
+        for stats in self.stats:
+            stats.reset()
         self.timestep_index = 0
 
-        self.snakes = [Snake(self.field.find_snake_head(20), length=self.initial_snake_length), Snake(self.field.find_snake_head(21), length=self.initial_snake_length)]
+        start_coords = [self.field.find_snake_head(ALL_SNAKE_HEADS[i]) for i in range(self.num_snakes)]
+        if self.snakes is None:
+            self.snakes = SnakeGroup(start_coords, self.field.size, length=self.initial_snake_length)
+        else:
+            self.snakes.reset(start_coords, length=self.initial_snake_length)
         self.field.place_snake(self.snakes)
         self.generate_fruit()
         self.current_actions = None
         self.is_game_over = False
 
-        result = [TimestepResult(
+        result = JointTimestepResult(
             observation=self.get_observation(),
-            reward=0,
+            reward=[0] * self.num_snakes,
             is_episode_end=self.is_game_over
-        ) for i in range(2)]
+        )
 
-        for i in range(2):
-            self.record_timestep_stats(result[i])
+        self.record_timestep_stats(result)
         return result
 
-    def record_timestep_stats(self, result):
-        """ Record environment statistics according to the verbosity level. """
-        timestamp = time.strftime('%Y%m%d-%H%M%S')
+    def close(self):
+        """ Flush the remaining statistics and close the log files. """
+        if self.stats_sink is not None:
+            self.stats_sink.close()
+        if self.episode_log is not None:
+            self.episode_log.close()
+            self.episode_log = None
 
-        # Write CSV header for the stats file.
-        if self.verbose >= 1 and self.stats_file is None:
-            self.stats_file = open(f'snake-env-{timestamp}.csv', 'w')
-            # ryen
-            stats_csv_header_line = self.stats[0].to_dataframe()[:0].to_csv(index=None)
-            print(stats_csv_header_line, file=self.stats_file, end='', flush=True)
+    def record_timestep_stats(self, result):
+        """ Record the statistics of every snake (given the joint timestep result) according to the verbosity level. """
 
-        # Create a blank debug log file.
-        if self.verbose >= 2 and self.debug_file is None:
-            self.debug_file = open(f'snake-env-{timestamp}.log', 'w')
+        # Create the stats file.
+        if self.verbose >= 1 and self.stats_sink is None:
+            timestamp = time.strftime('%Y%m%d-%H%M%S')
+            self.stats_sink = CSVStatsSink(f'snake-env-{timestamp}.csv')
 
-        # ryen
-        self.stats[0].record_timestep(self.current_actions, result)
-        self.stats[0].timesteps_survived = self.timestep_index
+        for i, stats in enumerate(self.stats):
+            action = self.current_actions[i] if self.current_actions is not None else None
+            stats.record_timestep(action, result.reward[i])
+            stats.timesteps_survived = self.timestep_index
 
-        if self.verbose >= 2:
-            print(result, file=self.debug_file)
+        if self.episode_log is not None and self.current_actions is not None:
+            self.episode_log.record_timestep(self.current_actions)
 
         # Log episode stats if the appropriate verbosity level is set.
-        if result.is_episode_end:
-            if self.verbose >= 1:
-                # ryen
-                stats_csv_line = self.stats[0].to_dataframe().to_csv(header=False, index=None)
-                print(stats_csv_line, file=self.stats_file, end='', flush=True)
-            if self.verbose >= 2:
-                print(self.stats, file=self.debug_file)
-
-    def get_observation(self):
-        """ Observe the state of the environment. """
-        return np.copy(self.field._cells)
+        if self.is_game_over:
+            self.stats_summary.add(self.stats)
+            if self.stats_sink is not None:
+                # The snake index goes last, so that the existing columns keep their positions.
+                for i, stats in enumerate(self.stats):
+                    self.stats_sink.write(dict(stats.flatten(), snake=i))
+            if self.episode_log is not None:
+                self.episode_log.end_episode()
+
+    def get_observation(self, out=None):
+        """
+        Observe the state of the environment.
+
+        Args:
+            out: (optional) a uint8 array of `observation_shape` to write the observation into.
+
+        Returns:
+            `out` if specified, otherwise a copy or a read-only view of the field cells,
+            depending on the observation mode.
+        """
+        if out is not None:
+            np.copyto(out, self.field._cells)
+            return out
+        if self.observation_mode == 'view':
+            return self.field.cells
+        return self.field._cells.copy()
 
     def choose_action(self, actions):
-        """ Choose the action that will be taken at the next timestep. """
+        """
+        Choose the actions that will be taken at the next timestep.
+
+        Args:
+            actions: a list of actions, one per snake.
+
+        Raises:
+            ValueError: if the number of actions doesn't match the number of snakes.
+        """
+        if len(actions) != self.num_snakes:
+            raise ValueError(f'Expected {self.num_snakes} actions, one per snake, got {len(actions)}')
 
         self.current_actions = actions
-        for i in range(len(actions)):
-            if actions[i] == SnakeAction.TURN_LEFT:
-                self.snakes[i].turn_left()
-            elif actions[i] == SnakeAction.TURN_RIGHT:
-                self.snakes[i].turn_right()
+        for i, action in enumerate(actions):
+            self.snakes.turn(i, action)
 
     def timestep(self):
-        """ Execute the timestep and return the new observable state. """
+        """
+        Execute the timestep and return the new observable state.
+
+        All snakes move at the same time: their fate is decided from the state before the move,
+        so the outcome doesn't depend on the order of the snakes.
+        """
 
         self.timestep_index += 1
-        rewards = [0,0]
-        old_heads= []
-        old_tails = []
-        results = []
-        for i in range(2):
-            old_heads.append(self.snakes[i].head)
-            old_tails.append(self.snakes[i].tail)
-
-            # Are we about to eat the fruit?
-            if self.snakes[i].peek_next_move() == self.fruit:
-                self.snakes[i].grow()
-                self.generate_fruit()
-                old_tails[i] = None
-                rewards[i] += self.rewards['ate_fruit'] * self.snakes[i].length
+        snakes = self.snakes
+        field = self.field
+        snake_indices = range(self.num_snakes)
+
+        # Remember what the heads are moving into and which tails are moving away before anything changes.
+        old_heads = [snakes.head_cell(i) for i in snake_indices]
+        new_heads = [snakes.next_cell(i) for i in snake_indices]
+        ate_fruit = [new_head == self.fruit_cell for new_head in new_heads]
+        self.entered_cells = [field.get_cell(new_head) for new_head in new_heads]
+        self.vacated_cells = [None if ate_fruit[i] else snakes.tail_cell(i) for i in snake_indices]
+        self.head_on_cells = _find_shared_cells(new_heads)
+
+        for i in snake_indices:
+            snakes.move(i, grow=ate_fruit[i])
+        field.update_snake_footprints(old_heads, self.vacated_cells, new_heads)
+        if any(ate_fruit):
+            self.generate_fruit()
+
+        # The field is only formatted if someone is listening at the TRACE level.
+        if logger.isEnabledFor(TRACE):
+            logger.log(TRACE, 'Timestep %d:\n%s', self.timestep_index, field)
+
+        rewards = [0] * self.num_snakes
+        for i in snake_indices:
+            # Are we eating the fruit?
+            if ate_fruit[i]:
+                rewards[i] = self.rewards['ate_fruit'] * snakes.lengths[i]
                 self.stats[i].fruits_eaten += 1
 
-            # If not, just move forward.
+            # If not, we've just moved forward.
             else:
-                if i == 0 or i == 1:
-                    self.snakes[i].move()
-                    rewards[i] += self.rewards['timestep']
+                rewards[i] = self.rewards['timestep']
 
-            self.field.update_snake_footprint(old_heads[i], old_tails[i], self.snakes[i].head, i)
-
-            # Hit a wall or own body?
-            print(self.field)
-            print(self.get_observation())
+            # Hit a wall, own body or another snake?
             if not self.is_alive(i):
                 if self.has_hit_wall(i):
                     self.stats[i].termination_reason = 'hit_wall'
-                    print("snake %d hit wall" % i)
                 if self.has_hit_own_body(i):
-                    print("snake %d hit own body" % i)
                     self.stats[i].termination_reason = 'hit_own_body'
                 if self.has_hit_other_body(i):
-                    print("snake %d hit other body" % i)
                     self.stats[i].termination_reason = 'hit_other_body'
+                logger.debug('Snake %d died at timestep %d: %s', i, self.timestep_index, self.stats[i].termination_reason)
 
-                self.field[self.snakes[i].head] = 20 if i == 0 else 21 #CellType.SNAKE_HEAD
                 self.is_game_over = True
                 rewards[i] = self.rewards['died']
 
-            # Exceeded the limit of moves?
-            if self.timestep_index >= self.max_step_limit:
-                self.is_game_over = True
-                self.stats.termination_reason = 'timestep_limit_exceeded'
+        # Exceeded the limit of moves?
+        if self.timestep_index >= self.max_step_limit:
+            self.is_game_over = True
+            for stats in self.stats:
+                if stats.termination_reason is None:
+                    stats.termination_reason = 'timestep_limit_exceeded'
 
-            results.append(TimestepResult(
-                observation=self.get_observation(),
-                reward=rewards[i],
-                is_episode_end=self.is_game_over
-            ))
+        result = JointTimestepResult(
+            observation=self.get_observation(),
+            reward=rewards,
+            is_episode_end=self.is_game_over
+        )
 
-            self.record_timestep_stats(results[i])
-        return results
-    
+        self.record_timestep_stats(result)
+        return result
 
     def generate_fruit(self, position=None):
         """ Generate a new fruit at a random unoccupied cell. """
@@ -192,29 +277,79 @@ class Environment(object):
             position = self.field.get_random_empty_cell()
         self.field[position] = CellType.FRUIT
         self.fruit = position
+        self.fruit_cell = position.y * self.field.size + position.x
 
     def has_hit_wall(self, i):
-        """ True if the snake has hit a wall, False otherwise. """
-        return self.field[self.snakes[i].head] == CellType.WALL
+        """ True if the snake has hit a wall at the last timestep, False otherwise. """
+        return self.entered_cells[i] == CellType.WALL
 
     def has_hit_own_body(self, i):
-        """ True if the snake has hit its own body, False otherwise. """
-        if i == 0:
-            return self.field[self.snakes[i].head] == CellType.SNAKE_BODY0 #or self.field[self.snakes[i].head] == CellType.SNAKE_HEAD0
-        else:
-            return self.field[self.snakes[i].head] == CellType.SNAKE_BODY1 #or self.field[self.snakes[i].head] == CellType.SNAKE_HEAD1
+        """ True if the snake has hit its own body at the last timestep, False otherwise. """
+        return self.entered_cells[i] == ALL_SNAKE_BODIES[i] and self.snakes.head_cell(i) != self.vacated_cells[i]
 
     def has_hit_other_body(self, i):
-        if i == 0:
-            return self.field[self.snakes[i].head] == CellType.SNAKE_BODY1 or self.field[self.snakes[i].head] == CellType.SNAKE_HEAD1 or len(set(list(collections.deque(self.snakes[i].body))).intersection(list(collections.deque(self.snakes[i+1].body)))) > 0
-        else:
-            return self.field[self.snakes[i].head] == CellType.SNAKE_BODY0 or self.field[self.snakes[i].head] == CellType.SNAKE_HEAD0 or len(set(list(collections.deque(self.snakes[i].body))).intersection(list(collections.deque(self.snakes[i-1].body)))) > 0
+        """
+        True if the snake has hit another snake at the last timestep, False otherwise.
+
+        The bodies never overlap before the timestep, so it's enough to know what the heads
+        have moved into and which tails have moved out of the way. Two heads moving
+        into the same cell kill both snakes.
+        """
+        head = self.snakes.head_cell(i)
+        owner = _CELL_OWNERS[self.entered_cells[i]]
+        if owner >= 0 and owner != i and head != self.vacated_cells[owner]:
+            return True
+        return head in self.head_on_cells
 
     def is_alive(self, i):
         """ True if the snake is still alive, False otherwise. """
         return not self.has_hit_wall(i) and not self.has_hit_own_body(i) and not self.has_hit_other_body(i)
 
 
+def _find_shared_cells(cells):
+    """ Get the set of cells that occur in the list more than once. """
+    seen_cells = set()
+    shared_cells = set()
+    for cell in cells:
+        if cell in seen_cells:
+            shared_cells.add(cell)
+        seen_cells.add(cell)
+    return shared_cells
+
+
+def get_snake_observation(observation, snake_index):
+    """
+    Convert a field observation to the point of view of the specified snake.
+
+    The snake sees its own head and body as 2 and 3 respectively, while the other snakes
+    are treated as empty space.
+
+    Args:
+        observation: a field observation returned by the environment.
+        snake_index (int): the index of the snake.
+
+    Returns:
+        A new observation array of the same shape.
+    """
+    return _SNAKE_OBSERVATION_TABLES[snake_index][observation]
+
+
+def _create_snake_observation_table(snake_index):
+    table = np.arange(max(ALL_SNAKE_BODIES) + 1)
+    table[ALL_SNAKE_HEADS + ALL_SNAKE_BODIES] = CellType.EMPTY
+    table[[ALL_SNAKE_HEADS[snake_index], ALL_SNAKE_BODIES[snake_index]]] = [2, 3]
+    return table
+
+
+_SNAKE_OBSERVATION_TABLES = [_create_snake_observation_table(i) for i in range(MAX_SNAKES)]
+
+# The index of the snake every cell type belongs to (-1 if it's not a snake cell).
+_CELL_OWNERS = [
+    ALL_SNAKE_HEADS.index(cell) if cell in ALL_SNAKE_HEADS else ALL_SNAKE_BODIES.index(cell) if cell in ALL_SNAKE_BODIES else -1
+    for cell in range(max(ALL_SNAKE_BODIES) + 1)
+]
+
+
 class TimestepResult(object):
     """ Represents the information provided to the agent after each timestep. """
 
@@ -224,11 +359,47 @@ class TimestepResult(object):
         self.is_episode_end = is_episode_end
 
     def __str__(self):
-        field_map = '\n'.join([
-            ''.join(str(cell) for cell in row)
-            for row in self.observation
-        ])
-        return f'{field_map}\nR = {self.reward}   end={self.is_episode_end}\n'
+        return _format_timestep_result(self)
+
+
+class JointTimestepResult(object):
+    """
+    Represents the information provided to all agents after each timestep.
+
+    Indexing the result gives the `TimestepResult` of a single snake.
+    """
+
+    def __init__(self, observation, reward, is_episode_end):
+        """
+        Args:
+            observation: the current state of the field, shared by all snakes.
+            reward: a list of rewards received by each snake.
+            is_episode_end: whether the episode has ended at this timestep.
+        """
+        self.observation = observation
+        self.reward = reward
+        self.is_episode_end = is_episode_end
+
+    def __len__(self):
+        return len(self.reward)
+
+    def __getitem__(self, i):
+        return TimestepResult(self.observation, self.reward[i], self.is_episode_end)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __str__(self):
+        return _format_timestep_result(self)
+
+
+def _format_timestep_result(result):
+    """ Format the field of a timestep result, followed by the reward(s) and whether the episode has ended. """
+    field_map = '\n'.join([
+        ''.join(str(cell) for cell in row)
+        for row in result.observation
+    ])
+    return f'{field_map}\nR = {result.reward}   end={result.is_episode_end}\n'
 
 
 class EpisodeStatistics(object):
@@ -248,12 +419,11 @@ class EpisodeStatistics(object):
             for action in ALL_SNAKE_ACTIONS
         }
 
-    def record_timestep(self, action, result):
-        """ Update the stats based on the current timestep results. """
-        self.sum_episode_rewards += result.reward
+    def record_timestep(self, action, reward):
+        """ Update the stats based on the action taken and the reward received at the current timestep. """
+        self.sum_episode_rewards += reward
         if action is not None:
-            #self.action_counter[action] += 1
-            pass
+            self.action_counter[action] += 1
 
     def flatten(self):
         """ Format all episode statistics as a flat object. """
@@ -272,7 +442,67 @@ class EpisodeStatistics(object):
 
     def to_dataframe(self):
         """ Convert the episode statistics to a Pandas data frame. """
+        # Pandas is slow to import and is not needed to run the environment.
+        import pandas as pd
         return pd.DataFrame([self.flatten()])
 
     def __str__(self):
         return pprint.pformat(self.flatten())
+
+
+class StatisticsAggregator(object):
+    """
+    Accumulates the statistics of every snake across many episodes in constant memory.
+
+    Useful for keeping an eye on the balance between the snakes in self-play
+    without going through the per-episode logs.
+    """
+
+    TERMINATION_REASONS = ['hit_wall', 'hit_own_body', 'hit_other_body', 'timestep_limit_exceeded']
+
+    def __init__(self, num_snakes):
+        self.num_snakes = num_snakes
+        self.reset()
+
+    def reset(self):
+        """ Forget all previously aggregated episodes. """
+        self.num_episodes = 0
+        self.timesteps_survived = np.zeros(self.num_snakes, dtype=np.int64)
+        self.sum_episode_rewards = np.zeros(self.num_snakes)
+        self.fruits_eaten = np.zeros(self.num_snakes, dtype=np.int64)
+        self.action_counter = np.zeros((self.num_snakes, len(ALL_SNAKE_ACTIONS)), dtype=np.int64)
+        self.termination_reasons = [collections.Counter() for _ in range(self.num_snakes)]
+
+    def add(self, episode_stats):
+        """ Add an episode, given the list of `EpisodeStatistics` for every snake. """
+        self.num_episodes += 1
+        for i, stats in enumerate(episode_stats):
+            self.timesteps_survived[i] += stats.timesteps_survived
+            self.sum_episode_rewards[i] += stats.sum_episode_rewards
+            self.fruits_eaten[i] += stats.fruits_eaten
+            for action in ALL_SNAKE_ACTIONS:
+                self.action_counter[i, action] += stats.action_counter[action]
+            self.termination_reasons[i][stats.termination_reason] += 1
+
+    def flatten(self, snake_index):
+        """ Format the average statistics of the specified snake as a flat object. """
+        num_episodes = max(self.num_episodes, 1)
+        num_actions = max(int(self.action_counter[snake_index].sum()), 1)
+        flat_stats = {
+            'episodes': self.num_episodes,
+            'mean_timesteps_survived': float(self.timesteps_survived[snake_index] / num_episodes),
+            'mean_episode_reward': float(self.sum_episode_rewards[snake_index] / num_episodes),
+            'mean_fruits_eaten': float(self.fruits_eaten[snake_index] / num_episodes),
+        }
+        flat_stats.update({
+            f'termination_rate_{reason}': self.termination_reasons[snake_index][reason] / num_episodes
+            for reason in self.TERMINATION_REASONS
+        })
+        flat_stats.update({
+            f'action_rate_{action}': float(self.action_counter[snake_index, action] / num_actions)
+            for action in ALL_SNAKE_ACTIONS
+        })
+        return flat_stats
+
+    def __str__(self):
+        return pprint.pformat([self.flatten(i) for i in range(self.num_snakes)])
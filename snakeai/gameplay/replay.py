@@ -0,0 +1,173 @@
+""" Records compact traces of the played episodes and replays them (or the logged ones) without the agents. """
+
+import itertools
+import json
+
+import numpy as np
+
+from .entities import Point
+from .environment import Environment
+
+
+class EpisodeRecording(object):
+    """
+    Everything needed to replay an episode on the same level: the actions and the fruit positions.
+
+    The snakes always start from the places defined by the level map, and the fruit positions
+    are the only random part of the game, so the recording is a few bytes per timestep.
+    """
+
+    def __init__(self, actions, fruits):
+        """
+        Create a new recording.
+
+        Args:
+            actions: a (num_timesteps, num_snakes) array of the actions taken at every timestep.
+            fruits: a (num_fruits, 2) array of the (x, y) positions of the fruits, in the order they appeared.
+        """
+        self.actions = np.asarray(actions, dtype=np.uint8)
+        self.fruits = np.asarray(fruits, dtype=np.int16)
+
+    @property
+    def num_timesteps(self):
+        """ Get the number of timesteps in the episode. """
+        return len(self.actions)
+
+
+class EpisodeRecorder(object):
+    """ Records the episodes played in the environment, to be replayed and rendered later. """
+
+    def __init__(self, env):
+        """
+        Create a new recorder.
+
+        Args:
+            env: the environment to record.
+        """
+        self.env = env
+        self.recordings = []
+        self.actions = []
+        self.fruits = []
+
+    def begin_episode(self):
+        """ Start recording a new episode (call after `Environment.new_episode`). """
+        self.actions = []
+        self.fruits = [self.env.fruit]
+
+    def record_timestep(self, actions):
+        """ Record the actions of the last timestep (call after `Environment.timestep`). """
+        self.actions.append(actions)
+        # A new fruit is only generated when the old one has been eaten, so it can't be at the same place.
+        if self.env.fruit != self.fruits[-1]:
+            self.fruits.append(self.env.fruit)
+
+    def end_episode(self):
+        """ Finish recording the current episode. """
+        recording = EpisodeRecording(np.reshape(self.actions, (-1, self.env.num_snakes)), self.fruits)
+        self.recordings.append(recording)
+        return recording
+
+
+class ReplayEnvironment(Environment):
+    """ An environment that replays the recorded episodes, placing the fruits where they originally were. """
+
+    def __init__(self, config):
+        super().__init__(config, verbose=0)
+        self._fruits = iter([])
+
+    def generate_fruit(self, position=None):
+        """ Put the next recorded fruit on the field. """
+        if position is None:
+            position = Point(*next(self._fruits))
+        super().generate_fruit(position)
+
+    def replay(self, recording):
+        """
+        Replay the episode.
+
+        Args:
+            recording (EpisodeRecording): the episode to replay.
+
+        Returns:
+            A generator of the field cells at the beginning and after every timestep.
+            The cells are a read-only view that changes as the replay goes on.
+        """
+        self._fruits = iter(recording.fruits.tolist())
+        self.new_episode()
+        yield self.field.cells
+        for actions in recording.actions:
+            self.choose_action(actions.tolist())
+            self.timestep()
+            yield self.field.cells
+
+
+def save_recordings(filename, config, recordings):
+    """
+    Save the recorded episodes, along with the level they were played on, to a compressed NumPy archive.
+
+    Args:
+        filename: the name of the file to write.
+        config (dict): the level configuration.
+        recordings: a list of `EpisodeRecording`.
+    """
+    np.savez_compressed(
+        filename,
+        config=np.array(json.dumps(config)),
+        actions=np.concatenate([recording.actions for recording in recordings]),
+        fruits=np.concatenate([recording.fruits for recording in recordings]),
+        num_timesteps=np.array([len(recording.actions) for recording in recordings]),
+        num_fruits=np.array([len(recording.fruits) for recording in recordings]),
+    )
+
+
+def load_recordings(filename):
+    """
+    Load the episodes saved by `save_recordings`.
+
+    Returns:
+        A tuple (config, recordings) of the level configuration and the list of `EpisodeRecording`.
+    """
+    with np.load(filename) as archive:
+        config = json.loads(str(archive['config']))
+        actions = np.split(archive['actions'], np.cumsum(archive['num_timesteps'])[:-1])
+        fruits = np.split(archive['fruits'], np.cumsum(archive['num_fruits'])[:-1])
+    return config, [EpisodeRecording(*episode) for episode in zip(actions, fruits)]
+
+
+def replay_logged_episode(log, episode):
+    """
+    Re-simulate an episode from the binary episode log written by the environment.
+
+    Args:
+        log (EpisodeLogReader): the opened episode log.
+        episode (int): the index of the episode in the log.
+
+    Returns:
+        A generator of the environment at the beginning and after every timestep of the episode.
+        The same environment is yielded every time, so it has to be inspected before moving on.
+    """
+    seed, actions = log.read_episode(episode)
+    env = Environment(config=log.config, verbose=0)
+    env.new_episode(seed=seed)
+    yield env
+    for joint_actions in actions:
+        env.choose_action(joint_actions.tolist())
+        env.timestep()
+        yield env
+
+
+def get_logged_field(log, episode, timestep):
+    """
+    Re-simulate a logged episode up to the timestep and get the state of the field.
+
+    Args:
+        log (EpisodeLogReader): the opened episode log.
+        episode (int): the index of the episode in the log.
+        timestep (int): the timestep of the episode (0 is the state before the first move).
+
+    Returns:
+        The `Field` after the timestep (its string representation is the full board).
+    """
+    for env in itertools.islice(replay_logged_episode(log, episode), timestep, None):
+        return env.field
+    raise IndexError(f'Episode {episode} has no timestep {timestep}')
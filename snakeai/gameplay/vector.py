@@ -0,0 +1,303 @@
+""" Provides a vectorized Snake environment that runs a batch of games in lockstep. """
+
+import random
+
+import numpy as np
+
+from .entities import (
+    compile_level, CellType, SnakeAction, SnakeDirection,
+    ALL_SNAKE_ACTIONS, ALL_SNAKE_DIRECTIONS, ALL_SNAKE_HEADS, ALL_SNAKE_BODIES, MAX_SNAKES,
+)
+
+
+class BatchEnvironment(object):
+    """
+    Runs N independent Snake games in lockstep.
+
+    The game rules are exactly the same as in `Environment`, but the state of all games is kept
+    in stacked NumPy arrays: an (N, size * size) cell grid and a ring buffer of flat cell indices
+    for every snake body. Each timestep is executed with array operations across the whole batch
+    and all snakes, and finished games are reset automatically.
+    """
+
+    def __init__(self, config, num_envs, observation_mode='copy'):
+        """
+        Create a new batch of Snake environments.
+
+        Args:
+            config (dict): level configuration, typically found in JSON configs.
+            num_envs (int): the number of games to run in parallel.
+            observation_mode (str): 'copy' to return new observation arrays at every timestep,
+                or 'view' to return read-only views of the cells (see `Environment`).
+        """
+        if observation_mode not in ('copy', 'view'):
+            raise ValueError(f'Unknown observation mode: "{observation_mode}"')
+        level = compile_level(tuple(config['field']))
+        self.num_snakes = config.get('num_snakes', 2)
+        if not 1 <= self.num_snakes <= MAX_SNAKES:
+            raise ValueError(f'The number of snakes should be between 1 and {MAX_SNAKES}')
+        if set(level.snake_heads) != set(ALL_SNAKE_HEADS[:self.num_snakes]):
+            raise ValueError(f'The level map should contain the heads of exactly {self.num_snakes} snakes')
+
+        self.num_envs = num_envs
+        self.observation_mode = observation_mode
+        self.size = len(level.cells)
+        self.initial_snake_length = config['initial_snake_length']
+        self.rewards = config['rewards']
+        self.max_step_limit = config.get('max_step_limit', 1000)
+
+        # Everything about the level that does not change between episodes is computed once.
+        self._initial_cells = level.cells.ravel()
+        self._initial_empty_cells = level.empty_cells
+        self._initial_bodies = [
+            self._to_flat(level.snake_heads[head]) + self.size * np.arange(self.initial_snake_length)
+            for head in ALL_SNAKE_HEADS[:self.num_snakes]
+        ]
+        self._direction_offsets = np.array([
+            direction.y * self.size + direction.x
+            for direction in ALL_SNAKE_DIRECTIONS
+        ])
+        self._action_turns = np.zeros(len(ALL_SNAKE_ACTIONS), dtype=np.int64)
+        self._action_turns[SnakeAction.TURN_LEFT] = -1
+        self._action_turns[SnakeAction.TURN_RIGHT] = 1
+        self._snake_indices = np.arange(self.num_snakes)
+        self._cell_owners = np.full(max(ALL_SNAKE_BODIES) + 1, -1, dtype=np.int64)
+        self._cell_owners[ALL_SNAKE_HEADS[:self.num_snakes]] = self._snake_indices
+        self._cell_owners[ALL_SNAKE_BODIES[:self.num_snakes]] = self._snake_indices
+
+        # Per-game state.
+        num_cells = self.size * self.size
+        self.cells = np.zeros((num_envs, num_cells), dtype=np.uint8)
+        self.bodies = np.zeros((num_envs, self.num_snakes, num_cells), dtype=np.int64)
+        self.head_pointers = np.zeros((num_envs, self.num_snakes), dtype=np.int64)
+        self.lengths = np.zeros((num_envs, self.num_snakes), dtype=np.int64)
+        self.directions = np.zeros((num_envs, self.num_snakes), dtype=np.int64)
+        self.fruits = np.zeros(num_envs, dtype=np.int64)
+        self.timestep_index = np.zeros(num_envs, dtype=np.int64)
+        self.fruits_eaten = np.zeros((num_envs, self.num_snakes), dtype=np.int64)
+        self.sum_episode_rewards = np.zeros((num_envs, self.num_snakes))
+
+        # Fruit placement mirrors `Field.get_random_empty_cell` (including the order of the dense
+        # empty cell list) so that the results match `Environment` for the same seed.
+        self._initial_empty_cell_positions = np.array(level.empty_cell_positions, dtype=np.int64)
+        self._empty_cells = np.zeros((num_envs, num_cells), dtype=np.int64)
+        self._empty_cell_positions = np.zeros((num_envs, num_cells), dtype=np.int64)
+        self._num_empty_cells = np.zeros(num_envs, dtype=np.int64)
+        self._random = [random.Random() for _ in range(num_envs)]
+
+    def seed(self, value):
+        """
+        Initialize the random state of every game to make results reproducible.
+
+        Args:
+            value: either a single integer (game `i` is seeded with `value + i`)
+                or a sequence of `num_envs` integers, one per game.
+        """
+        values = [value + i for i in range(self.num_envs)] if np.isscalar(value) else list(value)
+        if len(values) != self.num_envs:
+            raise ValueError(f'Expected {self.num_envs} seeds, got {len(values)}')
+        for rng, game_seed in zip(self._random, values):
+            rng.seed(game_seed)
+
+    @property
+    def observation_shape(self):
+        """ Get the shape of the state observed at each timestep by a single game. """
+        return self.size, self.size
+
+    @property
+    def num_actions(self):
+        """ Get the number of actions the agent can take. """
+        return len(ALL_SNAKE_ACTIONS)
+
+    def get_observation(self, out=None):
+        """
+        Observe the state of all games as an (N, size, size) uint8 array.
+
+        Args:
+            out: (optional) an array of the same shape to write the observation into.
+
+        Returns:
+            `out` if specified, otherwise a copy or a read-only view of the cells,
+            depending on the observation mode.
+        """
+        cells = self.cells.reshape((self.num_envs, self.size, self.size))
+        if out is not None:
+            np.copyto(out, cells)
+            return out
+        if self.observation_mode == 'view':
+            cells.flags.writeable = False
+            return cells
+        return cells.copy()
+
+    def new_episode(self):
+        """ Reset all games and begin a new episode in each of them. """
+        self._reset_games(np.arange(self.num_envs))
+        return BatchTimestepResult(
+            observation=self.get_observation(),
+            reward=np.zeros((self.num_envs, self.num_snakes)),
+            is_episode_end=np.zeros(self.num_envs, dtype=bool),
+        )
+
+    def choose_action(self, actions):
+        """
+        Choose the actions that will be taken at the next timestep.
+
+        Args:
+            actions: an (N, num_snakes) array of action indices, one per snake in each game.
+        """
+        actions = np.asarray(actions, dtype=np.int64).reshape((self.num_envs, self.num_snakes))
+        self.directions = (self.directions + self._action_turns[actions]) % len(ALL_SNAKE_DIRECTIONS)
+
+    def timestep(self):
+        """
+        Execute the timestep in every game and return the new observable states.
+
+        Games that have ended at this timestep are reset right away. Their final boards and
+        episode statistics are available in `terminal_observation` and `terminal_stats`,
+        while `observation` already holds the first state of the new episode.
+        """
+        games = np.arange(self.num_envs)
+        capacity = self.bodies.shape[2]
+        snakes = self._snake_indices
+        self.timestep_index += 1
+
+        # All snakes move at the same time, so everything is decided from the state before the move.
+        old_heads = self.bodies[games[:, None], snakes, self.head_pointers]
+        old_tails = self.bodies[games[:, None], snakes, (self.head_pointers + self.lengths - 1) % capacity]
+        heads = old_heads + self._direction_offsets[self.directions]
+        ate_fruit = heads == self.fruits[:, None]
+        entered_cells = self.cells[games[:, None], heads]
+        vacated_cells = np.where(ate_fruit, -1, old_tails)
+
+        # Hit a wall, own body or another snake? Moving into a tail that is moving away is fine,
+        # while two heads moving into the same cell kill both snakes.
+        owners = self._cell_owners[entered_cells]
+        owner_vacated_cells = np.take_along_axis(vacated_cells, np.maximum(owners, 0), axis=1)
+        hit_snake = (owners >= 0) & (heads != owner_vacated_cells)
+        head_on = (heads[:, :, None] == heads[:, None, :]).sum(axis=2) > 1
+        died = (entered_cells == CellType.WALL) | hit_snake | head_on
+
+        # Move the heads forward in the ring buffers. Growing simply means the tail stays in place.
+        self.head_pointers = (self.head_pointers - 1) % capacity
+        self.bodies[games[:, None], snakes, self.head_pointers] = heads
+        self.lengths += ate_fruit
+
+        # Update the snake footprints on the field, in the same order as `Field.update_snake_footprints`.
+        for i in snakes:
+            self.cells[games, old_heads[:, i]] = ALL_SNAKE_BODIES[i]
+        for i in snakes:
+            moved = ~ate_fruit[:, i]
+            self._set_cells(games[moved], old_tails[moved, i], CellType.EMPTY)
+        for i in snakes:
+            self._set_cells(games, heads[:, i], ALL_SNAKE_HEADS[i])
+        for game in np.flatnonzero(ate_fruit.any(axis=1)):
+            self._generate_fruit(game)
+
+        rewards = np.where(ate_fruit, self.rewards['ate_fruit'] * self.lengths, self.rewards['timestep']).astype(np.float64)
+        rewards[died] = self.rewards['died']
+        self.fruits_eaten += ate_fruit
+        game_over = died.any(axis=1)
+
+        # Exceeded the limit of moves?
+        game_over |= self.timestep_index >= self.max_step_limit
+        self.sum_episode_rewards += rewards
+
+        observation = self.get_observation()
+        terminal_observation = None
+        terminal_stats = None
+        if game_over.any():
+            # A view would be overwritten by the reset, and so would the statistics.
+            terminal_observation = observation.copy() if self.observation_mode == 'view' else observation
+            terminal_stats = {
+                'timesteps_survived': self.timestep_index.copy(),
+                'fruits_eaten': self.fruits_eaten.copy(),
+                'sum_episode_rewards': self.sum_episode_rewards.copy(),
+            }
+            self._reset_games(np.flatnonzero(game_over))
+            observation = self.get_observation()
+
+        return BatchTimestepResult(
+            observation=observation,
+            reward=rewards,
+            is_episode_end=game_over,
+            terminal_observation=terminal_observation,
+            terminal_stats=terminal_stats,
+        )
+
+    def _to_flat(self, point):
+        """ Convert a field point to a flat cell index. """
+        return point.y * self.size + point.x
+
+    def _set_cells(self, games, positions, cell_type):
+        """ Update the cells in the given games (at most one per game), keeping the empty cell lists up to date. """
+        was_empty = self._empty_cell_positions[games, positions] >= 0
+        self.cells[games, positions] = cell_type
+
+        # Only the cells that turn empty or stop being empty change the lists.
+        if cell_type == CellType.EMPTY:
+            games, positions = games[~was_empty], positions[~was_empty]
+            counts = self._num_empty_cells[games]
+            self._empty_cell_positions[games, positions] = counts
+            self._empty_cells[games, counts] = positions
+            self._num_empty_cells[games] += 1
+        else:
+            # Swap with the last one and remove, same as `Field` does.
+            games, positions = games[was_empty], positions[was_empty]
+            self._num_empty_cells[games] -= 1
+            list_positions = self._empty_cell_positions[games, positions]
+            last_cells = self._empty_cells[games, self._num_empty_cells[games]]
+            self._empty_cells[games, list_positions] = last_cells
+            self._empty_cell_positions[games, last_cells] = list_positions
+            self._empty_cell_positions[games, positions] = -1
+
+    def _generate_fruit(self, game):
+        """ Generate a new fruit at a random unoccupied cell of the given game. """
+        position = self._empty_cells[game, self._random[game].randrange(self._num_empty_cells[game])]
+        self._set_cells(np.array([game]), np.array([position]), CellType.FRUIT)
+        self.fruits[game] = position
+
+    def _reset_games(self, games):
+        """ Begin a new episode in the specified games. """
+        self.cells[games] = self._initial_cells
+        self.head_pointers[games] = 0
+        self.lengths[games] = self.initial_snake_length
+        self.directions[games] = ALL_SNAKE_DIRECTIONS.index(SnakeDirection.NORTH)
+        self.timestep_index[games] = 0
+        self.fruits_eaten[games] = 0
+        self.sum_episode_rewards[games] = 0
+        self._empty_cells[games, :len(self._initial_empty_cells)] = self._initial_empty_cells
+        self._empty_cell_positions[games] = self._initial_empty_cell_positions
+        self._num_empty_cells[games] = len(self._initial_empty_cells)
+
+        for i in range(self.num_snakes):
+            body = self._initial_bodies[i]
+            self.bodies[games, i, :len(body)] = body
+            head = np.repeat(body[0], len(games))
+            self._set_cells(games, head, ALL_SNAKE_HEADS[i])
+            for segment in body[1:]:
+                self._set_cells(games, np.repeat(segment, len(games)), ALL_SNAKE_BODIES[i])
+
+        for game in games:
+            self._generate_fruit(game)
+
+
+class BatchTimestepResult(object):
+    """ Represents the information provided to the agents after each batched timestep. """
+
+    def __init__(self, observation, reward, is_episode_end, terminal_observation=None, terminal_stats=None):
+        """
+        Args:
+            observation: an (N, size, size) array with the current state of each game.
+            reward: an (N, num_snakes) array of rewards received by each snake.
+            is_episode_end: an (N,) boolean array telling which games have ended at this timestep.
+            terminal_observation: the final (N, size, size) states before the ended games were reset,
+                or None if no game has ended.
+            terminal_stats: the statistics of the episodes before the ended games were reset, or None
+                if no game has ended. A dict of 'timesteps_survived' (N,), 'fruits_eaten' (N, num_snakes)
+                and 'sum_episode_rewards' (N, num_snakes) arrays, only meaningful for the ended games.
+        """
+        self.observation = observation
+        self.reward = reward
+        self.is_episode_end = is_episode_end
+        self.terminal_observation = terminal_observation
+        self.terminal_stats = terminal_stats
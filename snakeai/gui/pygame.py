@@ -2,8 +2,10 @@ import numpy as np
 import pygame
 import time
 
-from snakeai.agent import HumanAgent
-from snakeai.gameplay.entities import (CellType, SnakeAction, ALL_SNAKE_DIRECTIONS)
+from snakeai.agent import HumanAgent, InferenceBroker
+from snakeai.gameplay.entities import SnakeAction, ALL_SNAKE_DIRECTIONS
+from snakeai.gameplay.environment import get_snake_observation
+from snakeai.utils.rendering import Colors, TileAtlas
 
 
 class PyGameGUI:
@@ -23,11 +25,14 @@ class PyGameGUI:
 
     def __init__(self):
         pygame.init()
-        self.agents = [HumanAgent(), HumanAgent()]
+        self.agents = []
+        self.inference = InferenceBroker()
         self.env = None
         self.screen = None
         self.fps_clock = None
         self.timestep_watch = Stopwatch()
+        self.rendered_cells = None
+        self.tiles = None
 
     def load_environment(self, environment):
         """ Load the RL environment into the GUI. """
@@ -35,38 +40,42 @@ class PyGameGUI:
         screen_size = (self.env.field.size * self.CELL_SIZE, self.env.field.size * self.CELL_SIZE)
         self.screen = pygame.display.set_mode(screen_size)
         self.screen.fill(Colors.SCREEN_BACKGROUND)
+        self.rendered_cells = None
+        self.tiles = TileAtlas(self.CELL_SIZE)
+        self.agents = [HumanAgent() for _ in range(self.env.num_snakes)]
         pygame.display.set_caption('Snake')
 
     def load_agent(self, agents):
-        """ Load the RL agent into the GUI. """
+        """ Load the RL agents into the GUI, one per snake. """
         self.agents = agents
 
-    def render_cell(self, x, y):
-        """ Draw the cell specified by the field coordinates. """
-        cell_coords = pygame.Rect(
-            x * self.CELL_SIZE,
-            y * self.CELL_SIZE,
-            self.CELL_SIZE,
-            self.CELL_SIZE,
-        )
-        if self.env.field[x, y] == CellType.EMPTY:
-            pygame.draw.rect(self.screen, Colors.SCREEN_BACKGROUND, cell_coords)
-        else:
-            color = Colors.CELL_TYPE[self.env.field[x, y]]
-            pygame.draw.rect(self.screen, color, cell_coords, 1)
-
-            internal_padding = self.CELL_SIZE // 6 * 2
-            internal_square_coords = cell_coords.inflate((-internal_padding, -internal_padding))
-            pygame.draw.rect(self.screen, color, internal_square_coords)
-
     def render(self):
-        """ Draw the entire game frame. """
-        for x in range(self.env.field.size):
-            for y in range(self.env.field.size):
-                self.render_cell(x, y)
+        """
+        Draw the cells that have changed since the last frame.
+
+        Returns:
+            A list of the screen areas that have been redrawn (empty if nothing has changed).
+        """
+        cells = self.env.field.cells
+        if self.rendered_cells is None:
+            # Nothing has been drawn yet, so every cell is out of date.
+            self.rendered_cells = np.full(cells.shape, -1)
+
+        changed_y, changed_x = np.nonzero(cells != self.rendered_cells)
+        if len(changed_y) == 0:
+            return []
+
+        # Composing the whole frame from the tiles is a single array operation, cheaper than drawing cell by cell.
+        # Surface arrays are indexed by (x, y), hence the swap.
+        pygame.surfarray.blit_array(self.screen, self.tiles.render(cells).swapaxes(0, 1))
+        self.rendered_cells[:] = cells
+        return [
+            pygame.Rect(x * self.CELL_SIZE, y * self.CELL_SIZE, self.CELL_SIZE, self.CELL_SIZE)
+            for x, y in zip(changed_x, changed_y)
+        ]
 
-    def map_key_to_snake_action(self, key):
-        """ Convert a keystroke to an environment action. """
+    def map_key_to_snake_action(self, key, snake_idx=0):
+        """ Convert a keystroke to an environment action for the given snake. """
         actions = [
             SnakeAction.MAINTAIN_DIRECTION,
             SnakeAction.TURN_LEFT,
@@ -75,7 +84,7 @@ class PyGameGUI:
         ]
 
         key_idx = self.SNAKE_CONTROL_KEYS.index(key)
-        direction_idx = ALL_SNAKE_DIRECTIONS.index(self.env.snake.direction)
+        direction_idx = ALL_SNAKE_DIRECTIONS.index(self.env.snakes[snake_idx].direction)
         return np.roll(actions, -key_idx)[direction_idx]
 
     def run(self, num_episodes=1):
@@ -96,8 +105,9 @@ class PyGameGUI:
         # Initialize the environment.
         self.timestep_watch.reset()
         timestep_result = self.env.new_episode()
-        for i in range(2):
-            self.agents[i].begin_episode()
+        num_snakes = self.env.num_snakes
+        for agent in self.agents:
+            agent.begin_episode()
 
         is_human_agent = isinstance(self.agents[0], HumanAgent)
         timestep_delay = self.HUMAN_TIMESTEP_DELAY if is_human_agent else self.AI_TIMESTEP_DELAY
@@ -105,14 +115,14 @@ class PyGameGUI:
         # Main game loop.
         running = True
         while running:
-            actions = [SnakeAction.MAINTAIN_DIRECTION for i in range(2)]
+            actions = [SnakeAction.MAINTAIN_DIRECTION for i in range(num_snakes)]
 
             # Handle events.
             for event in pygame.event.get():
                 if event.type == pygame.KEYDOWN:
                     if is_human_agent and event.key in self.SNAKE_CONTROL_KEYS:
-                        for i in range(2):
-                            actions[i] = self.map_key_to_snake_action(event.key)
+                        for i in range(num_snakes):
+                            actions[i] = self.map_key_to_snake_action(event.key, i)
                     if event.key == pygame.K_ESCAPE:
                         raise QuitRequestedError
 
@@ -121,54 +131,35 @@ class PyGameGUI:
 
             # Update game state.
             timestep_timed_out = self.timestep_watch.time() >= timestep_delay
-            human_made_move = is_human_agent and action != SnakeAction.MAINTAIN_DIRECTION
+            human_made_move = is_human_agent and any(action != SnakeAction.MAINTAIN_DIRECTION for action in actions)
 
             if timestep_timed_out or human_made_move:
                 self.timestep_watch.reset()
 
                 if not is_human_agent:
-                    for i in range(2):
-                        if i == 0:
-                            print("observation:")
-                            print(np.where(timestep_result[i].observation==21))
-                            print(timestep_result[i].observation)
-                            print(timestep_result[i].observation[np.where(timestep_result[i].observation==21)])
-			    # if agent 0 then agent's head is 2 and agent1 is ignore
-			    # 20 agent 0
-			    # 21 agent 1
-                            timestep_result[i].observation[np.where(timestep_result[i].observation==21)]=0
-                            timestep_result[i].observation[np.where(timestep_result[i].observation==20)]=2
-                            timestep_result[i].observation[np.where(timestep_result[i].observation==31)]=0
-                            timestep_result[i].observation[np.where(timestep_result[i].observation==30)]=3
-                            print(timestep_result[i].observation)
-                            #timestep_result[i].observation
-                        elif i == 1:
-                            timestep_result[i].observation[np.where(timestep_result[i].observation==21)]=2
-                            timestep_result[i].observation[np.where(timestep_result[i].observation==20)]=0
-                            timestep_result[i].observation[np.where(timestep_result[i].observation==30)]=0
-                            timestep_result[i].observation[np.where(timestep_result[i].observation==31)]=3
-                        #actions[i] = self.agents[i].act(timestep_result[i].observation, timestep_result[i].reward)	
-                        actions[i] = self.agents[i].act(timestep_result[i].observation, None)	
-                        print(actions)
+                    # The observation is shared by all snakes, so every agent gets its own converted copy.
+                    observations = [get_snake_observation(timestep_result.observation, i) for i in range(num_snakes)]
+                    actions = self.inference.act(self.agents, observations)
 
                 self.env.choose_action(actions)
                 timestep_result = self.env.timestep()
 
-                for i in range(2):
-                    if timestep_result[i].is_episode_end:
-                        self.agents[i].end_episode()
-                        running = False
+                if timestep_result.is_episode_end:
+                    for agent in self.agents:
+                        agent.end_episode()
+                    running = False
+
+                scores = [snake.length - self.env.initial_snake_length for snake in self.env.snakes]
+                pygame.display.set_caption('[Score: {}]'.format('-'.join(f'{score:02d}' for score in scores)))
 
                 #if timestep_result[0].is_episode_end and timestep_result[1].is_episode_end:
                 #    self.agents[0].end_episode()
                 #    self.agents[1].end_episode()
                 #    running = False
-            # Render.
-            self.render()
-            score0 = self.env.snakes[0].length - self.env.initial_snake_length
-            score1 = self.env.snakes[1].length - self.env.initial_snake_length
-            pygame.display.set_caption(f'[Score: {score0:02d}-{score1:02d}]')
-            pygame.display.update()
+            # Render only the cells that have changed, and push only those to the display.
+            dirty_rects = self.render()
+            if dirty_rects:
+                pygame.display.update(dirty_rects)
             self.fps_clock.tick(self.FPS_LIMIT)
 
 
@@ -187,21 +178,6 @@ class Stopwatch(object):
         return pygame.time.get_ticks() - self.start_time
 
 
-class Colors:
-
-    SCREEN_BACKGROUND = (170, 204, 153)
-    CELL_TYPE = {
-        CellType.WALL: (56, 56, 56),
-        #CellType.SNAKE_BODY0: (105, 132, 164),
-        #CellType.SNAKE_BODY1: (164, 132, 105),
-        CellType.SNAKE_HEAD0: (0, 120, 0),
-        CellType.SNAKE_HEAD1: (0, 0, 120),
-        CellType.SNAKE_BODY0: (0, 255, 0),
-        CellType.SNAKE_BODY1: (0, 0, 255),
-        CellType.FRUIT: (173, 52, 80),
-    }
-
-
 class QuitRequestedError(RuntimeError):
     """ Gets raised whenever the user wants to quit the game. """
     pass
@@ -0,0 +1,24 @@
+import json
+import os
+
+import pytest
+
+
+LEVEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'levels'))
+
+
+@pytest.fixture
+def level_file():
+    """ Get the path to a bundled level by its name, like '10x10-blank'. """
+    def get_level_file(name):
+        return os.path.join(LEVEL_DIR, name) + '.json'
+    return get_level_file
+
+
+@pytest.fixture
+def level_config(level_file):
+    """ Load the configuration of a bundled level by its name, like '10x10-blank'. """
+    def load_level_config(name):
+        with open(level_file(name)) as cfg:
+            return json.load(cfg)
+    return load_level_config
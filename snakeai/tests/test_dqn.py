@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+
+from snakeai.agent import DeepQNetworkAgent, NumPyQNetwork, describe_keras_layers
+from snakeai.agent.dqn import LearnerSchedule, play_epsilon_greedy_episode
+from snakeai.gameplay.environment import Environment
+from snakeai.utils.frames import FrameStack
+from snakeai.utils.rollout import RolloutWorkerPool
+
+
+class Flatten(object):
+    """ A stand-in for a Keras layer that only provides the description. """
+
+    def __init__(self, input_shape, output_shape):
+        self.input_shape = input_shape
+        self.output_shape = output_shape
+
+    def get_config(self):
+        return {'data_format': None}
+
+
+class Dense(Flatten):
+
+    def get_config(self):
+        return {'use_bias': True, 'activation': 'linear'}
+
+
+class LinearModel(object):
+    """ A stand-in for the compiled Keras model: a linear Q-function that counts the training steps. """
+
+    def __init__(self, num_frames, size, num_actions=3):
+        num_inputs = num_frames * size * size
+        self.input_shape = (None, num_frames, size, size)
+        self.output_shape = (None, num_actions)
+        self.layers = [Flatten(self.input_shape, (None, num_inputs)), Dense((None, num_inputs), self.output_shape)]
+        self.network = NumPyQNetwork(describe_keras_layers(self))
+        self.set_weights([np.zeros((num_inputs, num_actions)), np.zeros(num_actions)])
+        self.num_train_steps = 0
+        self.saved_files = []
+
+    def get_weights(self):
+        return [weights.copy() for weights in self.weights]
+
+    def set_weights(self, weights):
+        self.weights = [np.array(weights[0]), np.array(weights[1])]
+        self.network.set_weights(self.weights)
+
+    def predict(self, states):
+        return self.network.predict(states)
+
+    def train_on_batch(self, inputs, targets, sample_weight=None):
+        assert len(inputs) == len(targets)
+        self.num_train_steps += 1
+        return 0.0
+
+    def save(self, filename):
+        self.saved_files.append(filename)
+
+
+@pytest.mark.parametrize('train_options, agent_options', [
+    ({}, {}),
+    ({'target_sync_freq': 5, 'train_every': 2, 'gradient_steps': 2, 'warmup_size': 10, 'prefetch_batches': 2},
+     {'prioritized_replay': True}),
+    ({'replay_ratio': 4}, {'deduplicate_frames': True}),
+])
+def test_dqn_agent_trains_on_multi_snake_environment(train_options, agent_options, level_config):
+    env = Environment(level_config('10x10-blank'), verbose=0)
+    env.seed(42)
+    np.random.seed(42)
+    model = LinearModel(num_frames=2, size=env.field.size)
+    agent = DeepQNetworkAgent(model, num_last_frames=2, memory_size=100, **agent_options)
+
+    agent.train(env, num_episodes=3, batch_size=8, exploration_range=(1.0, 0.5), sync_freq=3, **train_options)
+
+    assert model.num_train_steps > 0
+    assert model.saved_files == ['dqn-final.model']
+    assert len(agent.memory) > 0
+    assert agent.prefetcher is None
+
+
+def test_dqn_agent_trains_on_rollout_workers(level_config):
+    config = level_config('10x10-blank')
+    np.random.seed(42)
+    model = LinearModel(num_frames=2, size=10)
+    agent = DeepQNetworkAgent(model, num_last_frames=2, memory_size=100)
+    rollout = RolloutWorkerPool(config, model, num_workers=2, num_last_frames=2, chunk_size=16, seed=7)
+
+    agent.train(Environment(config, verbose=0), num_episodes=4, batch_size=8, rollout=rollout, sync_freq=2)
+
+    assert model.num_train_steps > 0
+    assert model.saved_files == ['dqn-final.model']
+    # The weights have been published more than once without waiting for the workers to pick them up.
+    assert rollout.weights.version > 2
+    assert not any(process.is_alive() for process in rollout.processes)
+
+
+def test_epsilon_greedy_episode_chains_the_states_of_every_snake(level_config):
+    env = Environment(level_config('22x22-blank-4snakes'), verbose=0)
+    env.seed(42)
+    np.random.seed(42)
+    frames = FrameStack(2, env.observation_shape, batch_size=env.num_snakes)
+
+    steps = []
+    for states, actions, timestep, states_next in play_epsilon_greedy_episode(env, frames, None, 1.0):
+        assert len(actions) == env.num_snakes
+        steps.append((states.copy(), states_next.copy(), timestep.is_episode_end))
+
+    assert [is_episode_end for _, _, is_episode_end in steps] == [False] * (len(steps) - 1) + [True]
+    for (_, states_next, _), (states, _, _) in zip(steps, steps[1:]):
+        assert np.array_equal(states, states_next)
+    # Without exploration every snake takes the greedy action, which is the first one for all-zero Q-values.
+    greedy_steps = play_epsilon_greedy_episode(env, frames, LinearModel(2, env.field.size), 0.0)
+    assert next(greedy_steps)[1] == [0] * env.num_snakes
+
+
+def test_learner_schedule_waits_for_warmup():
+    schedule = LearnerSchedule(batch_size=4, warmup_size=10)
+    assert [schedule.on_new_transitions(1, size) for size in range(8, 12)] == [0, 0, 1, 1]
+
+
+def test_learner_schedule_takes_gradient_steps_every_few_transitions():
+    schedule = LearnerSchedule(batch_size=4, train_every=4, gradient_steps=2)
+    assert [schedule.on_new_transitions(1, 100) for _ in range(8)] == [0, 0, 0, 2, 0, 0, 0, 2]
+    assert schedule.on_new_transitions(9, 100) == 4
+    assert schedule.on_new_transitions(3, 100) == 2
+
+
+def test_learner_schedule_keeps_replay_ratio():
+    schedule = LearnerSchedule(batch_size=32, replay_ratio=8, train_every=100)
+    gradient_steps = [schedule.on_new_transitions(3, 100) for _ in range(32)]
+    assert sum(gradient_steps) == 3 * 32 * 8 // 32
+    assert max(gradient_steps) == 1
@@ -1,8 +1,14 @@
 import json
+import logging
 import os
 
-from snakeai.gameplay.entities import SnakeAction
-from snakeai.gameplay.environment import Environment
+import numpy as np
+import pytest
+
+from snakeai.gameplay.entities import CellType, Point, SnakeAction, ALL_SNAKE_BODIES, ALL_SNAKE_HEADS
+from snakeai.gameplay.environment import Environment, EpisodeStatistics, get_snake_observation
+from snakeai.utils.stats import CSVStatsSink, JSONLinesStatsSink
+from snakeai.utils.tracing import add_trace_sink
 
 
 def get_env_config_file(name):
@@ -156,3 +162,328 @@ def test_env_when_new_episode_starts_resets_previous_state():
     assert env.stats.timesteps_survived == 0
     assert env.stats.termination_reason is None
     assert set(env.stats.action_counter.values()) == {0}
+
+
+def test_env_timestep_by_default_writes_nothing_to_stdout(capsys):
+    env = load_env('10x10-blank')
+    env.seed(42)
+    env.new_episode()
+    for i in range(3):
+        env.choose_action([SnakeAction.MAINTAIN_DIRECTION, SnakeAction.MAINTAIN_DIRECTION])
+        env.timestep()
+
+    assert capsys.readouterr().out == ''
+
+
+def test_env_trace_sink_with_rate_limit_drops_extra_records(tmpdir):
+    trace_file = str(tmpdir.join('trace.log'))
+    handler = add_trace_sink('snakeai.gameplay.environment', trace_file, max_records_per_second=2)
+    try:
+        env = load_env('10x10-blank')
+        env.seed(42)
+        env.new_episode()
+        for i in range(3):
+            env.choose_action([SnakeAction.MAINTAIN_DIRECTION, SnakeAction.MAINTAIN_DIRECTION])
+            env.timestep()
+    finally:
+        logging.getLogger('snakeai.gameplay.environment').removeHandler(handler)
+        logging.getLogger('snakeai.gameplay.environment').setLevel(logging.NOTSET)
+        handler.close()
+
+    with open(trace_file) as f:
+        trace = f.read()
+    assert trace.count('Timestep') == 2
+    assert '##########' in trace
+
+
+def test_env_observation_view_mode_returns_read_only_view_of_field():
+    with open(get_env_config_file('10x10-blank')) as cfg:
+        env = Environment(config=json.load(cfg), verbose=0, observation_mode='view')
+    env.seed(42)
+    tsr = env.new_episode()
+    observation = tsr[0].observation
+
+    assert observation.dtype == np.uint8
+    assert not observation.flags.writeable
+    with pytest.raises(ValueError):
+        observation[0, 0] = 0
+
+    env.choose_action([SnakeAction.MAINTAIN_DIRECTION, SnakeAction.MAINTAIN_DIRECTION])
+    env.timestep()
+    assert np.array_equal(observation, env.get_observation())
+
+
+def test_env_get_observation_into_buffer_copies_field():
+    env = load_env('10x10-blank')
+    env.seed(42)
+    env.new_episode()
+
+    buffer = np.zeros(env.observation_shape, dtype=np.uint8)
+    assert env.get_observation(out=buffer) is buffer
+    assert np.array_equal(buffer, env.get_observation())
+    assert env.get_observation().flags.writeable
+
+
+def make_env(level_map, initial_snake_length, num_snakes=2):
+    env = Environment(config={
+        'field': level_map,
+        'num_snakes': num_snakes,
+        'initial_snake_length': initial_snake_length,
+        'rewards': {'timestep': 0, 'ate_fruit': 1, 'died': -1},
+    }, verbose=0)
+    env.seed(42)
+    env.new_episode()
+    return env
+
+
+def move_fruit(env, position):
+    env.field[env.fruit] = CellType.EMPTY
+    env.generate_fruit(Point(*position))
+
+
+def test_env_head_on_collision_ends_episode():
+    env = make_env([
+        '#######',
+        '#.....#',
+        '#.....#',
+        '#.A.B.#',
+        '#.....#',
+        '#.....#',
+        '#######',
+    ], initial_snake_length=2)
+    move_fruit(env, (1, 1))
+
+    env.choose_action([SnakeAction.TURN_RIGHT, SnakeAction.TURN_LEFT])
+    tsr = env.timestep()
+
+    # Both snakes move into the same cell at the same time.
+    assert tsr.reward == [-1, -1]
+    assert tsr.is_episode_end
+    assert [stats.termination_reason for stats in env.stats] == ['hit_other_body', 'hit_other_body']
+
+
+def test_env_collision_outcome_does_not_depend_on_snake_order():
+    level_map = [
+        '#######',
+        '#.....#',
+        '#..B..#',
+        '#.A...#',
+        '#.....#',
+        '#.....#',
+        '#######',
+    ]
+    env = make_env(level_map, initial_snake_length=3)
+    move_fruit(env, (5, 5))
+    env.choose_action([SnakeAction.TURN_RIGHT, SnakeAction.MAINTAIN_DIRECTION])
+    tsr = env.timestep()
+
+    swapped_env = make_env([row.translate(str.maketrans('AB', 'BA')) for row in level_map], initial_snake_length=3)
+    move_fruit(swapped_env, (5, 5))
+    swapped_env.choose_action([SnakeAction.MAINTAIN_DIRECTION, SnakeAction.TURN_RIGHT])
+    swapped_tsr = swapped_env.timestep()
+
+    assert tsr.reward == swapped_tsr.reward[::-1] == [-1, 0]
+    assert [stats.termination_reason for stats in env.stats] == ['hit_other_body', None]
+    assert [stats.termination_reason for stats in swapped_env.stats] == [None, 'hit_other_body']
+
+
+def test_env_head_into_tail_of_growing_snake_kills_snake():
+    env = make_env([
+        '#######',
+        '#.....#',
+        '#.A...#',
+        '#.....#',
+        '#..B..#',
+        '#.....#',
+        '#######',
+    ], initial_snake_length=3)
+    move_fruit(env, (2, 1))
+
+    # The first snake eats the fruit, so its tail stays where the second snake is moving.
+    env.choose_action([SnakeAction.MAINTAIN_DIRECTION, SnakeAction.TURN_LEFT])
+    tsr = env.timestep()
+
+    assert tsr.reward == [4, -1]
+    assert tsr.is_episode_end
+    assert [stats.termination_reason for stats in env.stats] == [None, 'hit_other_body']
+    assert env.stats[0].fruits_eaten == 1
+
+
+def test_env_head_into_other_body_kills_snake():
+    env = make_env([
+        '#######',
+        '#.....#',
+        '#..B..#',
+        '#.A...#',
+        '#.....#',
+        '#.....#',
+        '#######',
+    ], initial_snake_length=3)
+    move_fruit(env, (5, 5))
+
+    env.choose_action([SnakeAction.TURN_RIGHT, SnakeAction.MAINTAIN_DIRECTION])
+    tsr = env.timestep()
+
+    assert tsr[0].reward == -1
+    assert tsr[1].is_episode_end
+    assert env.stats[0].termination_reason == 'hit_other_body'
+
+
+def test_env_head_into_vacated_tail_of_other_snake_survives():
+    env = make_env([
+        '#######',
+        '#.....#',
+        '#.A...#',
+        '#.....#',
+        '#..B..#',
+        '#.....#',
+        '#######',
+    ], initial_snake_length=3)
+    move_fruit(env, (5, 1))
+
+    env.choose_action([SnakeAction.MAINTAIN_DIRECTION, SnakeAction.TURN_LEFT])
+    tsr = env.timestep()
+
+    assert [result.reward for result in tsr] == [0, 0]
+    assert not tsr[1].is_episode_end
+    assert env.snakes[1].head == (2, 4)
+    assert env.field[(2, 4)] == CellType.SNAKE_HEAD1
+
+
+def test_env_chasing_own_tail_survives():
+    env = make_env([
+        '#########',
+        '#.......#',
+        '#.A..B..#',
+        '#.......#',
+        '#.......#',
+        '#.......#',
+        '#.......#',
+        '#.......#',
+        '#########',
+    ], initial_snake_length=4)
+    move_fruit(env, (1, 5))
+
+    for step in range(8):
+        env.choose_action([SnakeAction.TURN_RIGHT, SnakeAction.TURN_RIGHT])
+        tsr = env.timestep()
+        assert not tsr[1].is_episode_end
+
+    assert [stats.termination_reason for stats in env.stats] == [None, None]
+    assert env.field[env.snakes[0].head] == CellType.SNAKE_HEAD0
+    assert env.field[env.snakes[1].head] == CellType.SNAKE_HEAD1
+
+
+def test_env_timestep_limit_records_stats_for_every_snake(tmpdir):
+    env = make_env([
+        '#########',
+        '#.......#',
+        '#.A..B..#',
+        '#.......#',
+        '#.......#',
+        '#.......#',
+        '#.......#',
+        '#.......#',
+        '#########',
+    ], initial_snake_length=4)
+    move_fruit(env, (1, 5))
+    env.max_step_limit = 8
+    env.stats_sink = JSONLinesStatsSink(str(tmpdir.join('stats.jsonl')))
+
+    for step in range(8):
+        env.choose_action([SnakeAction.TURN_RIGHT, SnakeAction.MAINTAIN_DIRECTION if step < 1 else SnakeAction.TURN_RIGHT])
+        tsr = env.timestep()
+    env.close()
+
+    assert tsr[0].is_episode_end and tsr[1].is_episode_end
+    for stats in env.stats:
+        assert stats.termination_reason == 'timestep_limit_exceeded'
+        assert stats.timesteps_survived == 8
+    assert env.stats[0].action_counter == {
+        SnakeAction.MAINTAIN_DIRECTION: 0,
+        SnakeAction.TURN_LEFT: 0,
+        SnakeAction.TURN_RIGHT: 8,
+    }
+    assert env.stats[1].action_counter[SnakeAction.MAINTAIN_DIRECTION] == 1
+
+    with open(str(tmpdir.join('stats.jsonl'))) as f:
+        rows = [json.loads(line) for line in f]
+    assert [row['snake'] for row in rows] == [0, 1]
+    assert [row['action_counter_2'] for row in rows] == [8, 7]
+
+    summary = env.stats_summary.flatten(1)
+    assert summary['episodes'] == 1
+    assert summary['termination_rate_timestep_limit_exceeded'] == 1.0
+    assert summary['action_rate_0'] == 1 / 8
+
+
+def test_env_csv_stats_keep_existing_columns_first(tmpdir):
+    env = load_env('10x10-blank')
+    env.max_step_limit = 5
+    env.stats_sink = CSVStatsSink(str(tmpdir.join('stats.csv')))
+    env.new_episode()
+    while not env.timestep().is_episode_end:
+        pass
+    env.close()
+
+    with open(str(tmpdir.join('stats.csv'))) as f:
+        header = f.readline().rstrip('\n').split(',')
+    assert header == list(EpisodeStatistics().flatten().keys()) + ['snake']
+
+
+def test_env_four_snakes_level_places_every_snake():
+    env = load_env('22x22-blank-4snakes')
+    env.seed(42)
+    tsr = env.new_episode()
+
+    assert len(tsr) == env.num_snakes == 4
+    for i in range(4):
+        assert (tsr[i].observation == ALL_SNAKE_HEADS[i]).sum() == 1
+        assert (tsr[i].observation == ALL_SNAKE_BODIES[i]).sum() == 2
+
+    observation = get_snake_observation(tsr[2].observation, 2)
+    assert (observation == 2).sum() == 1
+    assert (observation == 3).sum() == 2
+    assert not np.isin(observation, ALL_SNAKE_HEADS + ALL_SNAKE_BODIES).any()
+
+
+def test_env_choose_action_with_wrong_number_of_actions_throws():
+    env = load_env('22x22-blank-4snakes')
+    env.new_episode()
+    heads = [snake.head for snake in env.snakes]
+
+    with pytest.raises(ValueError):
+        env.choose_action([SnakeAction.MAINTAIN_DIRECTION] * 2)
+    assert [snake.head for snake in env.snakes] == heads
+    assert env.current_actions is None
+
+
+def test_env_snake_count_not_matching_level_map_throws():
+    with open(get_env_config_file('10x10-blank')) as cfg:
+        env_config = json.load(cfg)
+    env_config['num_snakes'] = 3
+    with pytest.raises(ValueError):
+        Environment(config=env_config, verbose=0)
+
+
+def test_env_collisions_between_any_snakes_are_detected():
+    env = make_env([
+        '#########',
+        '#.......#',
+        '#.A...B.#',
+        '#.......#',
+        '#...C...#',
+        '#..D....#',
+        '#.......#',
+        '#.......#',
+        '#########',
+    ], initial_snake_length=3, num_snakes=4)
+    move_fruit(env, (7, 7))
+
+    # Snake 3 turns right into the body of snake 2.
+    env.choose_action([SnakeAction.MAINTAIN_DIRECTION] * 3 + [SnakeAction.TURN_RIGHT])
+    tsr = env.timestep()
+
+    assert [result.reward for result in tsr] == [0, 0, 0, -1]
+    assert tsr[3].is_episode_end
+    assert [stats.termination_reason for stats in env.stats] == [None, None, None, 'hit_other_body']
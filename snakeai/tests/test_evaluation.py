@@ -0,0 +1,111 @@
+import json
+import os
+
+import numpy as np
+
+from snakeai.agent import NumPyQNetwork
+from snakeai.utils import evaluation
+from snakeai.utils.evaluation import EvaluationTask, evaluate, run_evaluation_task, summarize_results
+
+
+def load_straight_ahead_model(checkpoint):
+    """ A stand-in for a checkpoint: a 10x10 network that always keeps the direction. """
+    layers = [
+        {'type': 'Flatten', 'data_format': None, 'input_shape': (None, 4, 10, 10)},
+        {'type': 'Dense', 'use_bias': True, 'activation': 'linear', 'output_shape': (None, 3)},
+    ]
+    return NumPyQNetwork(layers, [np.zeros((400, 3)), np.array([1, 0, 0])])
+
+
+def load_model_or_fail(checkpoint):
+    """ A stand-in for a loader that can't read some of the checkpoints. """
+    if checkpoint.startswith('broken'):
+        raise OSError(f'Unable to open file: "{checkpoint}"')
+    return load_straight_ahead_model(checkpoint)
+
+
+def test_run_evaluation_task_returns_row_per_snake_per_episode(level_file):
+    task = EvaluationTask('straight.model', level_file('10x10-blank'), seed=1, num_episodes=3)
+    rows = run_evaluation_task(task, model_loader=load_straight_ahead_model)
+
+    assert len(rows) == 3 * 2
+    assert [(row['episode'], row['snake']) for row in rows] == [(0, 0), (0, 1), (1, 0), (1, 1), (2, 0), (2, 1)]
+    assert all(row['level'] == '10x10-blank' and row['seed'] == 1 for row in rows)
+    for episode in range(3):
+        assert any(row['termination_reason'] for row in rows if row['episode'] == episode)
+
+
+def test_run_evaluation_task_skips_levels_the_model_does_not_fit(level_file):
+    task = EvaluationTask('straight.model', level_file('22x22-obstacles'), seed=1, num_episodes=3)
+    assert run_evaluation_task(task, model_loader=load_straight_ahead_model) == []
+
+
+def test_evaluate_collects_rows_from_workers_and_summarizes_them(level_file):
+    tasks = [
+        EvaluationTask(checkpoint, level_file('10x10-blank'), seed, num_episodes=2)
+        for checkpoint in ['a.model', 'b.model']
+        for seed in range(2)
+    ]
+    rows = list(evaluate(tasks, num_workers=2, model_loader=load_straight_ahead_model))
+    assert len(rows) == 4 * 2 * 2
+
+    summary = summarize_results(rows)
+    assert [(row['checkpoint'], row['level']) for row in summary] == [('a.model', '10x10-blank'), ('b.model', '10x10-blank')]
+    for row in summary:
+        assert row['episodes'] == 4
+        assert row['timesteps_mean'] > 0
+        assert row['steps_per_second'] > 0
+        assert row['fruits_ci'] >= 0
+
+
+def test_evaluate_skips_invalid_levels(tmpdir, level_file, level_config):
+    bad_level = str(tmpdir.join('bad.json'))
+    config = level_config('10x10-blank')
+    config['field'][1] = '#S.......#'
+    with open(bad_level, 'w') as cfg:
+        json.dump(config, cfg)
+
+    tasks = [
+        EvaluationTask('a.model', level, seed=0, num_episodes=2)
+        for level in [bad_level, level_file('10x10-blank')]
+    ]
+    rows = list(evaluate(tasks, num_workers=2, model_loader=load_straight_ahead_model))
+    assert len(rows) == 2 * 2
+    assert {row['level'] for row in rows} == {'10x10-blank'}
+
+
+def test_run_evaluation_task_keeps_only_last_model(level_file):
+    level = level_file('10x10-blank')
+    for checkpoint in ['a.model', 'b.model', 'b.model']:
+        run_evaluation_task(EvaluationTask(checkpoint, level, seed=0, num_episodes=1), model_loader=load_straight_ahead_model)
+    key, model = evaluation._loaded_model
+    assert key == (load_straight_ahead_model, 'b.model')
+    assert isinstance(model, NumPyQNetwork)
+
+
+def test_evaluate_skips_checkpoints_that_fail_to_load(level_file):
+    tasks = [
+        EvaluationTask(checkpoint, level_file('10x10-blank'), seed, num_episodes=2)
+        for checkpoint in ['a.model', 'broken.model']
+        for seed in range(2)
+    ]
+    rows = list(evaluate(tasks, num_workers=2, model_loader=load_model_or_fail))
+    assert len(rows) == 2 * 2 * 2
+    assert {row['checkpoint'] for row in rows} == {'a.model'}
+
+
+def test_summarize_results_computes_confidence_interval_over_episodes():
+    rows = [
+        dict(checkpoint='a.model', level='10x10-blank', seed=0, episode=episode, snake=snake,
+             seconds=1.0, timesteps_survived=10, fruits_eaten=fruits)
+        for episode, episode_fruits in enumerate([(1, 3), (2, 4), (6, 8)])
+        for snake, fruits in enumerate(episode_fruits)
+    ]
+    summary, = summarize_results(rows, confidence_z=2.0)
+
+    assert summary['episodes'] == 3
+    assert summary['fruits_mean'] == 4.0
+    # The episode means are 2, 3 and 7, with a standard deviation of sqrt(7).
+    assert np.isclose(summary['fruits_ci'], 2.0 * np.sqrt(7) / np.sqrt(3))
+    assert summary['timesteps_mean'] == 10
+    assert summary['steps_per_second'] == 10
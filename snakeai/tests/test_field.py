@@ -1,5 +1,5 @@
 import pytest
-from snakeai.gameplay.entities import Field, Snake
+from snakeai.gameplay.entities import CellType, Field, Snake
 
 
 small_level_map = [
@@ -89,3 +89,82 @@ def test_get_random_empty_cell_no_cells_left_throws():
     field.create_level()
     with pytest.raises(IndexError):
         field.get_random_empty_cell()
+
+
+two_snake_level_map = [
+    '#######',
+    '#.....#',
+    '#.A...#',
+    '#.....#',
+    '#...B.#',
+    '#.....#',
+    '#######',
+]
+
+
+def test_create_level_is_compiled_once_and_shared():
+    field0 = Field(two_snake_level_map)
+    field1 = Field(list(two_snake_level_map))
+    field0.create_level()
+    field1.create_level()
+    assert field0._level is field1._level
+    assert field0._cells is not field1._cells
+
+
+def test_create_level_again_restores_initial_state_in_place():
+    field = Field(two_snake_level_map)
+    field.create_level()
+    cells = field._cells
+    initial_empty_cells = list(field._empty_cells)
+
+    field[(1, 1)] = CellType.FRUIT
+    field[(3, 3)] = CellType.WALL
+    field.create_level()
+
+    assert field._cells is cells
+    assert str(field).split('\n') == two_snake_level_map
+    assert field._empty_cells == initial_empty_cells
+
+
+def test_find_snake_head_two_snakes_finds_both():
+    field = Field(two_snake_level_map)
+    field.create_level()
+    assert field.find_snake_head(CellType.SNAKE_HEAD0) == (2, 2)
+    assert field.find_snake_head(CellType.SNAKE_HEAD1) == (4, 4)
+
+
+def test_set_cell_keeps_empty_cells_up_to_date():
+    field = Field(two_snake_level_map)
+    field.create_level()
+    num_empty_cells = field.num_empty_cells
+
+    field[(1, 1)] = CellType.FRUIT
+    field[(5, 5)] = CellType.WALL
+    field[(5, 5)] = CellType.FRUIT
+    assert field.num_empty_cells == num_empty_cells - 2
+
+    field[(1, 1)] = CellType.EMPTY
+    field[(1, 1)] = CellType.EMPTY
+    assert field.num_empty_cells == num_empty_cells - 1
+    for cell in field._empty_cells:
+        y, x = divmod(cell, field.size)
+        assert field[(x, y)] == CellType.EMPTY
+
+
+def test_get_random_empty_cell_same_seed_same_cells():
+    fields = [Field(two_snake_level_map), Field(two_snake_level_map)]
+    for field in fields:
+        field.create_level()
+        field.seed(42)
+    cells = [[field.get_random_empty_cell() for _ in range(20)] for field in fields]
+    assert cells[0] == cells[1]
+
+
+def test_get_random_empty_cell_reaches_every_empty_cell():
+    field = Field(two_snake_level_map)
+    field.create_level()
+    field.seed(1)
+    field[(1, 1)] = CellType.WALL
+    cells = {field.get_random_empty_cell() for _ in range(1000)}
+    assert len(cells) == field.num_empty_cells
+    assert (1, 1) not in cells
@@ -0,0 +1,35 @@
+import numpy as np
+
+from snakeai.utils.frames import FrameStack
+
+
+def test_frame_stack_reset_repeats_first_frame():
+    stack = FrameStack(3, (2, 2))
+    stack.reset(np.full((2, 2), 7, dtype=np.uint8))
+
+    assert stack.state.shape == (1, 3, 2, 2)
+    assert stack.state.dtype == np.float32
+    assert (stack.state == 7).all()
+
+
+def test_frame_stack_push_keeps_last_frames_in_order():
+    stack = FrameStack(3, (2, 2), dtype=np.uint8)
+    stack.reset(np.zeros((2, 2)))
+
+    for i in range(1, 8):
+        stack.push(np.full((2, 2), i))
+        expected = [max(i - 2, 0), max(i - 1, 0), i]
+        assert stack.state[0, :, 0, 0].tolist() == expected
+        assert stack.state.flags.c_contiguous
+
+
+def test_frame_stack_batch_resets_selected_games():
+    stack = FrameStack(2, (1, 1), batch_size=3)
+    stack.reset(np.zeros((3, 1, 1)))
+    stack.push(np.array([1, 2, 3]).reshape((3, 1, 1)))
+
+    stack.reset(np.array([9]), games=[1])
+    assert stack.state[:, :, 0, 0].tolist() == [[0, 1], [9, 9], [0, 3]]
+
+    stack.push(np.array([4, 5, 6]).reshape((3, 1, 1)))
+    assert stack.state[:, :, 0, 0].tolist() == [[1, 4], [9, 5], [3, 6]]
@@ -0,0 +1,47 @@
+import numpy as np
+
+from snakeai.agent import DeepQNetworkAgent, InferenceBroker, RandomActionAgent
+from snakeai.gameplay.entities import ALL_SNAKE_ACTIONS
+
+
+class CountingModel(object):
+    """ A stand-in for the Keras model that prefers the action given by the first pixel of the state. """
+
+    input_shape = (None, 2, 3, 3)
+    output_shape = (None, 3)
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, states):
+        self.batch_sizes.append(len(states))
+        return np.eye(3)[states[:, -1, 0, 0].astype(int)]
+
+
+def test_inference_broker_runs_one_predict_per_shared_model():
+    model = CountingModel()
+    agents = [DeepQNetworkAgent(model, num_last_frames=2, memory_size=1) for _ in range(3)]
+    for agent in agents:
+        agent.begin_episode()
+    broker = InferenceBroker()
+
+    observations = [np.full((3, 3), i) for i in range(3)]
+    assert broker.act(agents, observations) == [0, 1, 2]
+    assert model.batch_sizes == [3]
+
+    # Every agent keeps its own frame stack.
+    observations = [np.full((3, 3), 2 - i) for i in range(3)]
+    assert broker.act(agents, observations) == [2, 1, 0]
+    assert model.batch_sizes == [3, 3]
+    assert agents[0].frames.state[0, :, 0, 0].tolist() == [0, 2]
+
+
+def test_inference_broker_asks_other_agents_directly():
+    model = CountingModel()
+    agents = [RandomActionAgent(), DeepQNetworkAgent(model, num_last_frames=2, memory_size=1)]
+    broker = InferenceBroker()
+
+    actions = broker.act(agents, [np.zeros((3, 3)), np.ones((3, 3))], rewards=[0, 0])
+    assert actions[0] in ALL_SNAKE_ACTIONS
+    assert actions[1] == 1
+    assert model.batch_sizes == [1]
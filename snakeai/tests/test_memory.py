@@ -0,0 +1,260 @@
+import numpy as np
+import pytest
+
+from snakeai.utils.memory import (
+    BatchPrefetcher, ExperienceReplay, FrameDeduplicatedExperienceReplay, PrioritizedExperienceReplay, SumTree,
+)
+
+
+class ConstantModel(object):
+    """ A stand-in for the Keras model that predicts the same Q-values for every state. """
+
+    def __init__(self, q_values):
+        self.q_values = np.array(q_values, dtype=np.float32)
+
+    def predict(self, states):
+        return np.tile(self.q_values, (len(states), 1))
+
+
+def make_state(first_frame_value, num_frames=4, size=3):
+    return np.stack([np.full((size, size), first_frame_value + i) for i in range(num_frames)])[np.newaxis]
+
+
+def test_experience_replay_non_positive_size_throws():
+    with pytest.raises(ValueError):
+        ExperienceReplay((4, 3, 3), 3, memory_size=-1)
+
+
+def test_experience_replay_over_capacity_overwrites_oldest_items():
+    memory = ExperienceReplay((4, 3, 3), 3, memory_size=5)
+    for i in range(8):
+        memory.remember(make_state(i), i % 3, i, make_state(i + 1), False)
+
+    assert len(memory) == 5
+    assert sorted(memory.rewards.tolist()) == [3, 4, 5, 6, 7]
+    assert memory.nbytes == 5 * (4 * 9 + 9 + 1 + 4 + 1)
+
+
+@pytest.mark.parametrize('memory_class', [ExperienceReplay, FrameDeduplicatedExperienceReplay, PrioritizedExperienceReplay])
+def test_experience_replay_remember_batch_matches_remembering_one_by_one(memory_class):
+    states = np.concatenate([make_state(i) for i in range(12)])
+    states_next = np.concatenate([make_state(i + 1) for i in range(12)])
+    actions = np.arange(12) % 3
+    rewards = np.arange(12, dtype=np.float32)
+    episode_ends = np.arange(12) % 4 == 3
+
+    one_by_one = memory_class((4, 3, 3), 3, memory_size=8)
+    batched = memory_class((4, 3, 3), 3, memory_size=8)
+    for transition in zip(states, actions, rewards, states_next, episode_ends):
+        one_by_one.remember(*transition)
+    batched.remember_batch(states[:3], actions[:3], rewards[:3], states_next[:3], episode_ends[:3])
+    batched.remember_batch(states[3:], actions[3:], rewards[3:], states_next[3:], episode_ends[3:])
+
+    assert len(batched) == len(one_by_one)
+    for expected, actual in zip(one_by_one._columns(), batched._columns()):
+        assert np.array_equal(expected, actual)
+
+
+def test_experience_replay_remember_batch_over_capacity_keeps_last_items():
+    memory = ExperienceReplay((4, 3, 3), 3, memory_size=5)
+    memory.remember(make_state(0), 0, 0, make_state(1), False)
+    states = np.concatenate([make_state(i) for i in range(1, 9)])
+    states_next = np.concatenate([make_state(i + 1) for i in range(1, 9)])
+    memory.remember_batch(states, np.zeros(8), np.arange(1, 9), states_next, np.zeros(8, dtype=bool))
+
+    assert len(memory) == 5
+    assert memory.next_idx == 4
+    assert memory.rewards.tolist() == [5, 6, 7, 8, 4]
+
+
+def test_experience_replay_sample_restores_next_state():
+    memory = ExperienceReplay((4, 3, 3), 3, memory_size=10)
+    for i in range(10):
+        memory.remember(make_state(i), 1, i, make_state(i + 1), i == 9)
+
+    states, actions, rewards, states_next, episode_ends = memory.sample(10)
+    for state, reward, state_next, is_episode_end in zip(states, rewards, states_next, episode_ends):
+        assert np.array_equal(state, make_state(reward)[0])
+        assert np.array_equal(state_next, make_state(reward + 1)[0])
+        assert is_episode_end == (reward == 9)
+    assert set(actions) == {1}
+
+
+def test_experience_replay_get_batch_computes_targets():
+    memory = ExperienceReplay((4, 3, 3), 3, memory_size=10)
+    memory.remember(make_state(0), 2, 1.0, make_state(1), False)
+    memory.remember(make_state(1), 0, -1.0, make_state(2), True)
+
+    states, targets, sample_weights = memory.get_batch(ConstantModel([0.5, 2.0, 1.0]), batch_size=10, discount_factor=0.5)
+    assert sample_weights is None
+    assert states.shape == (2, 4, 3, 3)
+    for state, target in zip(states, targets):
+        if state[0, 0, 0] == 0:
+            assert target.tolist() == [0.5, 2.0, 2.0]
+        else:
+            assert target.tolist() == [-1.0, 2.0, 1.0]
+
+
+def test_experience_replay_get_batch_with_target_model_computes_double_dqn_targets():
+    memory = ExperienceReplay((4, 3, 3), 3, memory_size=10)
+    memory.remember(make_state(0), 2, 1.0, make_state(1), False)
+
+    # The online model picks the second action, and the target model evaluates it.
+    _, targets, _ = memory.get_batch(
+        ConstantModel([0.5, 2.0, 1.0]), batch_size=10, discount_factor=0.5, target_model=ConstantModel([3.0, 1.0, 5.0])
+    )
+    assert targets.tolist() == [[0.5, 2.0, 1.5]]
+
+
+def test_experience_replay_empty_get_batch_returns_none():
+    memory = ExperienceReplay((4, 3, 3), 3, memory_size=10)
+    assert memory.get_batch(ConstantModel([0, 0, 0]), batch_size=10) is None
+
+
+def test_batch_prefetcher_samples_batches_in_background():
+    memory = ExperienceReplay((4, 3, 3), 3, memory_size=10)
+    prefetcher = BatchPrefetcher(memory, batch_size=2, num_batches=2, min_memory_size=3)
+    try:
+        assert prefetcher.get_batch(ConstantModel([0, 0, 0])) is None
+        for i in range(3):
+            prefetcher.remember(make_state(i), 0, 1.0, make_state(i + 1), False)
+
+        states, targets, sample_weights = prefetcher.get_batch(ConstantModel([0.5, 2.0, 1.0]), discount_factor=0.5)
+        assert states.shape == (2, 4, 3, 3)
+        assert targets[:, 0].tolist() == [2.0] * 2
+        assert sample_weights is None
+    finally:
+        prefetcher.close()
+    assert not prefetcher.thread.is_alive()
+
+
+class BrokenReplay(ExperienceReplay):
+    """ A memory that fails to sample. """
+
+    def sample_with_weights(self, batch_size):
+        raise ValueError('Broken')
+
+
+def test_batch_prefetcher_reraises_sampling_error():
+    memory = BrokenReplay((4, 3, 3), 3, memory_size=10)
+    memory.remember(make_state(0), 0, 1.0, make_state(1), False)
+    prefetcher = BatchPrefetcher(memory, batch_size=2)
+    try:
+        with pytest.raises(RuntimeError) as error:
+            prefetcher.get_batch(ConstantModel([0, 0, 0]))
+        assert isinstance(error.value.__cause__, ValueError)
+    finally:
+        prefetcher.close()
+
+
+def play_episodes(num_episodes, num_streams=2, num_frames=4, size=3):
+    """ Generate interleaved transitions of several agents the way the DQN agent stacks frames. """
+    rng = np.random.RandomState(0)
+    serial = 0
+    for episode in range(num_episodes):
+        episode_length = rng.randint(1, 8)
+        stacks = [[rng.randint(0, 32, (size, size))] * num_frames for _ in range(num_streams)]
+        for t in range(episode_length):
+            for stream in range(num_streams):
+                state = np.array(stacks[stream])
+                stacks[stream] = stacks[stream][1:] + [rng.randint(0, 32, (size, size))]
+                yield state, serial % 3, serial, np.array(stacks[stream]), t == episode_length - 1, stream
+                serial += 1
+
+
+def test_frame_deduplicated_replay_rebuilds_interleaved_stacks():
+    memory = FrameDeduplicatedExperienceReplay((4, 3, 3), 3, memory_size=1000)
+    expected = {}
+    for state, action, reward, state_next, is_episode_end, stream in play_episodes(20):
+        memory.remember(state, action, reward, state_next, is_episode_end, stream=stream)
+        expected[reward] = (state, action, state_next, is_episode_end)
+
+    assert len(memory) == len(expected)
+    assert memory.num_frames_seen < 1.5 * len(expected)
+
+    states, actions, rewards, states_next, episode_ends = memory.sample(len(memory))
+    for state, action, reward, state_next, is_episode_end in zip(states, actions, rewards, states_next, episode_ends):
+        expected_state, expected_action, expected_state_next, expected_end = expected[int(reward)]
+        assert np.array_equal(state, expected_state)
+        assert np.array_equal(state_next, expected_state_next)
+        assert action == expected_action
+        assert is_episode_end == expected_end
+
+
+def test_frame_deduplicated_replay_over_capacity_keeps_only_intact_items():
+    memory = FrameDeduplicatedExperienceReplay((4, 3, 3), 3, memory_size=50)
+    expected = {}
+    for state, action, reward, state_next, is_episode_end, _ in play_episodes(100):
+        # Without the stream keys, every transition stores its whole stack.
+        memory.remember(state, action, reward, state_next, is_episode_end)
+        expected[reward] = (state, state_next)
+
+    assert 0 < len(memory) <= 50
+    states, _, rewards, states_next, _ = memory.sample(len(memory))
+    assert max(rewards) == max(expected)
+    for state, reward, state_next in zip(states, rewards, states_next):
+        assert np.array_equal(state, expected[int(reward)][0])
+        assert np.array_equal(state_next, expected[int(reward)][1])
+
+
+def test_frame_deduplicated_replay_uses_less_memory():
+    stacked = ExperienceReplay((4, 22, 22), 3, memory_size=10000)
+    deduplicated = FrameDeduplicatedExperienceReplay((4, 22, 22), 3, memory_size=10000)
+    assert deduplicated.nbytes * 4 < stacked.nbytes
+
+
+def test_sum_tree_find_returns_leaf_by_prefix_sum():
+    tree = SumTree(5)
+    tree.update([0, 1, 2, 3, 4], [1.0, 0.0, 2.0, 3.0, 4.0])
+    tree.set(1, 0.5)
+
+    assert tree.total == 10.5
+    assert tree.find([0.0, 0.99, 1.0, 1.6, 3.6, 6.49, 6.5, 10.4]).tolist() == [0, 0, 1, 2, 3, 3, 4, 4]
+
+
+def test_sum_tree_find_on_partially_filled_tree_returns_leaf_in_use():
+    tree = SumTree(8)
+    tree.update([0, 1, 2], [0.1, 0.2, 0.3])
+
+    # The prefix sums can reach the total when it's slightly off, but the empty leaves must never be returned.
+    assert tree.find([0.0, 0.25, tree.total, tree.total + 1e-9], size=3).tolist() == [0, 1, 2, 2]
+
+
+def test_prioritized_replay_samples_proportionally_to_td_errors():
+    memory = PrioritizedExperienceReplay((4, 3, 3), 3, memory_size=400, alpha=1.0, epsilon=0.0)
+    for i in range(400):
+        memory.remember(make_state(i % 4), 0, i % 4, make_state(i % 4 + 1), False)
+    # The TD error of every transition is its reward, so the rewards 1, 2 and 3 make up 1/6, 2/6 and 3/6 of the samples.
+    memory.update_priorities(np.arange(400), np.arange(400) % 4)
+
+    np.random.seed(0)
+    samples = [memory.sample_with_weights(32) for _ in range(100)]
+    rewards = np.concatenate([transitions[2] for transitions, _, _ in samples])
+    idx = np.concatenate([batch_idx for _, batch_idx, _ in samples])
+
+    assert len(rewards) == 3200
+    assert set(rewards) == {1, 2, 3}
+    for reward in [1, 2, 3]:
+        assert abs(np.mean(rewards == reward) - reward / 6) < 0.03
+    # Transitions with the same priority are sampled uniformly, not in a fixed order.
+    assert len(set(idx[rewards == 1])) > 80
+    # The weights are normalized within every batch, so they can only be compared within a batch.
+    for (_, _, batch_rewards, _, _), _, weights in samples:
+        weights_by_reward = [weights[batch_rewards == reward] for reward in [3, 2, 1] if reward in batch_rewards]
+        for lower, higher in zip(weights_by_reward, weights_by_reward[1:]):
+            assert lower.max() < higher.min()
+        assert weights.max() == 1.0
+
+
+def test_prioritized_replay_updates_priorities_of_last_batch():
+    memory = PrioritizedExperienceReplay((4, 3, 3), 3, memory_size=10)
+    memory.remember(make_state(0), 2, 1.0, make_state(1), False)
+    memory.remember(make_state(1), 0, -1.0, make_state(2), True)
+
+    states, targets, sample_weights = memory.get_batch(ConstantModel([0.5, 2.0, 1.0]), batch_size=2, discount_factor=0.5)
+    assert len(sample_weights) == 2
+    memory.update_priorities()
+
+    expected_priorities = (np.abs(memory.last_td_errors) + memory.epsilon) ** memory.alpha
+    assert np.allclose(memory.priorities[memory.last_batch_idx], expected_priorities)
+    assert memory.max_priority == expected_priorities.max() > 1.0
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from snakeai.agent import NumPyQNetwork, describe_keras_layers
+
+
+def reference_conv2d(x, kernel, bias):
+    """ A straightforward channels_first convolution with the Keras kernel layout. """
+    kernel_height, kernel_width, _, out_channels = kernel.shape
+    num_images, _, height, width = x.shape
+    out = np.zeros((num_images, out_channels, height - kernel_height + 1, width - kernel_width + 1))
+    for i in range(out.shape[2]):
+        for j in range(out.shape[3]):
+            patch = x[:, :, i:i + kernel_height, j:j + kernel_width]
+            out[:, :, i, j] = np.einsum('ncab,abco->no', patch, kernel) + bias
+    return out
+
+
+def make_dqn_layers(num_frames, size, num_actions):
+    """ Describe the same architecture as `create_dqn_model` in train.py. """
+    conv = {'type': 'Conv2D', 'strides': (1, 1), 'data_format': 'channels_first', 'use_bias': True, 'activation': 'linear'}
+    return [
+        dict(conv, input_shape=(None, num_frames, size, size), output_shape=(None, 16, size - 2, size - 2)),
+        {'type': 'Activation', 'activation': 'relu'},
+        dict(conv, output_shape=(None, 32, size - 4, size - 4)),
+        {'type': 'Activation', 'activation': 'relu'},
+        {'type': 'Flatten', 'data_format': None},
+        {'type': 'Dense', 'use_bias': True, 'activation': 'linear'},
+        {'type': 'Activation', 'activation': 'relu'},
+        {'type': 'Dense', 'use_bias': True, 'activation': 'linear', 'output_shape': (None, num_actions)},
+    ]
+
+
+def test_numpy_q_network_matches_reference_computation():
+    rng = np.random.RandomState(42)
+    num_frames, size, num_actions = 4, 8, 3
+    weights = [
+        rng.randn(3, 3, num_frames, 16), rng.randn(16),
+        rng.randn(3, 3, 16, 32), rng.randn(32),
+        rng.randn(32 * (size - 4) ** 2, 256) * 0.1, rng.randn(256),
+        rng.randn(256, num_actions) * 0.1, rng.randn(num_actions),
+    ]
+    network = NumPyQNetwork(make_dqn_layers(num_frames, size, num_actions), weights)
+    states = rng.randint(0, 4, size=(5, num_frames, size, size)).astype(np.uint8)
+
+    x = np.maximum(reference_conv2d(states.astype(np.float64), weights[0], weights[1]), 0)
+    x = np.maximum(reference_conv2d(x, weights[2], weights[3]), 0)
+    x = np.maximum(x.reshape(len(x), -1) @ weights[4] + weights[5], 0)
+    expected = x @ weights[6] + weights[7]
+
+    q = network.predict(states)
+    assert q.dtype == np.float32
+    assert q.shape == (5, num_actions)
+    assert np.allclose(q, expected, rtol=1e-4, atol=1e-3)
+    assert network.input_shape == (None, num_frames, size, size)
+    assert network.output_shape == (None, num_actions)
+
+
+def test_numpy_q_network_set_weights_refreshes_the_copy():
+    layers = [{'type': 'Dense', 'use_bias': True, 'activation': 'relu', 'output_shape': (None, 2)}]
+    network = NumPyQNetwork(layers, [np.eye(2), np.zeros(2)])
+    assert network.predict([[1, -1]]).tolist() == [[1, 0]]
+
+    network.set_weights([-np.eye(2), np.ones(2)])
+    assert network.predict([[1, -1]]).tolist() == [[0, 2]]
+
+
+class Conv2D(object):
+    """ A stand-in for a Keras layer that only provides the description. """
+
+    input_shape = (None, 4, 6, 6)
+    output_shape = (None, 8, 4, 4)
+
+    def __init__(self, padding='valid'):
+        self.padding = padding
+
+    def get_config(self):
+        return {'strides': (1, 1), 'padding': self.padding, 'data_format': 'channels_first',
+                'use_bias': True, 'activation': 'relu'}
+
+
+class StandInModel(object):
+
+    def __init__(self, layers):
+        self.layers = layers
+
+
+def test_describe_keras_layers_rejects_unsupported_options():
+    layers = describe_keras_layers(StandInModel([Conv2D()]))
+    assert layers[0]['type'] == 'Conv2D'
+    assert layers[0]['activation'] == 'relu'
+
+    with pytest.raises(ValueError):
+        describe_keras_layers(StandInModel([Conv2D(padding='same')]))
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from snakeai.gameplay.entities import CellType
+from snakeai.utils.rendering import Colors, TileAtlas
+
+
+@pytest.mark.parametrize('cell_size', [1, 6, 20])
+def test_tile_atlas_render_places_tiles_by_cell_type(cell_size):
+    atlas = TileAtlas(cell_size)
+    cells = np.array([
+        [CellType.WALL, CellType.EMPTY, CellType.FRUIT],
+        [CellType.SNAKE_HEAD0, CellType.SNAKE_BODY0, CellType.EMPTY],
+    ], dtype=np.uint8)
+
+    frame = atlas.render(cells)
+    assert frame.shape == (2 * cell_size, 3 * cell_size, 3)
+    assert frame.dtype == np.uint8
+    for y, row in enumerate(cells):
+        for x, cell_type in enumerate(row):
+            tile = frame[y * cell_size:(y + 1) * cell_size, x * cell_size:(x + 1) * cell_size]
+            assert np.array_equal(tile, atlas.tiles[cell_type])
+            center = tile[cell_size // 2, cell_size // 2].tolist()
+            assert center == list(Colors.CELL_TYPE.get(cell_type, Colors.SCREEN_BACKGROUND))
+
+
+def test_tile_atlas_draws_outline_and_inner_square():
+    tile = TileAtlas(12).tiles[CellType.WALL]
+    wall, background = list(Colors.CELL_TYPE[CellType.WALL]), list(Colors.SCREEN_BACKGROUND)
+
+    assert tile[0, 5].tolist() == wall
+    assert tile[11, 0].tolist() == wall
+    assert tile[1, 5].tolist() == background
+    assert tile[2, 2].tolist() == wall
+    assert tile[9, 9].tolist() == wall
+    assert tile[10, 10].tolist() == background
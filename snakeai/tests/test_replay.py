@@ -0,0 +1,143 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from snakeai.gameplay.entities import CellType, Point, SnakeAction, ALL_SNAKE_ACTIONS
+from snakeai.gameplay.environment import Environment
+from snakeai.gameplay.replay import (
+    EpisodeRecorder, ReplayEnvironment, get_logged_field, load_recordings, replay_logged_episode, save_recordings,
+)
+from snakeai.utils.episode_log import EpisodeLogReader, EpisodeLogWriter, get_level_id
+from snakeai.utils.rendering import TileAtlas, export_episode, render_episode
+
+
+def record_episodes(config, num_episodes, seed=42):
+    """ Play random episodes, with the first fruit right in front of the first snake, and record them. """
+    env = Environment(config=config, verbose=0)
+    env.seed(seed)
+    recorder = EpisodeRecorder(env)
+    rng = random.Random(seed)
+    observed = []
+
+    for episode in range(num_episodes):
+        env.new_episode()
+        env.field[env.fruit] = CellType.EMPTY
+        env.generate_fruit(Point(*reversed(divmod(env.snakes.next_cell(0), env.field.size))))
+        recorder.begin_episode()
+        frames = [env.field.cells.copy()]
+        game_over = False
+        while not game_over:
+            actions = [rng.choice(ALL_SNAKE_ACTIONS) for _ in range(env.num_snakes)]
+            if env.timestep_index == 0:
+                actions[0] = SnakeAction.MAINTAIN_DIRECTION
+            env.choose_action(actions)
+            game_over = env.timestep().is_episode_end
+            recorder.record_timestep(actions)
+            frames.append(env.field.cells.copy())
+        recorder.end_episode()
+        observed.append(frames)
+
+    return recorder.recordings, observed
+
+
+def test_replay_environment_reproduces_recorded_episodes(level_config):
+    config = level_config('22x22-blank-4snakes')
+    recordings, observed = record_episodes(config, num_episodes=5)
+
+    env = ReplayEnvironment(config)
+    for recording, frames in zip(recordings, observed):
+        assert recording.actions.shape == (len(frames) - 1, 4)
+        assert len(recording.fruits) >= 2
+        replayed = [cells.copy() for cells in env.replay(recording)]
+        assert np.array_equal(replayed, frames)
+
+
+def test_recordings_survive_save_and_load(tmpdir, level_config):
+    config = level_config('10x10-blank')
+    recordings, _ = record_episodes(config, num_episodes=3)
+
+    filename = str(tmpdir.join('episodes.npz'))
+    save_recordings(filename, config, recordings)
+    loaded_config, loaded_recordings = load_recordings(filename)
+
+    assert loaded_config == config
+    assert len(loaded_recordings) == len(recordings)
+    for loaded, recording in zip(loaded_recordings, recordings):
+        assert np.array_equal(loaded.actions, recording.actions)
+        assert np.array_equal(loaded.fruits, recording.fruits)
+
+
+def test_render_episode_returns_a_frame_per_timestep(level_config):
+    config = level_config('10x10-blank')
+    recordings, observed = record_episodes(config, num_episodes=1)
+
+    frames = np.stack(list(render_episode(config, recordings[0], cell_size=4)))
+    assert frames.shape == (len(observed[0]), 40, 40, 3)
+    indexed_frames = np.stack(list(render_episode(config, recordings[0], cell_size=4, indexed=True)))
+    assert indexed_frames.shape == (len(observed[0]), 40, 40)
+
+
+def test_export_episode_writes_every_frame_to_gif(tmpdir, level_config):
+    Image = pytest.importorskip('PIL.Image')
+    config = level_config('10x10-blank')
+    recordings, observed = record_episodes(config, num_episodes=1)
+    expected_frames = list(render_episode(config, recordings[0], cell_size=4, indexed=True))
+
+    export_episode(config, recordings[0], str(tmpdir.join('episode-{episode:04d}.gif')), episode=7, cell_size=4)
+    with Image.open(str(tmpdir.join('episode-0007.gif'))) as image:
+        assert image.n_frames == len(observed[0])
+        assert image.info['loop'] == 0
+        for i in [0, len(observed[0]) - 1]:
+            image.seek(i)
+            assert np.array_equal(np.array(image.convert('RGB')), TileAtlas(4).palette[expected_frames[i]])
+
+
+def test_environment_episode_log_re_simulates_every_timestep(tmpdir, monkeypatch, level_config):
+    monkeypatch.chdir(tmpdir)
+    config = level_config('10x10-blank')
+    env = Environment(config=config, verbose=2)
+    env.seed(42)
+    rng = random.Random(42)
+
+    boards = []
+    for episode in range(3):
+        env.new_episode()
+        episode_boards = [str(env.field)]
+        game_over = False
+        while not game_over:
+            env.choose_action([rng.choice(ALL_SNAKE_ACTIONS) for _ in range(env.num_snakes)])
+            game_over = env.timestep().is_episode_end
+            episode_boards.append(str(env.field))
+        boards.append(episode_boards)
+    env.close()
+
+    with EpisodeLogReader(str(tmpdir.listdir(fil=lambda path: path.ext == '.replay')[0])) as log:
+        assert log.config == config
+        assert log.level_id == get_level_id(config)
+        assert len(log) == 3
+        for episode, episode_boards in enumerate(boards):
+            replayed = [str(replay_env.field) for replay_env in replay_logged_episode(log, episode)]
+            assert replayed == episode_boards
+        assert str(get_logged_field(log, 1, 2)) == boards[1][2]
+
+
+def test_episode_log_reader_skips_truncated_episode(tmpdir):
+    filename = str(tmpdir.join('episodes.replay'))
+    writer = EpisodeLogWriter(filename, {'field': ['#']})
+    for seed in [7, 8]:
+        writer.begin_episode(seed, num_snakes=2)
+        for _ in range(seed):
+            writer.record_timestep([0, 2])
+        writer.end_episode()
+    writer.close()
+
+    with open(filename, 'r+b') as f:
+        f.truncate(os.path.getsize(filename) - 1)
+
+    with EpisodeLogReader(filename) as log:
+        assert len(log) == 1
+        seed, actions = log.read_episode(0)
+        assert seed == 7
+        assert actions.tolist() == [[0, 2]] * 7
@@ -0,0 +1,53 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from snakeai.utils.rollout import RolloutWorkerPool, SharedWeights
+
+
+def test_rollout_pool_without_model_streams_random_transitions(level_config):
+    pool = RolloutWorkerPool(level_config('10x10-blank'), num_workers=2, chunk_size=16, seed=7)
+    pool.start()
+    batches, episodes = [], []
+    try:
+        while len(episodes) < 4:
+            transitions, new_episodes = pool.collect(block=True, timeout=30)
+            batches.append(transitions)
+            episodes.extend(new_episodes)
+    finally:
+        pool.stop()
+
+    states, actions, rewards, states_next, episode_ends, streams = [np.concatenate(column) for column in zip(*batches)]
+    assert len(actions) % 16 == 0
+    assert states.shape == states_next.shape == (len(actions), 4, 10, 10)
+    assert set(actions) <= {0, 1, 2}
+    assert set(streams) <= {0, 1, 2, 3}
+    assert episode_ends.any()
+    assert {episode['worker'] for episode in episodes} <= {0, 1}
+    assert all(len(episode['fruits_eaten']) == 2 for episode in episodes)
+
+
+def test_rollout_pool_collect_raises_when_worker_exits(level_config):
+    pool = RolloutWorkerPool(level_config('10x10-blank'), num_workers=2, chunk_size=16, seed=7)
+    pool.start()
+    try:
+        pool.processes[1].terminate()
+        pool.processes[1].join()
+        with pytest.raises(RuntimeError, match='Rollout worker 1 has exited'):
+            pool.collect(block=True, timeout=5)
+    finally:
+        pool.stop()
+
+
+def test_shared_weights_are_read_only_when_changed():
+    weights = SharedWeights(multiprocessing.get_context('spawn'), [np.zeros((2, 3)), np.ones(3)])
+    read_weights, version = weights.read()
+    assert [w.shape for w in read_weights] == [(2, 3), (3,)]
+    assert weights.read(version) == (None, version)
+
+    for i in range(3):
+        weights.write([np.full((2, 3), i), np.arange(3)])
+    read_weights, new_version = weights.read(version)
+    assert new_version == version + 3
+    assert np.array_equal(read_weights[0], np.full((2, 3), 2)) and np.array_equal(read_weights[1], np.arange(3))
@@ -1,4 +1,6 @@
-from snakeai.gameplay.entities import Point, Snake, SnakeDirection
+import random
+
+from snakeai.gameplay.entities import Point, Snake, SnakeDirection, SnakeGroup
 
 
 def test_place_snake_with_default_length_applies_default_layout():
@@ -119,3 +121,52 @@ def test_turn_left_turns_relatively_to_current_direction():
     assert snake.direction == SnakeDirection.EAST
     snake.turn_left()
     assert snake.direction == SnakeDirection.NORTH
+
+
+def test_snake_group_places_every_snake_with_default_layout():
+    group = SnakeGroup([Point(2, 2), Point(5, 3), Point(7, 4)], field_size=10)
+    assert len(group) == 3
+    assert group[1].head == Point(5, 3)
+    assert group[1].tail == Point(5, 5)
+    assert group[2].direction == SnakeDirection.NORTH
+    assert list(group[2].body) == [(7, 4), (7, 5), (7, 6)]
+    assert group.head_cell(1) == 35
+    assert group.tail_cell(1) == 55
+
+
+def test_snake_view_direction_assignment_changes_direction_index():
+    group = SnakeGroup([Point(2, 5)], field_size=10)
+    group[0].direction = SnakeDirection.WEST
+    assert group.directions[0] == 3
+    assert group[0].peek_next_move() == Point(1, 5)
+    assert group.next_cell(0) == 51
+
+def test_snake_group_random_moves_match_snakes():
+    rng = random.Random(42)
+    start_coords = [Point(5, 5), Point(10, 10), Point(15, 15)]
+    snakes = [Snake(start_coord, length=4) for start_coord in start_coords]
+    group = SnakeGroup(start_coords, field_size=21, length=4)
+
+    for step in range(200):
+        for i, snake in enumerate(snakes):
+            action = rng.choice(['left', 'right', 'grow', 'move', 'move'])
+            for s in (snake, group[i]):
+                if action == 'left':
+                    s.turn_left()
+                elif action == 'right':
+                    s.turn_right()
+                elif action == 'grow':
+                    s.grow()
+                else:
+                    s.move()
+            # Keep the snakes inside the field.
+            if not 2 <= snake.peek_next_move().x <= 18 or not 2 <= snake.peek_next_move().y <= 18:
+                snake.turn_right()
+                group[i].turn_right()
+
+        for i, snake in enumerate(snakes):
+            assert group[i].direction == snake.direction
+            assert group[i].head == snake.head
+            assert group[i].tail == snake.tail
+            assert group[i].length == snake.length
+            assert list(group[i].body) == list(snake.body)
@@ -0,0 +1,66 @@
+import json
+
+import numpy as np
+
+from snakeai.gameplay.environment import EpisodeStatistics
+from snakeai.utils.stats import BinaryStatsSink, CSVStatsSink, JSONLinesStatsSink, read_binary_stats
+
+
+def make_rows():
+    rows = []
+    for i in range(5):
+        stats = EpisodeStatistics()
+        stats.timesteps_survived = i
+        stats.sum_episode_rewards = i * 0.5
+        stats.fruits_eaten = i // 2
+        stats.termination_reason = 'hit_wall' if i % 2 else None
+        rows.append(stats.flatten())
+    return rows
+
+
+def test_csv_sink_writes_same_format_as_pandas(tmpdir):
+    filename = str(tmpdir.join('stats.csv'))
+    sink = CSVStatsSink(filename)
+    for row in make_rows():
+        sink.write(row)
+    sink.close()
+
+    import pandas as pd
+    rows = make_rows()
+    expected = pd.DataFrame(rows[:1])[:0].to_csv(index=None) + ''.join(
+        pd.DataFrame([row]).to_csv(header=False, index=None)
+        for row in rows
+    )
+    with open(filename) as f:
+        assert f.read() == expected
+
+
+def test_sink_flushes_when_buffer_is_full(tmpdir):
+    filename = str(tmpdir.join('stats.jsonl'))
+    sink = JSONLinesStatsSink(filename, max_buffered_rows=2, flush_interval=3600)
+    rows = make_rows()
+    for row in rows[:3]:
+        sink.write(row)
+
+    with open(filename) as f:
+        assert [json.loads(line) for line in f] == rows[:2]
+
+    sink.close()
+    with open(filename) as f:
+        assert [json.loads(line) for line in f] == rows[:3]
+
+
+def test_binary_sink_reads_back_columns_of_all_blocks(tmpdir):
+    filename = str(tmpdir.join('stats.npy'))
+    sink = BinaryStatsSink(filename, max_buffered_rows=2)
+    rows = make_rows()
+    for row in rows:
+        sink.write(row)
+    sink.close()
+
+    stats = read_binary_stats(filename)
+    assert stats['timesteps_survived'].tolist() == [0, 1, 2, 3, 4]
+    assert stats['sum_episode_rewards'].tolist() == [0, 0.5, 1, 1.5, 2]
+    assert np.isnan(stats['mean_reward'][0])
+    assert stats['mean_reward'][1:].tolist() == [0.5, 0.5, 0.5, 0.5]
+    assert stats['termination_reason'].tolist() == ['', 'hit_wall', '', 'hit_wall', '']
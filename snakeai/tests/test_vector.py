@@ -0,0 +1,92 @@
+import random
+
+import numpy as np
+import pytest
+
+from snakeai.gameplay.entities import ALL_SNAKE_ACTIONS
+from snakeai.gameplay.environment import Environment
+from snakeai.gameplay.vector import BatchEnvironment
+
+
+def test_batch_env_new_episode_places_snakes_and_fruits(level_config):
+    env = BatchEnvironment(level_config('10x10-blank'), num_envs=3)
+    env.seed(1)
+    tsr = env.new_episode()
+
+    assert tsr.observation.shape == (3, 10, 10)
+    assert tsr.reward.shape == (3, 2)
+    assert not tsr.is_episode_end.any()
+    assert (tsr.observation == 20).sum(axis=(1, 2)).tolist() == [1, 1, 1]
+    assert (tsr.observation == 21).sum(axis=(1, 2)).tolist() == [1, 1, 1]
+    assert (tsr.observation == 1).sum(axis=(1, 2)).tolist() == [1, 1, 1]
+
+
+@pytest.mark.parametrize('level_name', ['10x10-blank', '22x22-blank-4snakes'])
+def test_batch_env_matches_single_environment_for_same_seeds(level_name, level_config):
+    config = level_config(level_name)
+    num_snakes = config.get('num_snakes', 2)
+    seeds = [228, 143, 7]
+    num_steps = 150
+
+    # Play every game in the regular environment first.
+    action_rng = random.Random(42)
+    actions = [
+        [[action_rng.choice(ALL_SNAKE_ACTIONS) for _ in range(num_snakes)] for _ in seeds]
+        for _ in range(num_steps)
+    ]
+    expected = []
+    for game, game_seed in enumerate(seeds):
+        env = Environment(config=config, verbose=0)
+        env.seed(game_seed)
+        env.new_episode()
+        game_results = []
+        for step in range(num_steps):
+            env.choose_action(actions[step][game])
+            tsr = env.timestep()
+            stats = None
+            if tsr.is_episode_end:
+                stats = (
+                    env.timestep_index,
+                    [snake_stats.fruits_eaten for snake_stats in env.stats],
+                    [snake_stats.sum_episode_rewards for snake_stats in env.stats],
+                )
+                env.new_episode()
+            game_results.append((tsr.observation, tsr.reward, tsr.is_episode_end, stats))
+        expected.append(game_results)
+
+    batch_env = BatchEnvironment(config, num_envs=len(seeds))
+    batch_env.seed(seeds)
+    batch_env.new_episode()
+    num_episode_ends = 0
+
+    for step in range(num_steps):
+        batch_env.choose_action(actions[step])
+        tsr = batch_env.timestep()
+        for game in range(len(seeds)):
+            observation, rewards, is_episode_end, stats = expected[game][step]
+            actual_observation = tsr.terminal_observation if tsr.is_episode_end[game] else tsr.observation
+            assert np.array_equal(actual_observation[game], observation)
+            assert tsr.reward[game].tolist() == rewards
+            assert tsr.is_episode_end[game] == is_episode_end
+            if is_episode_end:
+                assert tsr.terminal_stats['timesteps_survived'][game] == stats[0]
+                assert tsr.terminal_stats['fruits_eaten'][game].tolist() == stats[1]
+                assert tsr.terminal_stats['sum_episode_rewards'][game].tolist() == stats[2]
+        num_episode_ends += tsr.is_episode_end.sum()
+
+    assert num_episode_ends > len(seeds)
+
+
+def test_batch_env_view_mode_keeps_terminal_observations_intact(level_config):
+    env = BatchEnvironment(level_config('10x10-blank'), num_envs=2, observation_mode='view')
+    env.seed(3)
+    tsr = env.new_episode()
+    assert not tsr.observation.flags.writeable
+
+    # Keep turning until both snakes crash and the games get reset.
+    while not tsr.is_episode_end.any():
+        env.choose_action([[1, 2], [1, 2]])
+        tsr = env.timestep()
+
+    assert tsr.terminal_observation is not tsr.observation
+    assert not np.array_equal(tsr.terminal_observation, tsr.observation)
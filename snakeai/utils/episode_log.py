@@ -0,0 +1,134 @@
+""" A compact binary log of the played episodes: the seed and the actions of every episode, enough to re-simulate it. """
+
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+
+LOG_MAGIC = b'SNAKELOG'
+LOG_VERSION = 1
+
+# Magic, version, level id, length of the level config.
+_FILE_HEADER = struct.Struct('<8sH16sI')
+
+# Seed, number of timesteps, number of snakes. The actions follow, one byte per snake per timestep.
+_EPISODE_HEADER = struct.Struct('<QIB')
+
+
+def get_level_id(config):
+    """ Get a short identifier of the level that changes whenever the level config does. """
+    config_json = json.dumps(config, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(config_json).hexdigest()[:16]
+
+
+class EpisodeLogWriter(object):
+    """
+    Writes the episodes to a binary log that can be read with `EpisodeLogReader`.
+
+    The file starts with the level config, followed by a record per episode:
+    the seed of the episode, then the joint actions of every timestep.
+    The actions of the current episode are kept in memory and written when the episode ends.
+    """
+
+    def __init__(self, filename, config):
+        """
+        Create a new log file.
+
+        Args:
+            filename: the name of the file to write.
+            config (dict): the configuration of the level the episodes are played on.
+        """
+        config_json = json.dumps(config).encode('utf-8')
+        self.file = open(filename, 'wb')
+        self.file.write(_FILE_HEADER.pack(LOG_MAGIC, LOG_VERSION, get_level_id(config).encode('ascii'), len(config_json)))
+        self.file.write(config_json)
+        self.seed = None
+        self.num_snakes = None
+        self.actions = bytearray()
+
+    def begin_episode(self, seed, num_snakes):
+        """ Start recording a new episode, played with the given random seed. """
+        self.seed = seed
+        self.num_snakes = num_snakes
+        self.actions = bytearray()
+
+    def record_timestep(self, actions):
+        """ Record the actions of every snake at the last timestep. """
+        self.actions.extend(actions)
+
+    def end_episode(self):
+        """ Write the current episode to the file. """
+        num_timesteps = len(self.actions) // self.num_snakes
+        self.file.write(_EPISODE_HEADER.pack(self.seed, num_timesteps, self.num_snakes))
+        self.file.write(self.actions)
+
+    def close(self):
+        """ Close the log file. """
+        self.file.close()
+
+
+class EpisodeLogReader(object):
+    """
+    Reads the episodes written by `EpisodeLogWriter`.
+
+    The episode records are indexed when the log is opened, so any episode can be read without reading the others.
+    """
+
+    def __init__(self, filename):
+        """
+        Open the log file and index the episodes.
+
+        Args:
+            filename: the name of the file to read.
+        """
+        self.file = open(filename, 'rb')
+        magic, version, level_id, config_length = _FILE_HEADER.unpack(self.file.read(_FILE_HEADER.size))
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            raise ValueError(f'Not a Snake episode log (version {LOG_VERSION}): "{filename}"')
+        self.level_id = level_id.decode('ascii')
+        self.config = json.loads(self.file.read(config_length).decode('utf-8'))
+
+        # Skip over the actions to find where every episode begins.
+        # An episode cut short (e.g., if the writer was killed) is left out.
+        file_size = os.fstat(self.file.fileno()).st_size
+        self.offsets = []
+        while True:
+            offset = self.file.tell()
+            header = self.file.read(_EPISODE_HEADER.size)
+            if len(header) < _EPISODE_HEADER.size:
+                break
+            _, num_timesteps, num_snakes = _EPISODE_HEADER.unpack(header)
+            if self.file.seek(num_timesteps * num_snakes, 1) > file_size:
+                break
+            self.offsets.append(offset)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def read_episode(self, episode):
+        """
+        Read an episode from the log.
+
+        Args:
+            episode (int): the index of the episode.
+
+        Returns:
+            A tuple (seed, actions), where actions is a (num_timesteps, num_snakes) uint8 array.
+        """
+        self.file.seek(self.offsets[episode])
+        seed, num_timesteps, num_snakes = _EPISODE_HEADER.unpack(self.file.read(_EPISODE_HEADER.size))
+        actions = np.frombuffer(self.file.read(num_timesteps * num_snakes), dtype=np.uint8)
+        return seed, actions.reshape(num_timesteps, num_snakes)
+
+    def close(self):
+        """ Close the log file. """
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,172 @@
+""" Evaluates agent checkpoints on many levels and seeds in parallel, and summarizes the results. """
+
+import collections
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from snakeai.agent import DeepQNetworkAgent, InferenceBroker, NumPyQNetwork
+from snakeai.gameplay.environment import Environment, get_snake_observation
+
+
+logger = logging.getLogger(__name__)
+
+
+class EvaluationTask(collections.namedtuple('EvaluationTask', ['checkpoint', 'level', 'seed', 'num_episodes'])):
+    """ A batch of episodes played by one checkpoint on one level with one seed. """
+
+
+def load_keras_checkpoint(filename):
+    """ Load a Keras model saved by `DeepQNetworkAgent.train` and convert it to a NumPy Q-network. """
+    from keras.models import load_model
+    return NumPyQNetwork.from_keras(load_model(filename))
+
+
+# The last model the worker process has loaded (or the error it has failed with), along with its key.
+# The tasks are handed out sorted by checkpoint, so a worker rarely needs a model it has already let go of.
+_loaded_model = (None, None)
+
+
+def _get_model(checkpoint, model_loader):
+    global _loaded_model
+    key = (model_loader, checkpoint)
+    if _loaded_model[0] != key:
+        # Let go of the previous model before loading the next one.
+        _loaded_model = (None, None)
+        try:
+            _loaded_model = (key, model_loader(checkpoint))
+        except Exception as e:
+            _loaded_model = (key, e)
+    if isinstance(_loaded_model[1], Exception):
+        raise _loaded_model[1]
+    return _loaded_model[1]
+
+
+def run_evaluation_task(task, model_loader=load_keras_checkpoint):
+    """
+    Play the episodes of the task, with a DQN agent per snake, all sharing the same model.
+
+    Args:
+        task (EvaluationTask): the episodes to play.
+        model_loader: a function that loads a checkpoint by its file name.
+
+    Returns:
+        A list of flat statistics rows, one per snake per episode.
+        The list is empty if the checkpoint can't be loaded, the level is invalid or the model doesn't fit it.
+    """
+    # A broken checkpoint or level shouldn't abort the whole sweep.
+    try:
+        model = _get_model(task.checkpoint, model_loader)
+    except Exception as e:
+        logger.warning('Skipping checkpoint %s: %s', task.checkpoint, e)
+        return []
+    try:
+        with open(task.level) as cfg:
+            env = Environment(config=json.load(cfg), verbose=0)
+    except (KeyError, ValueError) as e:
+        logger.warning('Skipping level %s: %s', task.level, e)
+        return []
+    if tuple(model.input_shape[-2:]) != env.observation_shape:
+        return []
+
+    env.seed(task.seed)
+    agents = [
+        DeepQNetworkAgent(model=model, memory_size=1, num_last_frames=model.input_shape[1], inference_model=model)
+        for _ in range(env.num_snakes)
+    ]
+    inference = InferenceBroker()
+    level_name = os.path.splitext(os.path.basename(task.level))[0]
+
+    rows = []
+    for episode in range(task.num_episodes):
+        start_time = time.perf_counter()
+        timestep = env.new_episode()
+        for agent in agents:
+            agent.begin_episode()
+        while not timestep.is_episode_end:
+            observations = [get_snake_observation(timestep.observation, i) for i in range(env.num_snakes)]
+            env.choose_action(inference.act(agents, observations, timestep.reward))
+            timestep = env.timestep()
+        seconds = time.perf_counter() - start_time
+
+        for i, stats in enumerate(env.stats):
+            rows.append(dict(
+                checkpoint=task.checkpoint,
+                level=level_name,
+                seed=task.seed,
+                episode=episode,
+                snake=i,
+                seconds=seconds,
+                **stats.flatten()
+            ))
+    return rows
+
+
+def evaluate(tasks, num_workers=None, model_loader=load_keras_checkpoint):
+    """
+    Run the evaluation tasks in a pool of worker processes.
+
+    The tasks of the same checkpoint are handed out next to each other, so that
+    the workers mostly play with the models they have already loaded.
+
+    Args:
+        tasks: a list of `EvaluationTask`.
+        num_workers (int): the number of worker processes (one per CPU core by default).
+        model_loader: a function that loads a checkpoint by its file name (must be picklable).
+
+    Returns:
+        A generator of the statistics rows of every task, in the order the tasks finish.
+    """
+    tasks = sorted(tasks, key=lambda task: task.checkpoint)
+    with multiprocessing.Pool(num_workers) as pool:
+        run_task = functools.partial(run_evaluation_task, model_loader=model_loader)
+        for rows in pool.imap_unordered(run_task, tasks):
+            yield from rows
+
+
+def summarize_results(rows, confidence_z=1.96):
+    """
+    Aggregate the per-episode statistics by checkpoint and level.
+
+    Args:
+        rows: the statistics rows returned by `run_evaluation_task`.
+        confidence_z (float): the z-score of the confidence interval (1.96 for 95%, normal approximation).
+
+    Returns:
+        A list of summary rows, sorted by checkpoint and level. The fruits are the mean per snake per episode,
+        with the confidence interval of that mean over the episodes.
+        The steps per second are measured per worker process, from the time spent playing the episodes.
+    """
+    groups = collections.defaultdict(list)
+    for row in rows:
+        groups[row['checkpoint'], row['level']].append(row)
+
+    summary = []
+    for (checkpoint, level), group in sorted(groups.items()):
+        # Every episode has a row per snake, but it has been played (and timed) only once.
+        episode_rows = collections.defaultdict(list)
+        for row in group:
+            episode_rows[row['seed'], row['episode']].append(row)
+        episodes = [rows[0] for rows in episode_rows.values()]
+        num_timesteps = sum(row['timesteps_survived'] for row in episodes)
+        seconds = sum(row['seconds'] for row in episodes)
+
+        # The snakes of the same episode play against each other, so their results are not independent:
+        # the confidence interval is computed over the episodes, from the mean of their snakes.
+        fruits = np.array([np.mean([row['fruits_eaten'] for row in rows]) for rows in episode_rows.values()])
+        fruits_ci = confidence_z * fruits.std(ddof=1) / np.sqrt(len(fruits)) if len(fruits) > 1 else np.nan
+        summary.append({
+            'checkpoint': checkpoint,
+            'level': level,
+            'episodes': len(episodes),
+            'fruits_mean': fruits.mean(),
+            'fruits_ci': fruits_ci,
+            'timesteps_mean': num_timesteps / len(episodes),
+            'steps_per_second': num_timesteps / seconds if seconds > 0 else np.nan,
+        })
+    return summary
@@ -0,0 +1,62 @@
+""" Provides a preallocated stack of the last observed frames, the state the DQN agents act on. """
+
+import numpy as np
+
+
+class FrameStack(object):
+    """
+    Keeps the last `num_frames` frames of one or more games in a preallocated circular buffer.
+
+    Every frame is written twice, `num_frames` slots apart, so the last `num_frames` frames
+    are always a contiguous slice of the buffer, from the oldest to the newest one.
+    Adding a frame is therefore a couple of in-place writes, and reading the state costs nothing.
+    """
+
+    def __init__(self, num_frames, frame_shape, batch_size=1, dtype=np.float32):
+        """
+        Create a new frame stack.
+
+        Args:
+            num_frames (int): the number of last frames to keep.
+            frame_shape (tuple): the shape of a single frame.
+            batch_size (int): the number of games observed at the same time.
+            dtype: the data type of the state (the frames are converted when written).
+        """
+        self.num_frames = num_frames
+        self.batch_size = batch_size
+        self._buffer = np.zeros((batch_size, 2 * num_frames) + tuple(frame_shape), dtype=dtype)
+        self._newest = num_frames - 1
+
+    @property
+    def state(self):
+        """
+        Get a (batch_size, num_frames, *frame_shape) view of the last frames, the newest frame being the last.
+
+        The view is overwritten by the following calls to `push`, so it has to be copied to be kept around.
+        """
+        return self._buffer[:, self._newest + 1:self._newest + 1 + self.num_frames]
+
+    def reset(self, frames, games=None):
+        """
+        Fill the whole stack with the same frame, as if it had been observed `num_frames` times.
+
+        Args:
+            frames: the first frame of every game (or of the specified games).
+            games: (optional) the indices of the games to reset, all games by default.
+        """
+        frames = np.reshape(frames, (-1, 1) + self._buffer.shape[2:])
+        if games is None:
+            self._buffer[:] = frames
+        else:
+            self._buffer[games] = frames
+
+    def push(self, frames):
+        """
+        Add the newest frame of every game, dropping the oldest one.
+
+        Args:
+            frames: a frame for every game, either (batch_size, *frame_shape) or just a frame for a single game.
+        """
+        self._newest = (self._newest + 1) % self.num_frames
+        self._buffer[:, self._newest] = frames
+        self._buffer[:, self._newest + self.num_frames] = frames
@@ -1,5 +1,6 @@
-import collections
+import queue
 import random
+import threading
 
 import numpy as np
 
@@ -10,71 +11,607 @@ class ExperienceReplay(object):
     def __init__(self, input_shape, num_actions, memory_size=100):
         """
         Create a new instance of experience replay memory.
-        
+
         Args:
-            input_shape: the shape of the agent state.
+            input_shape: the shape of the agent state, (num_last_frames, grid_size, grid_size).
             num_actions: the number of actions allowed in the environment.
-            memory_size: memory size limit (-1 for unlimited).
+            memory_size: the maximum number of transitions to keep (the oldest ones get overwritten).
         """
-        self.memory = collections.deque()
-        self.input_shape = input_shape
+        if memory_size <= 0:
+            raise ValueError(f'Memory size must be positive, got {memory_size}')
+
+        self.input_shape = tuple(input_shape)
         self.num_actions = num_actions
         self.memory_size = memory_size
 
+        # Columnar ring buffer.
+        self.actions = np.zeros(memory_size, dtype=np.uint8)
+        self.rewards = np.zeros(memory_size, dtype=np.float32)
+        self.episode_ends = np.zeros(memory_size, dtype=bool)
+        self._allocate_states()
+        self.reset()
+
+    def _allocate_states(self):
+        """ Allocate the storage for the observed states. """
+        # Since `state_next` only differs from `state` by the newest frame,
+        # we keep the full state once and just the new frame for the next state.
+        self.states = np.zeros((self.memory_size, ) + self.input_shape, dtype=np.uint8)
+        self.next_frames = np.zeros((self.memory_size, ) + self.input_shape[1:], dtype=np.uint8)
+
+    def _columns(self):
+        """ Get all arrays the memory is stored in. """
+        return [self.states, self.next_frames, self.actions, self.rewards, self.episode_ends]
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """ Get the number of bytes allocated for the memory. """
+        return sum(column.nbytes for column in self._columns())
+
     def reset(self):
         """ Erase the experience replay memory. """
-        self.memory = collections.deque()
+        self.size = 0
+        self.next_idx = 0
 
-    def remember(self, state, action, reward, state_next, is_episode_end):
+    def remember(self, state, action, reward, state_next, is_episode_end, stream=0):
         """
         Store a new piece of experience into the replay memory.
-        
+
         Args:
             state: state observed at the previous step.
             action: action taken at the previous step.
             reward: reward received at the beginning of the current step.
-            state_next: state observed at the current step. 
+            state_next: state observed at the current step.
             is_episode_end: whether the episode has ended with the current step.
+            stream: identifies the agent and environment the experience comes from
+                (used by memories that link consecutive transitions together).
+        """
+        idx = self.next_idx
+        self.states[idx] = np.reshape(state, self.input_shape)
+        self.next_frames[idx] = np.reshape(state_next, self.input_shape)[-1]
+        self.actions[idx] = action
+        self.rewards[idx] = reward
+        self.episode_ends[idx] = is_episode_end
+
+        self.next_idx = (idx + 1) % self.memory_size
+        self.size = min(self.size + 1, self.memory_size)
+
+    def remember_batch(self, states, actions, rewards, states_next, episode_ends, streams=None):
+        """
+        Store a batch of experience at once, in the order of the batch (see `remember` for the arguments).
+        If the batch is larger than the memory, only its last `memory_size` transitions are kept.
+        """
+        count = len(actions)
+        idx = self._get_ring_indices(count)
+        kept = slice(count - len(idx), count)
+        self.states[idx] = np.reshape(states, (count, ) + self.input_shape)[kept]
+        self.next_frames[idx] = np.reshape(states_next, (count, ) + self.input_shape)[kept, -1]
+        self.actions[idx] = actions[kept]
+        self.rewards[idx] = rewards[kept]
+        self.episode_ends[idx] = episode_ends[kept]
+
+        self.next_idx = (self.next_idx + count) % self.memory_size
+        self.size = min(self.size + count, self.memory_size)
+
+    def _get_ring_indices(self, count):
+        """ Get the memory indices the last `memory_size` of the next `count` transitions will be stored at. """
+        return (self.next_idx + np.arange(max(count - self.memory_size, 0), count)) % self.memory_size
+
+    def sample(self, batch_size):
+        """
+        Sample a random batch of transitions.
+
+        Returns:
+            A tuple (states, actions, rewards, states_next, episode_ends) of batch arrays.
+        """
+        batch_size = min(len(self), batch_size)
+        idx = np.array(random.sample(range(len(self)), batch_size), dtype=np.int64)
+        return self._gather(idx)
+
+    def sample_with_weights(self, batch_size):
+        """
+        Sample a random batch of transitions for training.
+
+        Returns:
+            A tuple (transitions, idx, weights) in the same format as `PrioritizedExperienceReplay.sample_with_weights`.
+            Uniform sampling needs neither the indices nor the weights (None).
+        """
+        return self.sample(batch_size), None, None
+
+    def _gather(self, idx):
+        """ Get the transitions stored at the given indices as batch arrays. """
+        states = self.states[idx]
+        states_next = np.concatenate([states[:, 1:], self.next_frames[idx, np.newaxis]], axis=1)
+        return states, self.actions[idx], self.rewards[idx], states_next, self.episode_ends[idx]
+
+    def get_batch(self, model, batch_size, discount_factor=0.9, target_model=None, sample=None):
+        """
+        Sample a batch from experience replay.
+
+        Args:
+            model: the online Q-network being trained.
+            batch_size (int): the number of transitions to sample.
+            discount_factor (float): discount factor (gamma) for computing the value function.
+            target_model: (optional) a periodically synced copy of the model. If specified,
+                Double DQN targets are computed: the online model chooses the next action
+                and the target model evaluates it.
+            sample: (optional) a batch sampled ahead of time by `sample_with_weights`
+                (see `BatchPrefetcher`) to use instead of sampling a new one.
+
+        Returns:
+            A tuple (states, targets, sample_weights) ready to be passed to `model.train_on_batch`,
+            or None if the memory is empty. Uniform sampling needs no sample weights (None).
+        """
+        if sample is None and len(self) == 0:
+            return None
+
+        transitions, _, _ = sample if sample is not None else self.sample_with_weights(batch_size)
+        states, targets, _ = self._compute_targets(model, *transitions, discount_factor, target_model=target_model)
+        return states, targets, None
+
+    def _compute_targets(self, model, states, actions, rewards, states_next, episode_ends, discount_factor,
+                         target_model=None):
+        """
+        Compute the Q-learning targets for a batch of transitions.
+
+        Returns:
+            A tuple (states, targets, q), where `q` is the current model prediction for `states`.
+        """
+        batch_size = len(states)
+        batch_range = np.arange(batch_size)
+        states = states.astype(np.float32)
+        states_next = states_next.astype(np.float32)
+
+        # Predict the current and the future state-action values in a single call.
+        y = model.predict(np.concatenate([states, states_next], axis=0))
+        q, q_next = y[:batch_size], y[batch_size:]
+        if target_model is None:
+            next_values = q_next.max(axis=1)
+        else:
+            next_actions = q_next.argmax(axis=1)
+            next_values = target_model.predict(states_next)[batch_range, next_actions]
+
+        # Only the value of the action that was taken changes.
+        targets = np.array(q, dtype=np.float32)
+        targets[batch_range, actions] = rewards + discount_factor * ~episode_ends * next_values
+        return states, targets, q
+
+    def update_priorities(self, idx=None, td_errors=None):
+        """
+        Update the sampling priorities after learning on a batch.
+        Uniform experience replay has no priorities, so this does nothing.
+        """
+        pass
+
+
+class FrameDeduplicatedExperienceReplay(ExperienceReplay):
+    """
+    Experience replay memory that stores every observed frame exactly once.
+
+    Consecutive states of an episode share all but one frame. Instead of storing the stacks,
+    every frame keeps a link to the previous frame of the same episode (the first frame links to itself),
+    and the (num_last_frames, grid_size, grid_size) stacks are rebuilt by following the links on sampling.
+    Several streams of experience (e.g. different snakes or environments) can be interleaved
+    as long as they are passed with different `stream` keys.
+    """
+
+    def __init__(self, input_shape, num_actions, memory_size=100, frame_memory_size=None):
+        """
+        Create a new instance of frame-deduplicated experience replay memory.
+
+        Args:
+            input_shape: the shape of the agent state, (num_last_frames, grid_size, grid_size).
+            num_actions: the number of actions allowed in the environment.
+            memory_size: the maximum number of transitions to keep (the oldest ones get overwritten).
+            frame_memory_size: the maximum number of frames to keep. It should be slightly larger
+                than `memory_size` to leave room for the first frame of every episode.
+        """
+        self.frame_memory_size = frame_memory_size or memory_size + memory_size // 8 + input_shape[0]
+        super().__init__(input_shape, num_actions, memory_size)
+
+    def _allocate_states(self):
+        """ Allocate the storage for the observed frames and the links between them. """
+        self.frames = np.zeros((self.frame_memory_size, ) + self.input_shape[1:], dtype=np.uint8)
+        self.prev_frame_idx = np.zeros(self.frame_memory_size, dtype=np.int32)
+        self.frame_last_used_by = np.zeros(self.frame_memory_size, dtype=np.int64)
+        self.next_frame_idx = np.zeros(self.memory_size, dtype=np.int32)
+
+    def _columns(self):
+        """ Get all arrays the memory is stored in. """
+        return [
+            self.frames, self.prev_frame_idx, self.frame_last_used_by,
+            self.next_frame_idx, self.actions, self.rewards, self.episode_ends,
+        ]
+
+    def __len__(self):
+        return self.num_items_seen - max(self.first_valid_item, self.num_items_seen - self.memory_size)
+
+    def reset(self):
+        """ Erase the experience replay memory. """
+        self.frame_last_used_by.fill(-1)
+        self.num_frames_seen = 0
+        self.num_items_seen = 0
+        self.first_valid_item = 0
+        self.stream_last_frame = {}
+
+    def _add_frame(self, frame, prev_idx=None):
+        """ Store a new frame linked to `prev_idx` (or to itself if it's the first frame of an episode). """
+        idx = self.num_frames_seen % self.frame_memory_size
+
+        # Forget the transitions that still use the frame we're about to overwrite.
+        self.first_valid_item = max(self.first_valid_item, self.frame_last_used_by[idx] + 1)
+
+        self.frames[idx] = frame
+        self.prev_frame_idx[idx] = idx if prev_idx is None else prev_idx
+        self.frame_last_used_by[idx] = -1
+        self.num_frames_seen += 1
+        return idx
+
+    def _get_stack_frame_indices(self, last_frame_idx, num_frames):
+        """ Follow the links back from the given frames to get the frame indices of the whole stacks. """
+        stacks = np.empty(np.shape(last_frame_idx) + (num_frames, ), dtype=np.int64)
+        stacks[..., -1] = last_frame_idx
+        for i in range(num_frames - 2, -1, -1):
+            stacks[..., i] = self.prev_frame_idx[stacks[..., i + 1]]
+        return stacks
+
+    def remember(self, state, action, reward, state_next, is_episode_end, stream=0):
+        """
+        Store a new piece of experience into the replay memory.
+
+        Args:
+            state: state observed at the previous step.
+            action: action taken at the previous step.
+            reward: reward received at the beginning of the current step.
+            state_next: state observed at the current step.
+            is_episode_end: whether the episode has ended with the current step.
+            stream: identifies the agent and environment the experience comes from.
+        """
+        state = np.reshape(state, self.input_shape)
+        state_next = np.reshape(state_next, self.input_shape)
+
+        # Continue the current episode of the stream if we've stored its last frame at the previous step.
+        # Otherwise, store the whole stack, collapsing the repeated first frame at the start of an episode.
+        state_idx = self.stream_last_frame.get(stream)
+        if state_idx is None or not np.array_equal(self.frames[state_idx], state[-1]):
+            first = 0
+            while first + 1 < len(state) and np.array_equal(state[first + 1], state[0]):
+                first += 1
+            state_idx = None
+            for frame in state[first:]:
+                state_idx = self._add_frame(frame, state_idx)
+
+        next_idx = self._add_frame(state_next[-1], state_idx)
+        self.stream_last_frame[stream] = None if is_episode_end else next_idx
+
+        item_idx = self.num_items_seen % self.memory_size
+        self.next_frame_idx[item_idx] = next_idx
+        self.actions[item_idx] = action
+        self.rewards[item_idx] = reward
+        self.episode_ends[item_idx] = is_episode_end
+
+        used_frames = self._get_stack_frame_indices(next_idx, self.input_shape[0] + 1)
+        self.frame_last_used_by[used_frames] = self.num_items_seen
+        self.num_items_seen += 1
+
+    def remember_batch(self, states, actions, rewards, states_next, episode_ends, streams=None):
+        """
+        Store a batch of experience, in the order of the batch (see `remember` for the arguments).
+        Every transition is linked to the previous one of the same stream, so they are stored one by one.
+        """
+        if streams is None:
+            streams = np.zeros(len(actions), dtype=np.int64)
+        for transition in zip(states, actions, rewards, states_next, episode_ends, streams):
+            self.remember(*transition)
+
+    def sample(self, batch_size):
+        """
+        Sample a random batch of transitions.
+
+        Returns:
+            A tuple (states, actions, rewards, states_next, episode_ends) of batch arrays.
         """
-        memory_item = np.concatenate([
-            state.flatten(),
-            np.array(action).flatten(),
-            np.array(reward).flatten(),
-            state_next.flatten(),
-            1 * np.array(is_episode_end).flatten()
-        ])
-        self.memory.append(memory_item)
-        if 0 < self.memory_size < len(self.memory):
-            self.memory.popleft()
-
-    def get_batch(self, model, batch_size, discount_factor=0.9):
-        """ Sample a batch from experience replay. """
-
-        batch_size = min(len(self.memory), batch_size)
-        experience = np.array(random.sample(self.memory, batch_size))
-        input_dim = np.prod(self.input_shape)
-
-        # Extract [S, a, r, S', end] from experience.
-        states = experience[:, 0:input_dim]
-        actions = experience[:, input_dim]
-        rewards = experience[:, input_dim + 1]
-        states_next = experience[:, input_dim + 2:2 * input_dim + 2]
-        episode_ends = experience[:, 2 * input_dim + 2]
-
-        # Reshape to match the batch structure.
-        states = states.reshape((batch_size, ) + self.input_shape)
-        actions = np.cast['int'](actions)
-        rewards = rewards.repeat(self.num_actions).reshape((batch_size, self.num_actions))
-        states_next = states_next.reshape((batch_size, ) + self.input_shape)
-        episode_ends = episode_ends.repeat(self.num_actions).reshape((batch_size, self.num_actions))
-
-        # Predict future state-action values.
-        X = np.concatenate([states, states_next], axis=0)
-        y = model.predict(X)
-        Q_next = np.max(y[batch_size:], axis=1).repeat(self.num_actions).reshape((batch_size, self.num_actions))
-
-        delta = np.zeros((batch_size, self.num_actions))
-        delta[np.arange(batch_size), actions] = 1
-
-        targets = (1 - delta) * y[:batch_size] + delta * (rewards + discount_factor * (1 - episode_ends) * Q_next)
-        return states, targets
+        size = len(self)
+        batch_size = min(size, batch_size)
+        first_item = self.num_items_seen - size
+        idx = (first_item + np.array(random.sample(range(size), batch_size), dtype=np.int64)) % self.memory_size
+        return self._gather(idx)
+
+    def _gather(self, idx):
+        """ Get the transitions stored at the given indices as batch arrays. """
+        # The state and the next state together span `num_last_frames + 1` frames.
+        stacks = self._get_stack_frame_indices(self.next_frame_idx[idx], self.input_shape[0] + 1)
+        frames = self.frames[stacks]
+        return frames[:, :-1], self.actions[idx], self.rewards[idx], frames[:, 1:], self.episode_ends[idx]
+
+
+class SumTree(object):
+    """
+    A binary tree where every node holds the sum of its children.
+    Supports updating the leaf values and finding a leaf by prefix sum in O(log n).
+    """
+
+    def __init__(self, capacity):
+        """
+        Create a new sum tree.
+
+        Args:
+            capacity (int): the number of leaves.
+        """
+        self.capacity = capacity
+        self.num_leaves = 1 << max(capacity - 1, 0).bit_length()
+        self.nodes = np.zeros(2 * self.num_leaves)
+
+    @property
+    def total(self):
+        """ Get the sum of all leaf values. """
+        return self.nodes[1]
+
+    def __getitem__(self, idx):
+        """ Get the values of the given leaves. """
+        return self.nodes[np.asarray(idx) + self.num_leaves]
+
+    def set(self, idx, value):
+        """ Set the value of a single leaf and update its ancestors. """
+        node = idx + self.num_leaves
+        self.nodes[node] = value
+        while node > 1:
+            node //= 2
+            self.nodes[node] = self.nodes[2 * node] + self.nodes[2 * node + 1]
+
+    def update(self, idx, values):
+        """ Set the values of the given leaves and update their ancestors. """
+        nodes = np.unique(np.asarray(idx) + self.num_leaves)
+        self.nodes[np.asarray(idx) + self.num_leaves] = values
+        while nodes[0] > 1:
+            nodes = np.unique(nodes // 2)
+            self.nodes[nodes] = self.nodes[2 * nodes] + self.nodes[2 * nodes + 1]
+
+    def find(self, prefix_sums, size=None):
+        """
+        For each of the prefix sums, find the leaf where the cumulative sum of the values exceeds it.
+
+        Args:
+            prefix_sums: the prefix sums to look up.
+            size (int): the number of leaves in use (all of them by default). A prefix sum that reaches the
+                total because of the floating point error in the sums still maps to the last leaf in use.
+        """
+        size = self.capacity if size is None else size
+        prefix_sums = np.array(prefix_sums, dtype=np.float64)
+        nodes = np.ones(len(prefix_sums), dtype=np.int64)
+        while nodes[0] < self.num_leaves:
+            left = 2 * nodes
+            go_right = prefix_sums >= self.nodes[left]
+            prefix_sums -= np.where(go_right, self.nodes[left], 0)
+            nodes = left + go_right
+        return np.minimum(nodes - self.num_leaves, size - 1)
+
+
+class PrioritizedExperienceReplay(ExperienceReplay):
+    """
+    Experience replay memory that samples transitions proportionally to their TD errors.
+
+    The priorities are kept in a sum tree, so both sampling and updating the priorities take O(log n).
+    The bias introduced by non-uniform sampling is corrected by importance-sampling weights.
+    """
+
+    def __init__(self, input_shape, num_actions, memory_size=100,
+                 alpha=0.6, beta=0.4, beta_increment=1e-5, epsilon=1e-6):
+        """
+        Create a new instance of prioritized experience replay memory.
+
+        Args:
+            input_shape: the shape of the agent state, (num_last_frames, grid_size, grid_size).
+            num_actions: the number of actions allowed in the environment.
+            memory_size: the maximum number of transitions to keep (the oldest ones get overwritten).
+            alpha: how much prioritization is used (0 = uniform sampling).
+            beta: the initial strength of the importance-sampling correction (1 = full correction).
+            beta_increment: how much `beta` grows towards 1 with every sampled batch.
+            epsilon: a small constant that keeps the priorities of zero-error transitions above zero.
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.priorities = SumTree(memory_size)
+        super().__init__(input_shape, num_actions, memory_size)
+
+    def _columns(self):
+        """ Get all arrays the memory is stored in. """
+        return super()._columns() + [self.priorities.nodes]
+
+    def reset(self):
+        """ Erase the experience replay memory. """
+        super().reset()
+        self.priorities.nodes.fill(0)
+        self.max_priority = 1.0
+        self.last_batch_idx = None
+        self.last_td_errors = None
+
+    def remember(self, state, action, reward, state_next, is_episode_end, stream=0):
+        """
+        Store a new piece of experience into the replay memory.
+        New transitions get the highest priority, so that each of them is likely to be replayed at least once.
+        """
+        idx = self.next_idx
+        super().remember(state, action, reward, state_next, is_episode_end, stream)
+        self.priorities.set(idx, self.max_priority)
+
+    def remember_batch(self, states, actions, rewards, states_next, episode_ends, streams=None):
+        """ Store a batch of experience at once, giving all new transitions the highest priority. """
+        idx = self._get_ring_indices(len(actions))
+        super().remember_batch(states, actions, rewards, states_next, episode_ends, streams)
+        self.priorities.update(idx, self.max_priority)
+
+    def sample_with_weights(self, batch_size):
+        """
+        Sample a batch of transitions with probabilities proportional to their priorities.
+
+        Returns:
+            A tuple (transitions, idx, weights), where `transitions` is the same as returned by `sample`,
+            `idx` are the memory indices of the sampled transitions and `weights` are their
+            importance-sampling weights.
+        """
+        batch_size = min(len(self), batch_size)
+
+        # Stratified sampling: draw one transition from each of `batch_size` equal priority ranges.
+        segment = self.priorities.total / batch_size
+        prefix_sums = (np.arange(batch_size) + np.random.random(batch_size)) * segment
+        idx = self.priorities.find(prefix_sums, size=len(self))
+
+        probabilities = self.priorities[idx] / self.priorities.total
+        weights = (len(self) * probabilities) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        return self._gather(idx), idx, weights
+
+    def sample(self, batch_size):
+        """
+        Sample a batch of transitions with probabilities proportional to their priorities.
+
+        Returns:
+            A tuple (states, actions, rewards, states_next, episode_ends) of batch arrays.
+        """
+        return self.sample_with_weights(batch_size)[0]
+
+    def get_batch(self, model, batch_size, discount_factor=0.9, target_model=None, sample=None):
+        """
+        Sample a prioritized batch from experience replay (see `ExperienceReplay.get_batch` for the arguments).
+
+        Returns:
+            A tuple (states, targets, sample_weights) ready to be passed to `model.train_on_batch`,
+            or None if the memory is empty. The TD errors of the batch are remembered,
+            so that `update_priorities` can be called once the model has been trained on it.
+        """
+        if sample is None and len(self) == 0:
+            return None
+
+        transitions, idx, weights = sample if sample is not None else self.sample_with_weights(batch_size)
+        states, targets, q = self._compute_targets(model, *transitions, discount_factor, target_model=target_model)
+
+        actions = transitions[1]
+        batch_range = np.arange(len(idx))
+        self.last_batch_idx = idx
+        self.last_td_errors = targets[batch_range, actions] - q[batch_range, actions]
+        return states, targets, weights
+
+    def update_priorities(self, idx=None, td_errors=None):
+        """
+        Update the sampling priorities of the transitions according to their TD errors.
+
+        Args:
+            idx: memory indices of the transitions (the last sampled batch by default).
+            td_errors: the corresponding TD errors (the ones computed for the last sampled batch by default).
+        """
+        if idx is None:
+            idx, td_errors = self.last_batch_idx, self.last_td_errors
+        if idx is None:
+            return
+
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        self.priorities.update(idx, priorities)
+        self.max_priority = max(self.max_priority, float(np.max(priorities)))
+
+
+class BatchPrefetcher(object):
+    """
+    Samples batches from experience replay on a background thread, so that the learner
+    finds them ready instead of waiting for the sampling while the environment is idle.
+
+    The prefetched batches are slightly stale: they may miss the latest transitions and priorities.
+    All access to the memory from the other threads has to go through `remember` and `update_priorities`
+    (or hold `lock`), since the memory itself is not thread-safe.
+    """
+
+    def __init__(self, memory, batch_size, num_batches=2, min_memory_size=1):
+        """
+        Create a new prefetcher and start the sampling thread.
+
+        Args:
+            memory: an experience replay memory.
+            batch_size (int): the size of every sampled batch.
+            num_batches (int): the maximum number of batches sampled ahead of time.
+            min_memory_size (int): the number of transitions the memory should hold before sampling starts.
+        """
+        self.memory = memory
+        self.batch_size = batch_size
+        self.min_memory_size = max(min_memory_size, 1)
+        self.lock = threading.Lock()
+        self.batches = queue.Queue(maxsize=num_batches)
+        self.stop_event = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def remember(self, *args, **kwargs):
+        """ Store a new piece of experience into the memory (see `ExperienceReplay.remember`). """
+        with self.lock:
+            self.memory.remember(*args, **kwargs)
+
+    def remember_batch(self, *args, **kwargs):
+        """ Store a batch of experience into the memory (see `ExperienceReplay.remember_batch`). """
+        with self.lock:
+            self.memory.remember_batch(*args, **kwargs)
+
+    def update_priorities(self):
+        """ Update the sampling priorities of the last batch (see `ExperienceReplay.update_priorities`). """
+        with self.lock:
+            self.memory.update_priorities()
+
+    def get_batch(self, model, discount_factor=0.9, target_model=None):
+        """
+        Compute the training batch out of the next prefetched sample (see `ExperienceReplay.get_batch`).
+
+        Returns:
+            A tuple (states, targets, sample_weights), or None if the memory is too small to sample from yet.
+
+        Raises:
+            RuntimeError: if the sampling thread has failed or has been stopped.
+        """
+        if len(self.memory) < self.min_memory_size:
+            return None
+        while True:
+            try:
+                sample = self.batches.get(timeout=0.1)
+                break
+            except queue.Empty:
+                # Don't wait forever for a thread that won't put anything into the queue anymore.
+                if self.error is not None:
+                    raise RuntimeError('The batch sampling thread has failed') from self.error
+                if not self.thread.is_alive():
+                    raise RuntimeError('The batch sampling thread has been stopped')
+        return self.memory.get_batch(
+            model, self.batch_size, discount_factor, target_model=target_model, sample=sample
+        )
+
+    def close(self):
+        """ Stop the sampling thread. """
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        """ Keep the queue of batches full until stopped, keeping the error (if any) for the learner to re-raise. """
+        try:
+            self._fill_queue()
+        except Exception as e:
+            self.error = e
+
+    def _fill_queue(self):
+        while not self.stop_event.is_set():
+            with self.lock:
+                sample = None
+                if len(self.memory) >= self.min_memory_size:
+                    sample = self.memory.sample_with_weights(self.batch_size)
+            if sample is None:
+                self.stop_event.wait(0.01)
+                continue
+
+            while not self.stop_event.is_set():
+                try:
+                    self.batches.put(sample, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
@@ -0,0 +1,167 @@
+""" Renders the field cells to RGB images with NumPy only, so that frames can be produced without a display. """
+
+import itertools
+import multiprocessing
+
+import numpy as np
+
+from snakeai.gameplay.entities import CellType, ALL_SNAKE_HEADS, ALL_SNAKE_BODIES
+from snakeai.gameplay.replay import ReplayEnvironment
+
+
+class Colors:
+
+    SCREEN_BACKGROUND = (170, 204, 153)
+    CELL_TYPE = {
+        CellType.WALL: (56, 56, 56),
+        #CellType.SNAKE_BODY0: (105, 132, 164),
+        #CellType.SNAKE_BODY1: (164, 132, 105),
+        CellType.SNAKE_HEAD0: (0, 120, 0),
+        CellType.SNAKE_HEAD1: (0, 0, 120),
+        CellType.SNAKE_BODY0: (0, 255, 0),
+        CellType.SNAKE_BODY1: (0, 0, 255),
+        CellType.FRUIT: (173, 52, 80),
+    }
+
+    # The snakes after the first two.
+    CELL_TYPE.update(zip(
+        ALL_SNAKE_HEADS[2:] + ALL_SNAKE_BODIES[2:],
+        [(120, 0, 0), (120, 120, 0), (120, 0, 120), (0, 120, 120), (60, 60, 60), (120, 60, 0)] +
+        [(255, 0, 0), (255, 255, 0), (255, 0, 255), (0, 255, 255), (128, 128, 128), (255, 128, 0)]
+    ))
+
+
+class TileAtlas(object):
+    """
+    Holds a pre-rendered tile for every cell type and composes whole frames out of them.
+
+    The tiles are indexed by the cell type, so a frame is a single fancy-indexing lookup
+    of the field cells followed by a reshape, no matter how many cells have changed.
+    The tiles are kept both as RGB and as indices into a small palette (for the GIF export).
+    """
+
+    def __init__(self, cell_size, colors=Colors.CELL_TYPE, background=Colors.SCREEN_BACKGROUND):
+        """
+        Create a new atlas.
+
+        Args:
+            cell_size (int): the width and height of a tile in pixels.
+            colors (dict): the color of every non-empty cell type.
+            background (tuple): the color of the empty cells.
+        """
+        self.cell_size = cell_size
+        self.palette = np.array([background] + list(colors.values()), dtype=np.uint8)
+        self.indexed_tiles = np.zeros((max(colors) + 1, cell_size, cell_size), dtype=np.uint8)
+        for color_index, cell_type in enumerate(colors, start=1):
+            self._draw_tile(self.indexed_tiles[cell_type], color_index)
+        self.tiles = self.palette[self.indexed_tiles]
+
+    def _draw_tile(self, tile, color):
+        """ Draw a one-pixel outline with a filled square in the middle, the way the GUI always has. """
+        tile[0, :] = tile[-1, :] = tile[:, 0] = tile[:, -1] = color
+        padding = self.cell_size // 6
+        tile[padding:self.cell_size - padding, padding:self.cell_size - padding] = color
+
+    def render(self, cells, indexed=False):
+        """
+        Compose the image of the field.
+
+        Args:
+            cells: a (height, width) array of cell types.
+            indexed (bool): whether to return the palette indices instead of the RGB colors.
+
+        Returns:
+            A (height * cell_size, width * cell_size, 3) RGB array,
+            or a (height * cell_size, width * cell_size) array of palette indices.
+        """
+        height, width = cells.shape
+        tiles = self.indexed_tiles if indexed else self.tiles
+        frame = tiles[cells].swapaxes(1, 2)
+        return frame.reshape((height * self.cell_size, width * self.cell_size) + tiles.shape[3:])
+
+
+def render_episode(config, recording, cell_size=20, indexed=False):
+    """
+    Replay a recorded episode and render its frames one by one.
+
+    Args:
+        config (dict): the configuration of the level the episode was played on.
+        recording (EpisodeRecording): the episode to render.
+        cell_size (int): the width and height of a cell in pixels.
+        indexed (bool): whether to render the palette indices instead of the RGB colors.
+
+    Returns:
+        A generator of frames (see `TileAtlas.render`), one per timestep plus the initial one.
+    """
+    atlas = TileAtlas(cell_size)
+    env = ReplayEnvironment(config)
+    for cells in env.replay(recording):
+        yield atlas.render(cells, indexed)
+
+
+def export_episode(config, recording, filename_pattern, episode=0, cell_size=20, frame_duration=100):
+    """
+    Render a recorded episode to an animated GIF, or to a sequence of images.
+
+    The frames are rendered and written one at a time, so long episodes don't have to fit in memory.
+
+    Args:
+        config (dict): the configuration of the level the episode was played on.
+        recording (EpisodeRecording): the episode to render.
+        filename_pattern (str): the name of the file to write, formatted with the `episode` index
+            (and the `frame` index if it's not a GIF), like "episode-{episode:04d}-{frame:04d}.png".
+        episode (int): the index of the episode to put in the file name.
+        cell_size (int): the width and height of a cell in pixels.
+        frame_duration (int): the duration of a GIF frame in milliseconds.
+    """
+    from PIL import Image
+
+    palette = TileAtlas(cell_size).palette.ravel().tolist()
+
+    def to_image(frame):
+        height, width = frame.shape
+        image = Image.frombytes('P', (width, height), frame.tobytes())
+        image.putpalette(palette)
+        return image
+
+    images = (to_image(frame) for frame in render_episode(config, recording, cell_size, indexed=True))
+    if filename_pattern.lower().endswith('.gif'):
+        _write_gif(filename_pattern.format(episode=episode), images, frame_duration)
+    else:
+        for i, image in enumerate(images):
+            image.save(filename_pattern.format(episode=episode, frame=i))
+
+
+def _write_gif(filename, images, frame_duration):
+    """ Write the palette images to a looping animated GIF, appending the frames as they come. """
+    from PIL import GifImagePlugin
+
+    images = iter(images)
+    first_image = next(images)
+    # The palette is shared by all frames, so it must not be optimized for the first one.
+    header, _ = GifImagePlugin.getheader(first_image, info={'optimize': False, 'loop': 0})
+    with open(filename, 'wb') as f:
+        f.writelines(header)
+        for image in itertools.chain([first_image], images):
+            f.writelines(GifImagePlugin.getdata(image, duration=frame_duration))
+        f.write(b';')
+
+
+def export_episodes(config, recordings, filename_pattern, cell_size=20, frame_duration=100, num_workers=None):
+    """
+    Render many recorded episodes in parallel, one process per CPU core by default.
+
+    Args:
+        config (dict): the configuration of the level the episodes were played on.
+        recordings: a list of `EpisodeRecording`.
+        filename_pattern (str): the name of the files to write (see `export_episode`).
+        cell_size (int): the width and height of a cell in pixels.
+        frame_duration (int): the duration of a GIF frame in milliseconds.
+        num_workers (int): the number of worker processes.
+    """
+    tasks = [
+        (config, recording, filename_pattern, episode, cell_size, frame_duration)
+        for episode, recording in enumerate(recordings)
+    ]
+    with multiprocessing.Pool(num_workers) as pool:
+        pool.starmap(export_episode, tasks)
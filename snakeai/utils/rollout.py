@@ -0,0 +1,324 @@
+""" Provides a pool of worker processes that collect DQN experience in parallel with the learner. """
+
+import multiprocessing
+import queue
+import random
+import time
+
+import numpy as np
+
+from snakeai.agent import NumPyQNetwork
+from snakeai.agent.dqn import play_epsilon_greedy_episode
+from snakeai.gameplay.environment import Environment
+from snakeai.utils.frames import FrameStack
+
+
+class RolloutWorkerPool(object):
+    """
+    Runs a pool of processes, each playing its own self-play Snake environment.
+
+    The workers act with a periodically synced NumPy copy of the model, so they never import Keras,
+    and stream the transitions back to the learner in fixed-size chunks. The chunks live in shared
+    memory, so only the slot index and a few episode statistics travel through the queues.
+    """
+
+    def __init__(self, env_config, model=None, num_workers=2, num_last_frames=4,
+                 chunk_size=64, chunks_per_worker=4, seed=None):
+        """
+        Create a new pool of rollout workers (call `start` to launch the processes).
+
+        Args:
+            env_config (dict): level configuration, typically found in JSON configs.
+            model: the Keras model to act with, or None to act randomly.
+            num_workers (int): the number of worker processes.
+            num_last_frames (int): the number of last frames that make up an agent state.
+            chunk_size (int): the number of transitions sent to the learner at once.
+            chunks_per_worker (int): the number of shared memory chunks allocated per worker.
+            seed (int): base random seed for the worker environments.
+        """
+        ctx = multiprocessing.get_context('spawn')
+        field_size = len(env_config['field'])
+        num_chunks = num_workers * chunks_per_worker
+
+        self.env_config = env_config
+        self.network = NumPyQNetwork.from_keras(model) if model is not None else None
+        self.num_workers = num_workers
+        self.num_last_frames = num_last_frames
+        self.chunk_size = chunk_size
+        self.seed = seed if seed is not None else random.randrange(2 ** 31)
+
+        self.buffers = TransitionChunkBuffers(
+            ctx, num_chunks, chunk_size, (num_last_frames, field_size, field_size)
+        )
+        self.free_chunks = ctx.Queue()
+        self.full_chunks = ctx.Queue()
+        for chunk_idx in range(num_chunks):
+            self.free_chunks.put(chunk_idx)
+
+        self.weights = SharedWeights(ctx, model.get_weights()) if model is not None else None
+        self.exploration_rate = ctx.Value('d', 1.0, lock=False)
+        self.stop_event = ctx.Event()
+        self.processes = [
+            ctx.Process(
+                target=_run_rollout_worker,
+                args=(worker_id, self),
+                daemon=True,
+            )
+            for worker_id in range(num_workers)
+        ]
+
+    def __getstate__(self):
+        # Only the shared parts of the pool are sent to the worker processes.
+        state = self.__dict__.copy()
+        del state['processes']
+        return state
+
+    def start(self):
+        """ Launch the worker processes. """
+        for process in self.processes:
+            process.start()
+
+    def stop(self):
+        """ Ask the workers to finish and wait for them to exit. """
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def sync_weights(self, weights):
+        """ Publish new model weights to all workers, replacing any weights they haven't picked up yet. """
+        self.weights.write(weights)
+
+    def set_exploration_rate(self, exploration_rate):
+        """ Change the probability of taking a random action in all workers. """
+        self.exploration_rate.value = exploration_rate
+
+    def check_workers(self):
+        """
+        Make sure that all worker processes are still running.
+
+        Raises:
+            RuntimeError: if a worker has exited before the pool has been stopped.
+        """
+        if self.stop_event.is_set():
+            return
+        for worker_id, process in enumerate(self.processes):
+            if process.exitcode is not None:
+                raise RuntimeError(f'Rollout worker {worker_id} has exited with code {process.exitcode}')
+
+    def collect(self, block=False, timeout=None):
+        """
+        Receive all transition chunks that the workers have finished so far.
+
+        Args:
+            block (bool): wait until at least one chunk is available.
+            timeout (float): the maximum number of seconds to wait if `block` is True.
+
+        Returns:
+            A pair (transitions, episodes), where `transitions` is a tuple of batch arrays
+            (states, actions, rewards, states_next, episode_ends, streams) ready to be passed to
+            `ExperienceReplay.remember_batch`, and `episodes` is a list of statistics dicts,
+            one per finished episode. Transitions of the same snake in the same worker share the stream key.
+
+        Raises:
+            RuntimeError: if a worker has exited, so that the learner doesn't wait for it forever.
+        """
+        self.check_workers()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        chunks = []
+        episodes = []
+        while True:
+            wait = block and not chunks
+            try:
+                # Wake up every now and then to make sure there is still someone to wait for.
+                chunk_idx, count, chunk_episodes = self.full_chunks.get(block=wait, timeout=0.1)
+            except queue.Empty:
+                if not wait:
+                    break
+                self.check_workers()
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                continue
+            chunks.append((chunk_idx, count))
+            episodes.extend(chunk_episodes)
+
+        # Copy all chunks out at once before handing them back to the workers.
+        transitions = self.buffers.read(chunks)
+        for chunk_idx, _ in chunks:
+            self.free_chunks.put(chunk_idx)
+        return transitions, episodes
+
+
+class SharedWeights(object):
+    """
+    The latest model weights in shared memory, along with a version number that grows with every update.
+
+    The learner overwrites the weights without waiting for the workers, and every worker copies them out
+    whenever the version differs from the one it has. The lock only guards the copying itself.
+    """
+
+    def __init__(self, ctx, weights):
+        self.shapes = [np.shape(w) for w in weights]
+        self._buffer = ctx.RawArray('f', sum(int(np.prod(shape)) for shape in self.shapes))
+        self._version = ctx.RawValue('q', 0)
+        self._lock = ctx.Lock()
+        self.write(weights)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_view', None)
+        return state
+
+    @property
+    def view(self):
+        """ A NumPy view over the shared memory (created lazily in each process). """
+        if '_view' not in self.__dict__:
+            self._view = np.frombuffer(self._buffer, dtype=np.float32)
+        return self._view
+
+    @property
+    def version(self):
+        """ Get the version of the weights currently in the shared memory. """
+        return self._version.value
+
+    def write(self, weights):
+        """ Replace the weights and increment the version. """
+        with self._lock:
+            self.view[:] = np.concatenate([np.ravel(w) for w in weights])
+            self._version.value += 1
+
+    def read(self, version=None):
+        """
+        Copy the weights out of the shared memory, unless they haven't changed since `version`.
+
+        Returns:
+            A pair (weights, version), where `weights` is a list of arrays in the order of `get_weights`,
+            or None if the version is still the same.
+        """
+        if version is not None and version == self.version:
+            return None, version
+        with self._lock:
+            flat = self.view.copy()
+            version = self._version.value
+        offsets = np.cumsum([int(np.prod(shape)) for shape in self.shapes])[:-1]
+        return [w.reshape(shape) for w, shape in zip(np.split(flat, offsets), self.shapes)], version
+
+
+class TransitionChunkBuffers(object):
+    """ Fixed-size chunks of transitions allocated in shared memory. """
+
+    def __init__(self, ctx, num_chunks, chunk_size, state_shape):
+        state_size = int(np.prod(state_shape))
+        self.shape = (num_chunks, chunk_size)
+        self.state_shape = state_shape
+        self._states = ctx.RawArray('B', num_chunks * chunk_size * state_size)
+        self._states_next = ctx.RawArray('B', num_chunks * chunk_size * state_size)
+        self._actions = ctx.RawArray('b', num_chunks * chunk_size)
+        self._rewards = ctx.RawArray('f', num_chunks * chunk_size)
+        self._episode_ends = ctx.RawArray('b', num_chunks * chunk_size)
+        self._streams = ctx.RawArray('i', num_chunks * chunk_size)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_views', None)
+        return state
+
+    @property
+    def views(self):
+        """ NumPy views over the shared memory (created lazily in each process). """
+        if '_views' not in self.__dict__:
+            self._views = (
+                np.frombuffer(self._states, dtype=np.uint8).reshape(self.shape + self.state_shape),
+                np.frombuffer(self._actions, dtype=np.int8).reshape(self.shape),
+                np.frombuffer(self._rewards, dtype=np.float32).reshape(self.shape),
+                np.frombuffer(self._states_next, dtype=np.uint8).reshape(self.shape + self.state_shape),
+                np.frombuffer(self._episode_ends, dtype=np.int8).reshape(self.shape),
+                np.frombuffer(self._streams, dtype=np.int32).reshape(self.shape),
+            )
+        return self._views
+
+    def write(self, chunk_idx, item_idx, state, action, reward, state_next, is_episode_end, stream):
+        """ Store a single transition in the given chunk. """
+        states, actions, rewards, states_next, episode_ends, streams = self.views
+        states[chunk_idx, item_idx] = state
+        actions[chunk_idx, item_idx] = action
+        rewards[chunk_idx, item_idx] = reward
+        states_next[chunk_idx, item_idx] = state_next
+        episode_ends[chunk_idx, item_idx] = is_episode_end
+        streams[chunk_idx, item_idx] = stream
+
+    def read(self, chunks):
+        """
+        Copy the transitions out of the given chunks.
+
+        Args:
+            chunks: a list of (chunk_idx, count) pairs, where `count` is the number of transitions in the chunk.
+
+        Returns:
+            A tuple (states, actions, rewards, states_next, episode_ends, streams) of batch arrays.
+        """
+        return tuple(
+            np.concatenate([column[chunk_idx, :count] for chunk_idx, count in chunks])
+            if chunks else column[0, :0].copy()
+            for column in self.views
+        )
+
+
+def _run_rollout_worker(worker_id, pool):
+    """ Entry point of a worker process: play self-play episodes and stream the transitions. """
+    env = Environment(config=pool.env_config, verbose=0, observation_mode='view')
+    env.seed(pool.seed + worker_id)
+
+    model = pool.network
+    weights_version = None
+
+    chunk_idx, count, chunk_episodes = None, 0, []
+    num_snakes = env.num_snakes
+    frames = FrameStack(pool.num_last_frames, env.observation_shape, batch_size=num_snakes, dtype=np.uint8)
+
+    while not pool.stop_event.is_set():
+        # Pick up the latest weights at episode boundaries.
+        if model is not None:
+            weights, weights_version = pool.weights.read(weights_version)
+            if weights is not None:
+                model.set_weights(weights)
+
+        game_over = False
+        episode_steps = play_epsilon_greedy_episode(env, frames, model, pool.exploration_rate.value)
+        for states, actions, result, states_next in episode_steps:
+            game_over = result.is_episode_end
+            for i in range(num_snakes):
+                if chunk_idx is None:
+                    chunk_idx = _get_free_chunk(pool)
+                    if chunk_idx is None:
+                        return
+                stream = worker_id * num_snakes + i
+                pool.buffers.write(
+                    chunk_idx, count, states[i], actions[i], result.reward[i], states_next[i], game_over, stream
+                )
+                count += 1
+                if count == pool.chunk_size:
+                    pool.full_chunks.put((chunk_idx, count, chunk_episodes))
+                    chunk_idx, count, chunk_episodes = None, 0, []
+            if pool.stop_event.is_set():
+                break
+
+        if game_over:
+            chunk_episodes.append({
+                'worker': worker_id,
+                'timesteps_survived': env.timestep_index,
+                'fruits_eaten': [stats.fruits_eaten for stats in env.stats],
+                'sum_episode_rewards': [stats.sum_episode_rewards for stats in env.stats],
+                'termination_reasons': [stats.termination_reason for stats in env.stats],
+            })
+
+
+def _get_free_chunk(pool):
+    """ Wait for a free chunk, giving up if the pool is being stopped. """
+    while not pool.stop_event.is_set():
+        try:
+            return pool.free_chunks.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return None
@@ -0,0 +1,163 @@
+""" Buffered writers (sinks) for the episode statistics, in the CSV, JSON-lines and columnar binary formats. """
+
+import atexit
+import csv
+import json
+import time
+
+import numpy as np
+
+
+class StatsSink(object):
+    """
+    Collects flat statistics rows (dicts with the same keys) in memory and writes them to a file in batches.
+
+    The rows are flushed once `max_buffered_rows` rows have been collected, or when
+    a row arrives more than `flush_interval` seconds after the last flush.
+    Whatever is left in the buffer is flushed on `close` or when the interpreter exits.
+    """
+
+    file_mode = 'w'
+
+    def __init__(self, filename, max_buffered_rows=1000, flush_interval=5.0):
+        """
+        Args:
+            filename: the file to write the statistics to (overwritten if it exists).
+            max_buffered_rows (int): the number of rows that triggers a flush.
+            flush_interval (float): the maximum number of seconds between the flushes.
+        """
+        self.filename = filename
+        self.max_buffered_rows = max_buffered_rows
+        self.flush_interval = flush_interval
+        self.rows = []
+        self.columns = None
+        self.last_flush_time = time.monotonic()
+        self.file = open(filename, self.file_mode)
+        atexit.register(self.close)
+
+    def write(self, row):
+        """ Add a new row to the buffer, flushing the buffer if it's time to. """
+        self.rows.append(row)
+        if len(self.rows) >= self.max_buffered_rows or time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """ Write all buffered rows to the file. """
+        self.last_flush_time = time.monotonic()
+        if not self.rows or self.file is None:
+            return
+        if self.columns is None:
+            self.columns = list(self.rows[0].keys())
+            self._write_header()
+        self._write_rows(self.rows)
+        self.file.flush()
+        self.rows = []
+
+    def close(self):
+        """ Flush the remaining rows and close the file. """
+        if self.file is None:
+            return
+        self.flush()
+        self.file.close()
+        self.file = None
+        atexit.unregister(self.close)
+
+    def _write_header(self):
+        pass
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+
+class CSVStatsSink(StatsSink):
+    """ Writes the statistics to a CSV file with a header line (the format used by the episode logs). """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.writer = csv.writer(self.file, lineterminator='\n')
+
+    def _write_header(self):
+        self.writer.writerow(self.columns)
+
+    def _write_rows(self, rows):
+        self.writer.writerows([row[column] for column in self.columns] for row in rows)
+
+
+class JSONLinesStatsSink(StatsSink):
+    """ Writes the statistics to a text file, one JSON object per line. """
+
+    def _write_rows(self, rows):
+        self.file.write(''.join(json.dumps(row) + '\n' for row in rows))
+
+
+class BinaryStatsSink(StatsSink):
+    """
+    Writes the statistics in a columnar binary format that can be loaded with `read_binary_stats`.
+
+    Every flush appends a block: the array of column names, followed by one NumPy array per column.
+    Missing numeric values are stored as NaN, and missing strings as empty strings.
+    """
+
+    file_mode = 'wb'
+
+    def _write_rows(self, rows):
+        np.save(self.file, np.array(self.columns))
+        for column in self.columns:
+            np.save(self.file, _to_column_array([row[column] for row in rows]))
+
+
+def read_binary_stats(filename):
+    """
+    Load the statistics written by `BinaryStatsSink`.
+
+    Returns:
+        A dict that maps every column name to a NumPy array of its values.
+    """
+    blocks = []
+    with open(filename, 'rb') as f:
+        while f.peek(1):
+            columns = np.load(f).tolist()
+            blocks.append({column: np.load(f) for column in columns})
+    if not blocks:
+        return {}
+
+    stats = {}
+    for column in blocks[0]:
+        arrays = [block[column] for block in blocks]
+        if any(array.dtype.kind == 'U' for array in arrays):
+            # A block where all values are missing can't tell that it's a string column.
+            arrays = [array if array.dtype.kind == 'U' else np.full(len(array), '') for array in arrays]
+        stats[column] = np.concatenate(arrays)
+    return stats
+
+
+def _to_column_array(values):
+    """ Convert a list of values to a NumPy array without the object dtype. """
+    column = np.array(values)
+    if column.dtype != object:
+        return column
+    if all(value is None or isinstance(value, (int, float)) for value in values):
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    return np.array(['' if value is None else str(value) for value in values])
+
+
+def create_stats_sink(stats_format, filename_prefix, **kwargs):
+    """
+    Create a statistics sink of the given format.
+
+    Args:
+        stats_format (str): one of 'csv', 'jsonl' or 'binary'.
+        filename_prefix (str): the name of the file without the extension.
+
+    Returns:
+        A new `StatsSink` instance.
+    """
+    sink_classes = {
+        'csv': (CSVStatsSink, 'csv'),
+        'jsonl': (JSONLinesStatsSink, 'jsonl'),
+        'binary': (BinaryStatsSink, 'npy'),
+    }
+    if stats_format not in sink_classes:
+        raise ValueError(f'Unknown statistics format: "{stats_format}"')
+    sink_class, extension = sink_classes[stats_format]
+    return sink_class(f'{filename_prefix}.{extension}', **kwargs)
@@ -0,0 +1,58 @@
+""" Logging helpers for the Snake environment: an extra TRACE level and a rate-limited sink for it. """
+
+import logging
+import time
+
+
+# More verbose than DEBUG: dumps of the whole field at every timestep.
+TRACE = 5
+logging.addLevelName(TRACE, 'TRACE')
+
+
+class RateLimitFilter(logging.Filter):
+    """ Lets through at most `max_records` log records per `period` seconds and drops the rest. """
+
+    def __init__(self, max_records, period=1.0):
+        super().__init__()
+        self.max_records = max_records
+        self.period = period
+        self.window_start = 0.0
+        self.num_records = 0
+        self.num_dropped = 0
+
+    def filter(self, record):
+        now = time.monotonic()
+        if now - self.window_start >= self.period:
+            self.window_start = now
+            self.num_records = 0
+        if self.num_records >= self.max_records:
+            self.num_dropped += 1
+            return False
+        self.num_records += 1
+        return True
+
+
+def add_trace_sink(logger, filename, max_records_per_second=None):
+    """
+    Write the TRACE-level records of the logger to a file.
+
+    Args:
+        logger: the logger (or its name) to trace.
+        filename: the file to append the records to.
+        max_records_per_second: if specified, drop the records above this rate.
+
+    Returns:
+        The created handler (pass it to `logger.removeHandler` to stop tracing).
+    """
+    if isinstance(logger, str):
+        logger = logging.getLogger(logger)
+
+    handler = logging.FileHandler(filename)
+    handler.setLevel(TRACE)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    if max_records_per_second is not None:
+        handler.addFilter(RateLimitFilter(max_records_per_second))
+
+    logger.addHandler(handler)
+    logger.setLevel(TRACE)
+    return handler
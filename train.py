@@ -4,14 +4,14 @@
 
 import json
 import sys
+import time
 
-from keras.models import Sequential
-from keras.layers import *
-from keras.optimizers import *
-
-from snakeai.agent import DeepQNetworkAgent
+from snakeai.agent import DeepQNetworkAgent, NumPyQNetwork
 from snakeai.gameplay.environment import Environment
 from snakeai.utils.cli import HelpOnFailArgumentParser
+from snakeai.utils.rollout import RolloutWorkerPool
+from snakeai.utils.stats import create_stats_sink
+from snakeai.utils.tracing import add_trace_sink
 
 
 def parse_command_line_args(args):
@@ -35,17 +35,93 @@ def parse_command_line_args(args):
         default=30000,
         help='The number of episodes to run consecutively.',
     )
+    parser.add_argument(
+        '--memory-size',
+        type=int,
+        default=100000,
+        help='The number of transitions kept in experience replay.',
+    )
+    parser.add_argument(
+        '--deduplicate-frames',
+        action='store_true',
+        help='Store every observed frame only once in experience replay.',
+    )
+    parser.add_argument(
+        '--prioritized-replay',
+        action='store_true',
+        help='Sample the experience proportionally to the TD errors instead of uniformly.',
+    )
+    parser.add_argument(
+        '--target-sync-freq',
+        type=int,
+        help='Learn with Double DQN targets from a target network synced every N training steps.',
+    )
+    parser.add_argument(
+        '--train-every',
+        type=int,
+        default=1,
+        help='The number of new transitions between the learning phases.',
+    )
+    parser.add_argument(
+        '--gradient-steps',
+        type=int,
+        default=1,
+        help='The number of batches to learn on in every learning phase.',
+    )
+    parser.add_argument(
+        '--warmup-size',
+        type=int,
+        default=0,
+        help='The number of transitions to collect before the learning starts.',
+    )
+    parser.add_argument(
+        '--replay-ratio',
+        type=float,
+        help='Learn on this many sampled transitions per new transition (overrides the two options above).',
+    )
+    parser.add_argument(
+        '--prefetch-batches',
+        type=int,
+        default=0,
+        help='Sample up to N experience batches ahead of time on a background thread.',
+    )
+    parser.add_argument(
+        '--num-workers',
+        type=int,
+        default=0,
+        help='The number of rollout worker processes (0 to collect experience in the training process).',
+    )
+
+    parser.add_argument(
+        '--stats-format',
+        type=str,
+        choices=['csv', 'jsonl', 'binary'],
+        default='csv',
+        help='The format of the file with the statistics for every episode.',
+    )
+    parser.add_argument(
+        '--trace-file',
+        type=str,
+        help='File to write the state of the field at every timestep to (slows down the environment).',
+    )
+    parser.add_argument(
+        '--max-trace-rate',
+        type=int,
+        help='The maximum number of field states per second to write to the trace file.',
+    )
 
     return parser.parse_args(args)
 
 
-def create_snake_environment(level_filename):
+def create_snake_environment(level_filename, stats_format='csv'):
     """ Create a new Snake environment from the config file. """
 
     with open(level_filename) as cfg:
         env_config = json.load(cfg)
 
-    return Environment(config=env_config, verbose=1)
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    stats_sink = create_stats_sink(stats_format, f'snake-env-{timestamp}')
+    return Environment(config=env_config, verbose=1, stats_sink=stats_sink)
 
 
 def create_dqn_model(env, num_last_frames):
@@ -59,6 +135,10 @@ def create_dqn_model(env, num_last_frames):
     Returns:
         A compiled DQN model.
     """
+    # Keras is only imported by the learner: the rollout workers re-import this script when they are spawned.
+    from keras.models import Sequential
+    from keras.layers import Activation, Conv2D, Dense, Flatten
+    from keras.optimizers import RMSprop
 
     model = Sequential()
 
@@ -93,22 +173,46 @@ def create_dqn_model(env, num_last_frames):
 
 def main():
     parsed_args = parse_command_line_args(sys.argv[1:])
+    if parsed_args.trace_file:
+        add_trace_sink('snakeai.gameplay.environment', parsed_args.trace_file, parsed_args.max_trace_rate)
 
-    env = create_snake_environment(parsed_args.level)
+    env = create_snake_environment(parsed_args.level, parsed_args.stats_format)
     model = create_dqn_model(env, num_last_frames=4)
 
+    rollout = None
+    if parsed_args.num_workers > 0:
+        with open(parsed_args.level) as cfg:
+            env_config = json.load(cfg)
+        rollout = RolloutWorkerPool(
+            env_config,
+            model=model,
+            num_workers=parsed_args.num_workers,
+            num_last_frames=model.input_shape[1]
+        )
+
     agent = DeepQNetworkAgent(
         model=model,
-        memory_size=-1,
-        num_last_frames=model.input_shape[1]
+        memory_size=parsed_args.memory_size,
+        deduplicate_frames=parsed_args.deduplicate_frames,
+        prioritized_replay=parsed_args.prioritized_replay,
+        num_last_frames=model.input_shape[1],
+        inference_model=NumPyQNetwork.from_keras(model),
     )
     agent.train(
         env,
         batch_size=64,
         num_episodes=parsed_args.num_episodes,
         checkpoint_freq=parsed_args.num_episodes // 10,
-        discount_factor=0.95
+        discount_factor=0.95,
+        rollout=rollout,
+        target_sync_freq=parsed_args.target_sync_freq,
+        train_every=parsed_args.train_every,
+        gradient_steps=parsed_args.gradient_steps,
+        warmup_size=parsed_args.warmup_size,
+        replay_ratio=parsed_args.replay_ratio,
+        prefetch_batches=parsed_args.prefetch_batches,
     )
+    env.close()
 
 
 if __name__ == '__main__':